@@ -0,0 +1,84 @@
+"""
+Stateless JWT users.
+
+`JWTStatelessUserAuthentication` trusts the verified claims and builds a
+`TokenUser` instead of loading the `User` row on every request. Its `id` and
+`username` come from the token; the flags, like `is_staff` for `IsAdminUser`,
+are read from `CACHED_USER_FIELDS` of the user, cached for
+`AUTH_USER_CACHE_TIMEOUT` seconds and dropped when the user is saved. Unsafe
+requests of a deactivated user are rejected once that entry is refreshed.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTTokenUserScheme
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt import authentication
+from rest_framework_simplejwt.models import TokenUser as BaseTokenUser
+
+# all that token users read from the row, the password hash stays out of the shared cache
+CACHED_USER_FIELDS = ("username", "is_active", "is_staff", "is_superuser")
+
+
+def user_cache_key(user_id):
+    return f"auth-user:{user_id}"
+
+
+def get_cached_user(user_id):
+    """`CACHED_USER_FIELDS` of a user as a dict, None when there is no such user."""
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = get_user_model().objects.filter(pk=user_id).values(*CACHED_USER_FIELDS).first()
+        if user is not None:
+            cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+    return user
+
+
+class JWTStatelessUserAuthentication(authentication.JWTStatelessUserAuthentication):
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        # reads stay open until the token expires, as they would for an anonymous user
+        if result is not None and request.method not in SAFE_METHODS and not result[0].is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return result
+
+
+class JWTStatelessUserScheme(SimpleJWTTokenUserScheme):
+    target_class = JWTStatelessUserAuthentication
+
+
+class TokenUser(BaseTokenUser):
+    @cached_property
+    def user(self):
+        """`CACHED_USER_FIELDS` of the user, only looked up when a view needs more than the claims."""
+        return get_cached_user(self.id)
+
+    @cached_property
+    def username(self):
+        # tokens issued before the claim was added
+        if "username" in self.token:
+            return self.token["username"]
+        return self.user["username"] if self.user else ""
+
+    @cached_property
+    def is_active(self):
+        return bool(self.user and self.user["is_active"])
+
+    @cached_property
+    def is_staff(self):
+        return bool(self.is_active and self.user["is_staff"])
+
+    @cached_property
+    def is_superuser(self):
+        return bool(self.is_active and self.user["is_superuser"])
+
+    def as_author(self):
+        """
+        An unsaved `User` carrying the id and username of the token, enough to
+        be assigned to a foreign key and read back as an author without a query.
+        """
+        return get_user_model()(pk=self.id, username=self.username)
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher as BasePBKDF2PasswordHasher
+
+
+class PBKDF2PasswordHasher(BasePBKDF2PasswordHasher):
+    """
+    Django's PBKDF2 with `PASSWORD_HASH_ITERATIONS` rounds, so the cost can be
+    tuned per environment. Stored hashes of another cost are rehashed at the
+    next successful login.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
@@ -0,0 +1,63 @@
+"""
+Buffered `last_login`.
+
+A login only records its timestamp in a Redis hash, one HSET instead of an
+UPDATE of `auth_user` on every token request. `flush_last_login` writes the
+buffer to the database with a single statement, the `flush_last_login`
+command runs it periodically.
+"""
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django_redis import get_redis_connection
+
+LAST_LOGIN_KEY = "auth:last-login"
+
+
+def get_client():
+    return get_redis_connection(settings.LAST_LOGIN_ALIAS)
+
+
+def record_login(user_id, timestamp=None):
+    get_client().hset(LAST_LOGIN_KEY, user_id, time.time() if timestamp is None else timestamp)
+
+
+def flush_last_login():
+    """Moves the buffered logins to `auth_user` and returns how many users were updated."""
+    client = get_client()
+    pipeline = client.pipeline(transaction=True)
+    pipeline.hgetall(LAST_LOGIN_KEY)
+    pipeline.delete(LAST_LOGIN_KEY)
+    buffered, _deleted = pipeline.execute()
+    if not buffered:
+        return 0
+
+    user_ids = [int(user_id) for user_id in buffered]
+    logins = [datetime.fromtimestamp(float(timestamp), tz=timezone.utc) for timestamp in buffered.values()]
+
+    user_model = get_user_model()
+    table = connection.ops.quote_name(user_model._meta.db_table)
+    pk = connection.ops.quote_name(user_model._meta.pk.column)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {table} AS u
+                SET last_login = buffered.last_login
+                FROM unnest(%s::bigint[], %s::timestamptz[]) AS buffered (id, last_login)
+                WHERE u.{pk} = buffered.id
+                    AND (u.last_login IS NULL OR u.last_login < buffered.last_login)
+                """,
+                [user_ids, logins],
+            )
+            return cursor.rowcount
+    except Exception:
+        # back into the buffer for the next run, without overwriting newer logins
+        pipeline = client.pipeline()
+        for user_id, timestamp in buffered.items():
+            pipeline.hsetnx(LAST_LOGIN_KEY, user_id, timestamp)
+        pipeline.execute()
+        raise
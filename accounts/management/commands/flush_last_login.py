@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from accounts.last_login import flush_last_login
+
+
+class Command(BaseCommand):
+    help = "Writes the last logins buffered in Redis to the users, once or every `--every` seconds"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--every", type=int, default=None, help="Keep running and flush every N seconds")
+
+    def handle(self, *args, **options):
+        every = options["every"]
+        if every is None:
+            updated = flush_last_login()
+            self.stdout.write(self.style.SUCCESS(f"Updated the last login of {updated} users"))
+            return
+
+        while True:
+            try:
+                flush_last_login()
+            except Exception as exc:
+                # the logins stay buffered, the next round tries again
+                self.stderr.write(f"Flushing last logins failed: {exc}")
+            close_old_connections()
+            time.sleep(every)
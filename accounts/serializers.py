@@ -1,10 +1,29 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.db import IntegrityError, transaction
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer as BaseTokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from accounts.last_login import record_login
+
+
+class TokenObtainPairSerializer(BaseTokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        # carried over to the access token and every refresh, token users need no query for it
+        token = super().get_token(user)
+        token["username"] = user.get_username()
+        return token
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        if not api_settings.UPDATE_LAST_LOGIN:
+            record_login(self.user.pk)
+        return data
 
 
 class RegistrationSerializer(serializers.Serializer):
@@ -17,18 +36,18 @@ class RegistrationSerializer(serializers.Serializer):
     def create(self, validated_data):
         user_model = get_user_model()
 
-        username = validated_data['username']
-        if user_model.objects.filter(username=username).exists():
+        try:
+            # the unique username decides, a check before would be one more query and still racy
+            with transaction.atomic():
+                return user_model.objects.create_user(
+                    username=validated_data['username'],
+                    password=validated_data['password'],
+                )
+        except IntegrityError:
             raise serializers.ValidationError({'username': _('Already exists!')})
 
-        user = user_model.objects.create_user(
-            username=username,
-            password=validated_data['password'],
-        )
-        return user
-
     def to_representation(self, instance):
-        refresh = RefreshToken.for_user(instance)
+        refresh = TokenObtainPairSerializer.get_token(instance)
         return {
             'refresh': str(refresh),
             'access': str(refresh.access_token),
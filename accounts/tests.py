@@ -1,7 +1,20 @@
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.reverse import reverse
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from accounts.authentication import TokenUser, get_cached_user, user_cache_key
+from accounts.last_login import LAST_LOGIN_KEY, flush_last_login, get_client
+from book.models import Book, Category, Review, ReviewReaction
+from book.views import ReviewCreateAPIView
 
 
 user_model = get_user_model()
@@ -43,3 +56,129 @@ class UserRegisterAPITest(APITestCase):
         resp_data = response.json()
         self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn("password", resp_data)
+
+
+class TokenUserAuthenticationTest(APITestCase):
+    def setUp(self):
+        self.user = user_model.objects.create_user(username="token_user", password="secret123Test")
+        response = self.client.post(
+            reverse('auth-token-obtain-pair'), {'username': 'token_user', 'password': 'secret123Test'}
+        )
+        self.assertEquals(response.status_code, status.HTTP_200_OK, response.json())
+        self.access = response.json()['access']
+        self.refresh = response.json()['refresh']
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.access)
+
+        category = Category.objects.create(slug="token_cat", title="token_cat")
+        self.book = Book.objects.create(title="token_book", author="someone", category=category, rating=1)
+
+    def assertNoUserQuery(self, context):
+        for query in context.captured_queries:
+            self.assertNotIn("auth_user", query["sql"])
+
+    def test_token_carries_username(self):
+        self.assertEquals(AccessToken(self.access)["username"], "token_user")
+
+        response = self.client.post(reverse('auth-token-refresh'), {'refresh': self.refresh})
+        self.assertEquals(response.status_code, status.HTTP_200_OK, response.json())
+        self.assertEquals(AccessToken(response.json()['access'])["username"], "token_user")
+
+    @mock.patch.object(ReviewCreateAPIView, "throttle_classes", ())
+    def test_review_create_without_user_query(self):
+        # writes check `is_active`, cached by an earlier request
+        get_cached_user(self.user.pk)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse("book-reviews-create"), {"book": self.book.id, "rating": 4})
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED, response.json())
+        self.assertNoUserQuery(context)
+
+        self.assertEquals(response.json()["author"], "token_user")
+        self.assertEquals(Review.objects.get(pk=response.json()["id"]).user, self.user)
+
+    def test_reaction_without_user_query(self):
+        review = Review.objects.create(book=self.book, user=self.user, rating=3)
+        url = reverse("book-review-react", args=[review.id])
+        get_cached_user(self.user.pk)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.put(url, {"reaction": ReviewReaction.Reaction.like.value})
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED, response.json())
+        self.assertNoUserQuery(context)
+
+    @mock.patch.object(ReviewCreateAPIView, "throttle_classes", ())
+    def test_inactive_user_cannot_write(self):
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.post(reverse("book-reviews-create"), {"book": self.book.id, "rating": 4})
+        self.assertEquals(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEquals(response.json()["code"], "user_inactive")
+        self.assertFalse(Review.objects.exists())
+
+        response = self.client.get(reverse("books-detail", args=[self.book.id]))
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+
+    def test_full_user_is_cached(self):
+        self.user.is_staff = True
+        self.user.save()
+
+        token_user = TokenUser(AccessToken(self.access))
+        self.assertTrue(token_user.is_staff)
+        with self.assertNumQueries(0):
+            self.assertTrue(TokenUser(AccessToken(self.access)).is_staff)
+        # only the flags are cached, not the password hash
+        self.assertEquals(
+            cache.get(user_cache_key(self.user.pk)),
+            {"username": "token_user", "is_active": True, "is_staff": True, "is_superuser": False},
+        )
+
+        # saving the user drops the cached copy
+        self.user.is_active = False
+        self.user.save()
+        self.assertFalse(TokenUser(AccessToken(self.access)).is_staff)
+
+    def test_token_without_username_claim(self):
+        token = RefreshToken.for_user(self.user).access_token
+        self.assertEquals(TokenUser(token).username, "token_user")
+
+
+class LoginTest(APITestCase):
+    def setUp(self):
+        get_client().delete(LAST_LOGIN_KEY)
+        self.addCleanup(get_client().delete, LAST_LOGIN_KEY)
+        self.user = user_model.objects.create_user(username="login_user", password="secret123Test")
+
+    def login(self):
+        response = self.client.post(
+            reverse('auth-token-obtain-pair'), {'username': 'login_user', 'password': 'secret123Test'}
+        )
+        self.assertEquals(response.status_code, status.HTTP_200_OK, response.json())
+
+    def test_last_login_is_buffered(self):
+        with CaptureQueriesContext(connection) as context:
+            self.login()
+        self.assertFalse([query for query in context.captured_queries if query["sql"].startswith("UPDATE")])
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_login)
+
+        self.assertEquals(flush_last_login(), 1)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+        self.assertEquals(flush_last_login(), 0)
+
+    def test_flush_keeps_newer_last_login(self):
+        self.login()
+        newer = self.user.date_joined.replace(year=self.user.date_joined.year + 1)
+        user_model.objects.filter(pk=self.user.pk).update(last_login=newer)
+
+        self.assertEquals(flush_last_login(), 0)
+        self.user.refresh_from_db()
+        self.assertEquals(self.user.last_login, newer)
+
+    @override_settings(PASSWORD_HASH_ITERATIONS=1000)
+    def test_configurable_hash_cost(self):
+        self.assertTrue(make_password("secret123Test").startswith("pbkdf2_sha256$1000$"))
+
+        # a hash of another cost is upgraded by the next login
+        self.login()
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$1000$"))
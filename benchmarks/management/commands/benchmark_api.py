@@ -0,0 +1,109 @@
+import json
+import os
+import subprocess
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+
+from benchmarks.scenarios import build_scenarios
+from benchmarks.seed import seed_dataset
+from benchmarks.utils import BenchmarkCommand, format_stats, measure
+from book.models import Book, Review, ReviewReaction
+from book.pagination import estimate_count
+
+RESULTS_DIR = os.path.join(settings.BASE_DIR, "benchmarks", "results")
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class Command(BenchmarkCommand):
+    help = (
+        "Runs the request scenarios of the book endpoints against a seeded dataset, reports p50/p95/p99 "
+        "and queries per request and saves them as JSON to compare runs across commits"
+    )
+
+    dataset = "api"
+    dataset_options = ("categories", "books", "users", "reviews", "reactions", "hot_share", "skew")
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument("--categories", type=int, default=50)
+        parser.add_argument("--books", type=int, default=1_000_000)
+        parser.add_argument("--users", type=int, default=50_000)
+        parser.add_argument("--reviews", type=int, default=2_000_000)
+        parser.add_argument("--reactions", type=int, default=2_000_000)
+        parser.add_argument("--skew", type=float, default=3.0, help="Popularity skew of reviews over books, 1 is uniform")
+        parser.add_argument("--hot-share", type=float, default=0.1, help="Share of the reviews on the most popular book")
+        parser.add_argument("--repeat", type=int, default=50)
+        parser.add_argument("--scenario", action="append", help="Only the scenarios containing this text")
+        parser.add_argument("--output", help=f"Results file, a new file in {RESULTS_DIR} by default")
+        parser.add_argument("--compare", help="Results file of an earlier run to show the change against")
+
+    def handle(self, *args, **options):
+        # read before seeding, a wrong path shouldn't cost a seeded database
+        self.baseline = None
+        if options["compare"]:
+            try:
+                with open(options["compare"], encoding="utf-8") as file:
+                    self.baseline = json.load(file)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Can't read {options['compare']}: {exc}")
+
+        super().handle(*args, **options)
+
+    def seed(self, options):
+        self.stdout.write("Seeding...")
+        started = time.perf_counter()
+        seed_dataset(**{name: options[name] for name in self.dataset_options})
+        self.stdout.write(f"Seeded in {time.perf_counter() - started:.0f}s")
+
+    def benchmark(self, options):
+        results = {
+            "commit": git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "repeat": options["repeat"],
+            # the seeded sizes as the planner sees them
+            "dataset": {
+                "books": estimate_count(Book.objects.all()),
+                "reviews": estimate_count(Review.objects.all()),
+                "reactions": estimate_count(ReviewReaction.objects.all()),
+            },
+            "scenarios": self.run(options["repeat"], options["scenario"], self.baseline),
+        }
+
+        output = options["output"] or os.path.join(RESULTS_DIR, f"{results['commit']}-{int(time.time())}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results saved to {output}"))
+
+    def run(self, repeat, only, baseline):
+        books = Book.objects.order_by("id").values_list("id", flat=True)
+        hot_book_id, cold_book_id = books.first(), books.last()
+        review_id = Review.objects.filter(book_id=hot_book_id).values_list("id", flat=True).first()
+        user = get_user_model().objects.filter(username__startswith="bench_user_").order_by("id").first()
+        ReviewReaction.objects.filter(review_id=review_id, user=user).delete()
+
+        scenarios = build_scenarios(hot_book_id, cold_book_id, review_id, user)
+        if only:
+            scenarios = {name: scenario for name, scenario in scenarios.items() if any(text in name for text in only)}
+
+        results = {}
+        for name, scenario in scenarios.items():
+            stats = results[name] = measure(scenario, repeat)
+            line = format_stats(name, stats)
+            previous = (baseline or {}).get("scenarios", {}).get(name)
+            if previous:
+                line += f"  p50 {stats['p50'] / previous['p50'] - 1:+.0%} vs {baseline['commit']}"
+            self.stdout.write(line)
+        return results
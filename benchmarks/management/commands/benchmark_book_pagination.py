@@ -0,0 +1,58 @@
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from benchmarks.seed import analyze, seed_books, seed_categories
+from benchmarks.utils import BenchmarkCommand, format_stats, measure
+from book.pagination import BookKeysetPagination
+from book.views import BookViewSet
+
+
+class Command(BenchmarkCommand):
+    help = "Compares page number pagination of the book list against cursor pages at increasing depth"
+
+    dataset = "books"
+    dataset_options = ("books",)
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument("--books", type=int, default=1_000_000)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("depths", nargs="*", type=int, default=[1, 1_000, 50_000])
+
+    def seed(self, options):
+        self.stdout.write("Seeding...")
+        seed_categories(10)
+        seed_books(options["books"], 10)
+        analyze()
+
+    def benchmark(self, options):
+        depths, repeat = options["depths"], options["repeat"]
+        factory = APIRequestFactory()
+        queryset = BookViewSet.queryset
+
+        def page(paginator, **params):
+            return paginator.paginate_queryset(queryset, Request(factory.get("/", params)))
+
+        for ordering in ("id", "-rating"):
+            paginator = BookKeysetPagination()
+            for depth in depths:
+                # the cursor of the last row before the page, as a crawler would hold it
+                ordered = queryset.order_by(*BookKeysetPagination.orderings[ordering])
+                offset = (depth - 1) * paginator.page_size
+                cursor = paginator.encode_cursor(ordered[offset - 1]) if offset else None
+                params = {"ordering": ordering, **({"cursor": cursor} if cursor else {})}
+
+                if ordering == "id":
+                    self.stdout.write(format_stats(
+                        f"page number, page {depth}",
+                        measure(lambda: page(PageNumberPagination(), page=depth), repeat),
+                    ))
+                self.stdout.write(format_stats(
+                    f"cursor by {ordering}, page {depth}",
+                    measure(lambda: page(BookKeysetPagination(), **params), repeat),
+                ))
+            self.stdout.write(format_stats(
+                f"cursor by {ordering}, estimated count",
+                measure(lambda: page(BookKeysetPagination(), ordering=ordering, count="estimate"), repeat),
+            ))
@@ -0,0 +1,51 @@
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from benchmarks.seed import analyze, seed_books, seed_categories
+from benchmarks.utils import BenchmarkCommand, format_stats, measure
+from book.views import BookSearchFilter, BookViewSet
+
+
+class IcontainsSearchView:
+    search_fields = ["title"]
+
+
+class Command(BenchmarkCommand):
+    help = "Compares the icontains SearchFilter against the full-text BookSearchFilter"
+
+    dataset = "books"
+    dataset_options = ("books",)
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument("--books", type=int, default=1_000_000)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("terms", nargs="*", default=["dragon", "winter garden", "drgon"])
+
+    def seed(self, options):
+        self.stdout.write("Seeding...")
+        seed_categories(10)
+        seed_books(options["books"], 10)
+        analyze()
+
+    def benchmark(self, options):
+        terms, repeat = options["terms"], options["repeat"]
+        factory = APIRequestFactory()
+        queryset = BookViewSet.queryset
+
+        def page(backend, view, term):
+            request = Request(factory.get("/", {"search": term}))
+            filtered = backend.filter_queryset(request, queryset, view)
+            # what PageNumberPagination does: COUNT(*) + the first page
+            return filtered.count(), list(filtered[:10])
+
+        for term in terms:
+            self.stdout.write(format_stats(
+                f"icontains '{term}'",
+                measure(lambda: page(SearchFilter(), IcontainsSearchView(), term), repeat),
+            ))
+            self.stdout.write(format_stats(
+                f"full-text '{term}'",
+                measure(lambda: page(BookSearchFilter(), None, term), repeat),
+            ))
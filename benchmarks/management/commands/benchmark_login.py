@@ -0,0 +1,83 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
+from django.db import connections
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.views import TokenObtainPairView
+
+from accounts.last_login import flush_last_login
+from benchmarks.seed import seed_users
+from benchmarks.utils import BenchmarkCommand, format_stats, measure
+
+PASSWORD = "bench-password"
+
+
+class Command(BenchmarkCommand):
+    help = (
+        "Measures token logins per second and per core: Django's PBKDF2 cost with a last_login "
+        "UPDATE per login against PASSWORD_HASH_ITERATIONS with buffered last logins"
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument("--logins", type=int, default=50, help="Logins per thread")
+        parser.add_argument("--threads", type=int, default=os.cpu_count())
+        parser.add_argument("--iterations", type=int, default=settings.PASSWORD_HASH_ITERATIONS)
+
+    def get_seed_params(self, options):
+        return {"dataset": "users", "users": max(options["threads"], 100)}
+
+    def seed(self, options):
+        seed_users(max(options["threads"], 100))
+
+    def benchmark(self, options):
+        logins, threads, iterations = options["logins"], options["threads"], options["iterations"]
+        factory = APIRequestFactory()
+        view = TokenObtainPairView.as_view()
+        usernames = list(
+            get_user_model().objects.filter(username__startswith="bench_user_").order_by("id")
+            .values_list("username", flat=True)[:threads]
+        )
+        cores = min(threads, os.cpu_count())
+
+        def login(username):
+            request = factory.post("/api/v1/auth/token/", {"username": username, "password": PASSWORD}, format="json")
+            response = view(request)
+            assert response.status_code == 200, response.data
+
+        scenarios = {
+            "before: default cost, UPDATE per login": (PBKDF2PasswordHasher.iterations, True),
+            "default cost, buffered last_login": (PBKDF2PasswordHasher.iterations, False),
+            f"after: {iterations} rounds, buffered last_login": (iterations, False),
+        }
+        for name, (rounds, update_last_login) in scenarios.items():
+            jwt_settings = {**settings.SIMPLE_JWT, "UPDATE_LAST_LOGIN": update_last_login}
+            with override_settings(PASSWORD_HASH_ITERATIONS=rounds, SIMPLE_JWT=jwt_settings):
+                # stored hashes of the same cost, or the first login of each user would rehash
+                get_user_model().objects.filter(username__in=usernames).update(password=make_password(PASSWORD))
+
+                self.stdout.write(format_stats(f"{name}, one login", measure(lambda: login(usernames[0]), 20)))
+
+                def worker(username):
+                    try:
+                        for _ in range(logins):
+                            login(username)
+                    finally:
+                        connections.close_all()
+
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=threads) as executor:
+                    list(executor.map(worker, usernames))
+                rate = logins * len(usernames) / (time.perf_counter() - started)
+                self.stdout.write(
+                    f"{name}: {rate:.0f} logins/s with {len(usernames)} threads, {rate / cores:.1f} per core"
+                )
+
+        started = time.perf_counter()
+        updated = flush_last_login()
+        self.stdout.write(f"flushing {updated} buffered last logins: {(time.perf_counter() - started) * 1000:.1f}ms")
@@ -0,0 +1,79 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.db import connections
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from benchmarks.seed import analyze, seed_books, seed_categories, seed_reviews, seed_users
+from benchmarks.utils import BenchmarkCommand, format_stats, measure
+from book.models import Book, Review, ReviewReaction
+from book.views import ReviewReactionAPIView, review_reaction_cancel_view
+
+
+class Command(BenchmarkCommand):
+    help = "Measures like/unlike cycles on one hot review: POST + DELETE against PUT + cancel"
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument("--cycles", type=int, default=500, help="Like/unlike cycles per thread")
+        parser.add_argument("--threads", type=int, default=4)
+
+    def get_seed_params(self, options):
+        return {"dataset": "reaction_toggle", "users": max(options["threads"], 100)}
+
+    def seed(self, options):
+        self.stdout.write("Seeding...")
+        seed_categories(10)
+        seed_books(1_000, 10)
+        seed_users(max(options["threads"], 100))
+        seed_reviews(10_000)
+        Book.objects.recalculate_ratings()
+        analyze()
+
+    def benchmark(self, options):
+        cycles, threads = options["cycles"], options["threads"]
+        factory = APIRequestFactory()
+        review_id = str(Review.objects.order_by("id").values_list("id", flat=True).first())
+        users = list(get_user_model().objects.filter(username__startswith="bench_user_").order_by("id")[:threads])
+        ReviewReaction.objects.filter(review_id=review_id).delete()
+
+        react_view = ReviewReactionAPIView.as_view(throttle_classes=())
+        cancel_view = review_reaction_cancel_view.cls.as_view(throttle_classes=())
+
+        def call(view, method, user, data=None):
+            request = getattr(factory, method)(f"/api/v1/books/react/reviews/{review_id}/", data, format="json")
+            force_authenticate(request, user=user)
+            response = view(request, review_id=review_id)
+            assert response.status_code < 300, response.data
+            return response
+
+        cycle_kinds = {
+            "POST + DELETE": lambda user: (
+                call(react_view, "post", user, {"reaction": "LIKE"}),
+                call(react_view, "delete", user),
+            ),
+            "PUT + cancel": lambda user: (
+                call(react_view, "put", user, {"reaction": "LIKE"}),
+                call(cancel_view, "delete", user),
+            ),
+        }
+
+        for name, cycle in cycle_kinds.items():
+            self.stdout.write(format_stats(f"{name}, one cycle", measure(lambda: cycle(users[0]), 50)))
+
+            def worker(user):
+                try:
+                    for _ in range(cycles):
+                        cycle(user)
+                finally:
+                    connections.close_all()
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                list(executor.map(worker, users))
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{name}: {cycles * len(users) / elapsed:.0f} cycles/s with {len(users)} threads")
+
+            review = Review.objects.get(pk=review_id)
+            assert (review.likes_count, review.dislikes_count) == (0, 0), "counters drifted"
@@ -0,0 +1,73 @@
+import io
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from benchmarks.seed import seed_dataset
+from benchmarks.utils import BenchmarkCommand, format_stats, measure
+from book.models import Book, Review
+from book.serializers import BookDetailSerializer, BookValuesListSerializer, ReviewValuesListSerializer
+from book_platform.parsers import ORJSONParser
+from book_platform.renderers import ORJSONRenderer
+
+
+class Command(BenchmarkCommand):
+    help = "Compares DRF's JSONRenderer and JSONParser against the orjson ones on book and review payloads"
+
+    dataset = "reviews"
+    dataset_options = ("books", "users", "reviews", "reactions")
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument("--books", type=int, default=10_000)
+        parser.add_argument("--users", type=int, default=10_000)
+        parser.add_argument("--reviews", type=int, default=200_000)
+        parser.add_argument("--reactions", type=int, default=200_000)
+        parser.add_argument("--page-sizes", type=int, nargs="+", default=[10, 100, 1000])
+        parser.add_argument("--repeat", type=int, default=200)
+
+    def seed(self, options):
+        self.stdout.write("Seeding...")
+        seed_dataset(**{name: options[name] for name in self.dataset_options})
+
+    def build_payloads(self, page_sizes):
+        # the data the views hand to the renderer, read once
+        context = {"request": Request(APIRequestFactory().get("/api/v1/books/"))}
+        books = BookValuesListSerializer(context=context)
+        reviews = ReviewValuesListSerializer(context=context)
+        hot_book_id = Book.objects.order_by("id").values_list("id", flat=True).first()
+
+        payloads = {
+            "book detail": BookDetailSerializer(
+                Book.objects.select_related("category").get(pk=hot_book_id), context=context,
+            ).data,
+        }
+        for size in page_sizes:
+            payloads[f"book page of {size}"] = {
+                "count": size, "next": None, "previous": None,
+                "results": books.serialize(books.values(Book.objects.select_related("category")[:size])),
+            }
+            payloads[f"review page of {size}"] = {
+                "next": None, "previous": None,
+                "results": reviews.serialize(reviews.values(
+                    Review.objects.filter(book_id=hot_book_id).with_author().order_by("created_at", "id")[:size]
+                )),
+            }
+        return payloads
+
+    def benchmark(self, options):
+        payloads, repeat = self.build_payloads(options["page_sizes"]), options["repeat"]
+        renderers = {"json": JSONRenderer(), "orjson": ORJSONRenderer()}
+        parsers = {"json": JSONParser(), "orjson": ORJSONParser()}
+
+        for name, data in payloads.items():
+            content = JSONRenderer().render(data)
+            self.stdout.write(f"{name}, {len(content)} bytes")
+            for label, renderer in renderers.items():
+                self.stdout.write(format_stats(f"  render, {label}", measure(lambda: renderer.render(data), repeat)))
+            for label, parser in parsers.items():
+                self.stdout.write(format_stats(
+                    f"  parse, {label}", measure(lambda: parser.parse(io.BytesIO(content)), repeat),
+                ))
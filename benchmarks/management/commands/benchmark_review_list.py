@@ -0,0 +1,72 @@
+from urllib.parse import parse_qs, urlparse
+
+from rest_framework.generics import ListAPIView
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.test import APIRequestFactory
+
+from benchmarks.seed import seed_dataset
+from benchmarks.utils import BenchmarkCommand, format_stats, measure
+from book.models import Book, Review
+from book.serializers import ReactionCountListField, ReviewSerializer
+from book.views import ReviewListAPIView
+
+
+class RawReviewSerializer(ReviewSerializer):
+    # raw rows carry the aggregated `reactions` column instead of the counters
+    reactions = ReactionCountListField()
+
+
+class Command(BenchmarkCommand):
+    help = "Compares the raw reviews_with_reactions listing against the per-book keyset listing"
+
+    dataset = "reviews"
+    dataset_options = ("books", "users", "reviews", "reactions")
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument("--books", type=int, default=10_000)
+        parser.add_argument("--users", type=int, default=10_000)
+        parser.add_argument("--reviews", type=int, default=1_000_000)
+        parser.add_argument("--reactions", type=int, default=1_000_000)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--raw-repeat", type=int, default=3, help="The raw query scans every review, keep it low")
+
+    def seed(self, options):
+        self.stdout.write("Seeding...")
+        seed_dataset(**{name: options[name] for name in self.dataset_options})
+
+    def benchmark(self, options):
+        repeat, raw_repeat = options["repeat"], options["raw_repeat"]
+        factory = APIRequestFactory()
+        hot_book_id = str(Book.objects.order_by("id").values_list("id", flat=True).first())
+        cold_book_id = str(Book.objects.order_by("-id").values_list("id", flat=True).first())
+
+        raw_view = ListAPIView.as_view(
+            queryset=Review.objects.reviews_with_reactions(),
+            serializer_class=RawReviewSerializer,
+            pagination_class=PageNumberPagination,
+        )
+        keyset_view = ReviewListAPIView.as_view()
+
+        def call(view, book_id, **params):
+            request = factory.get(f"/api/v1/books/{book_id}/reviews/", params)
+            response = view(request, book_id=book_id)
+            response.render()
+            return response
+
+        deep_cursor = None
+        response = call(keyset_view, hot_book_id)
+        for _ in range(100):
+            if not response.data["next"]:
+                break
+            deep_cursor = parse_qs(urlparse(response.data["next"]).query)["cursor"][0]
+            response = call(keyset_view, hot_book_id, cursor=deep_cursor)
+
+        self.stdout.write(format_stats("raw query, page 1", measure(lambda: call(raw_view, hot_book_id), raw_repeat, warmup=1)))
+        self.stdout.write(format_stats("keyset, hot book, page 1", measure(lambda: call(keyset_view, hot_book_id), repeat)))
+        if deep_cursor:
+            self.stdout.write(format_stats(
+                "keyset, hot book, page 100",
+                measure(lambda: call(keyset_view, hot_book_id, cursor=deep_cursor), repeat),
+            ))
+        self.stdout.write(format_stats("keyset, cold book, page 1", measure(lambda: call(keyset_view, cold_book_id), repeat)))
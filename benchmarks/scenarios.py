@@ -0,0 +1,90 @@
+"""
+Request scenarios of `benchmark_api`.
+
+Each scenario is a callable running one request (or one like/unlike cycle)
+through the DRF view of its endpoint, without throttling and with the user
+forced in. "uncached" scenarios bump the cache versions before every call, so
+the response is computed from the database each time.
+"""
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from book.cache import BOOKS_NAMESPACE, book_namespace, bump_versions
+from book.views import (
+    BookViewSet, ReviewCreateAPIView, ReviewListAPIView, ReviewReactionAPIView, review_reaction_cancel_view
+)
+
+factory = APIRequestFactory()
+
+
+def call(view, method, path, data=None, user=None, **kwargs):
+    if method == "get":
+        request = factory.get(path)
+    else:
+        request = getattr(factory, method)(path, data, format="json")
+    if user is not None:
+        force_authenticate(request, user=user)
+    response = view(request, **kwargs)
+    if hasattr(response, "render"):
+        response.render()
+    assert response.status_code < 400, (path, response.status_code, getattr(response, "data", None))
+    return response
+
+
+def build_scenarios(hot_book_id, cold_book_id, review_id, user, search_term="dragon"):
+    book_list = BookViewSet.as_view({"get": "list"})
+    book_detail = BookViewSet.as_view({"get": "retrieve"})
+    review_list = ReviewListAPIView.as_view()
+    review_create = ReviewCreateAPIView.as_view(throttle_classes=())
+    react = ReviewReactionAPIView.as_view(throttle_classes=())
+    cancel = review_reaction_cancel_view.cls.as_view(throttle_classes=())
+
+    books_path = "/api/v1/books/"
+    hot_book_path = f"/api/v1/books/{hot_book_id}/"
+    react_path = f"/api/v1/books/react/reviews/{review_id}/"
+
+    def uncached(*namespaces):
+        def decorator(func):
+            def scenario():
+                bump_versions(*namespaces)
+                return func()
+            return scenario
+        return decorator
+
+    @uncached(BOOKS_NAMESPACE)
+    def book_list_uncached():
+        return call(book_list, "get", books_path)
+
+    @uncached(BOOKS_NAMESPACE)
+    def book_list_cursor():
+        return call(book_list, "get", f"{books_path}?paginate=cursor&ordering=-rating")
+
+    @uncached(BOOKS_NAMESPACE)
+    def book_search():
+        return call(book_list, "get", f"{books_path}?search={search_term}")
+
+    @uncached(book_namespace(hot_book_id))
+    def book_detail_uncached():
+        return call(book_detail, "get", hot_book_path, book_id=str(hot_book_id))
+
+    def reaction_toggle():
+        call(react, "put", react_path, {"reaction": "LIKE"}, user=user, review_id=str(review_id))
+        call(cancel, "delete", f"{react_path}cancel/", user=user, review_id=str(review_id))
+
+    return {
+        "book list": lambda: call(book_list, "get", books_path),
+        "book list, uncached": book_list_uncached,
+        "book list, cursor by rating, uncached": book_list_cursor,
+        f"book search '{search_term}', uncached": book_search,
+        "book detail": lambda: call(book_detail, "get", hot_book_path, book_id=str(hot_book_id)),
+        "book detail, uncached": book_detail_uncached,
+        "review list, hot book": lambda: call(
+            review_list, "get", f"{hot_book_path}reviews/", book_id=str(hot_book_id)
+        ),
+        "review list, cold book": lambda: call(
+            review_list, "get", f"/api/v1/books/{cold_book_id}/reviews/", book_id=str(cold_book_id)
+        ),
+        "review create": lambda: call(
+            review_create, "post", "/api/v1/books/reviews/", {"book": cold_book_id, "rating": 4}, user=user
+        ),
+        "reaction toggle (PUT + cancel)": reaction_toggle,
+    }
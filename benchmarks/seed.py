@@ -0,0 +1,146 @@
+from django.db import connection
+
+from book.models import Book, Category, Review
+
+
+def seed_users(count):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO auth_user (
+                password, is_superuser, username, first_name, last_name,
+                email, is_staff, is_active, date_joined
+            )
+            SELECT '!', false, 'bench_user_' || g, '', '', '', false, true, NOW()
+            FROM generate_series(1, %s) g
+            ON CONFLICT (username) DO NOTHING
+            """,
+            [count],
+        )
+
+
+def seed_categories(count):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO book_category (slug, title, books_count, rating_sum, rating_count)
+            SELECT 'bench-category-' || g, 'Bench category ' || g, 0, 0, 0
+            FROM generate_series(1, %s) g
+            ON CONFLICT (slug) DO NOTHING
+            """,
+            [count],
+        )
+
+
+TITLE_WORDS = [
+    "shadow", "dragon", "winter", "garden", "silent", "empire", "river", "stone", "secret", "night",
+    "glass", "crown", "forest", "ocean", "letter", "fire", "mirror", "storm", "house", "journey",
+]
+
+
+def seed_books(count, categories):
+    """Titles are built from `TITLE_WORDS` so that searches hit a realistic share of rows."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO book_book (
+                title, author, category_id, description, cover_img, cover_thumbnails, rating, rating_sum, rating_count,
+                rating_1_count, rating_2_count, rating_3_count, rating_4_count, rating_5_count
+            )
+            SELECT
+                initcap(words[1 + g %% array_length(words, 1)]) || ' of the '
+                    || initcap(words[1 + (g / 20) %% array_length(words, 1)]) || ' ' || g,
+                'Bench author ' || (g %% 1000),
+                'bench-category-' || (1 + g %% %s),
+                'A story about the ' || words[1 + (g / 400) %% array_length(words, 1)]
+                    || ' and the ' || words[1 + (g / 7) %% array_length(words, 1)] || '.',
+                '',
+                '{}',
+                1,
+                0,
+                0,
+                0, 0, 0, 0, 0
+            FROM generate_series(1, %s) g, (SELECT %s::text[] AS words) vocabulary
+            """,
+            [categories, count, TITLE_WORDS],
+        )
+
+
+def seed_reviews(count, hot_share=0.5, skew=1.0):
+    """
+    Spreads `count` reviews over the seeded books and users, `hot_share` of them
+    land on the first book so there is one very popular book to page through.
+    A `skew` above 1 makes the rest follow a power law: the book at position
+    `books * random() ** skew` gets the review, so low ids are the popular ones.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            WITH bounds AS (
+                SELECT
+                    (SELECT MIN(id) FROM book_book) AS min_book,
+                    (SELECT COUNT(*) FROM book_book) AS books,
+                    (SELECT MIN(id) FROM auth_user WHERE username LIKE 'bench_user_%%') AS min_user,
+                    (SELECT COUNT(*) FROM auth_user WHERE username LIKE 'bench_user_%%') AS users
+            )
+            INSERT INTO book_review (book_id, user_id, comment, rating, created_at, likes_count, dislikes_count)
+            SELECT
+                CASE
+                    WHEN random() < %s THEN bounds.min_book
+                    ELSE bounds.min_book + floor(power(random(), %s) * bounds.books)::bigint
+                END,
+                bounds.min_user + (g %% bounds.users),
+                'Synthetic review ' || g,
+                1 + floor(random() * 5)::int,
+                NOW() - (g || ' seconds')::interval,
+                0,
+                0
+            FROM bounds, generate_series(1, %s) g
+            """,
+            [hot_share, skew, count],
+        )
+
+
+def seed_reactions(count):
+    """Each (review, user) pair is unique by construction, duplicates are skipped anyway."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            WITH bounds AS (
+                SELECT
+                    (SELECT MIN(id) FROM book_review) AS min_review,
+                    (SELECT COUNT(*) FROM book_review) AS reviews,
+                    (SELECT MIN(id) FROM auth_user WHERE username LIKE 'bench_user_%%') AS min_user,
+                    (SELECT COUNT(*) FROM auth_user WHERE username LIKE 'bench_user_%%') AS users
+            )
+            INSERT INTO book_reviewreaction (review_id, user_id, reaction, created_at, updated_at)
+            SELECT
+                bounds.min_review + (g %% bounds.reviews),
+                bounds.min_user + ((g / bounds.reviews) %% bounds.users),
+                CASE WHEN random() < 0.7 THEN 'LIKE' ELSE 'DIS' END,
+                NOW(),
+                NOW()
+            FROM bounds, generate_series(1, %s) g
+            ON CONFLICT (review_id, user_id) DO NOTHING
+            """,
+            [count],
+        )
+
+
+def seed_dataset(
+    categories=10, books=10_000, users=10_000, reviews=1_000_000, reactions=1_000_000, hot_share=0.5, skew=1.0
+):
+    seed_categories(categories)
+    seed_books(books, categories)
+    seed_users(users)
+    seed_reviews(reviews, hot_share=hot_share, skew=skew)
+    Book.objects.recalculate_ratings()
+    Category.objects.recalculate_stats()
+    seed_reactions(reactions)
+    Review.objects.rebuild_reaction_counts()
+    analyze()
+
+
+def analyze():
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
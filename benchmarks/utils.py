@@ -0,0 +1,133 @@
+import json
+import statistics
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from functools import partial
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+BENCHMARK_DATABASE_PREFIX = "bench_"
+
+
+def _seed_params():
+    with connection.cursor() as cursor:
+        cursor.execute("CREATE TABLE IF NOT EXISTS benchmark_seed (params text NOT NULL)")
+        cursor.execute("SELECT params FROM benchmark_seed")
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _save_seed_params(params):
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM benchmark_seed")
+        cursor.execute("INSERT INTO benchmark_seed (params) VALUES (%s)", [params])
+
+
+@contextmanager
+def benchmark_database(seed, seed_params, keepdb=False, verbosity=1):
+    """
+    Runs the benchmark against a throwaway `bench_<NAME>` database, apart from
+    the real one and from the `test_<NAME>` database of the test suite, and
+    fills it with `seed()`. With `keepdb` the seeded database survives between
+    runs; it is only reused by a run with the same `seed_params`, which name
+    the command and the sizes it seeds, otherwise it is created again.
+    """
+    params = json.dumps(seed_params, sort_keys=True)
+    old_name = connection.settings_dict["NAME"]
+    test_settings = connection.settings_dict["TEST"]
+    old_test_name = test_settings["NAME"]
+    test_settings["NAME"] = BENCHMARK_DATABASE_PREFIX + old_name
+    try:
+        connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, keepdb=keepdb, serialize=False)
+        try:
+            if _seed_params() != params:
+                if keepdb:
+                    # seeded by another command, with other sizes or not to the end
+                    connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+                    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+                seed()
+                _save_seed_params(params)
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=verbosity, keepdb=keepdb)
+    finally:
+        test_settings["NAME"] = old_test_name
+
+
+class BenchmarkCommand(BaseCommand, ABC):
+    """
+    A benchmark run in a `benchmark_database` filled by `seed()`. The seeded
+    database is named by `dataset` and the `dataset_options` of the command,
+    a kept database seeded with the same ones is reused by other commands.
+    """
+
+    dataset = None
+    dataset_options = ()
+
+    def add_arguments(self, parser):
+        parser.add_argument("--keepdb", action="store_true", help="Reuse the seeded benchmark database")
+
+    def handle(self, *args, **options):
+        with benchmark_database(
+            partial(self.seed, options), self.get_seed_params(options),
+            keepdb=options["keepdb"], verbosity=options["verbosity"],
+        ):
+            self.benchmark(options)
+
+    def get_seed_params(self, options):
+        return {"dataset": self.dataset, **{name: options[name] for name in self.dataset_options}}
+
+    @abstractmethod
+    def seed(self, options):
+        """Fills the empty benchmark database."""
+
+    @abstractmethod
+    def benchmark(self, options):
+        """Runs the benchmark against the seeded database."""
+
+
+def percentile(samples, percent):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class QueryCounter:
+    """A `connection.execute_wrapper` counting the queries of the calls it wraps."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(func, repeat=50, warmup=3):
+    """Calls `func` `repeat` times and returns latency stats in milliseconds and the queries per call."""
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - started) * 1000)
+
+    return {
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+        "mean": statistics.fmean(samples),
+        "queries": counter.count / repeat,
+    }
+
+
+def format_stats(name, stats):
+    return (
+        "{name:<40} p50={p50:8.2f}ms p95={p95:8.2f}ms p99={p99:8.2f}ms mean={mean:8.2f}ms queries={queries:5.1f}"
+    ).format(name=name, **stats)
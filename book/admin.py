@@ -5,7 +5,7 @@ from book.models import Category, Book, Review, ReviewReaction
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ("slug", "title")
+    list_display = ("slug", "title", "books_count", "average_rating")
     search_fields = ("slug", "title",)
     prepopulated_fields = {'slug': ('title',), }
     list_per_page = 10
@@ -14,11 +14,17 @@ class CategoryAdmin(admin.ModelAdmin):
 @admin.register(Book)
 class BookAdmin(admin.ModelAdmin):
     autocomplete_fields = ("category",)
-    list_display = ("id", "title", "category", "rating")
+    list_display = ("id", "title", "category", "rating", "rating_count")
     list_filter = ("rating",)
     search_fields = ("id", "title",)
     list_per_page = 10
 
+    def get_readonly_fields(self, request, obj=None):
+        # the starting rating of a new book is entered, afterwards the reviews keep it, see `Book.save`
+        if obj is None:
+            return super().get_readonly_fields(request, obj)
+        return (*super().get_readonly_fields(request, obj), "rating")
+
 
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
@@ -30,7 +36,7 @@ class ReviewAdmin(admin.ModelAdmin):
 
     @admin.display(description='Reactions')
     def reactions(self, obj) -> int:
-        return obj.reacts.count()
+        return obj.likes_count + obj.dislikes_count
 
 
 @admin.register(ReviewReaction)
@@ -0,0 +1,99 @@
+"""
+Async versions of the hot read endpoints, routed instead of the DRF views when
+`ASYNC_READ_VIEWS` is set for the ASGI deployment (see `web-runner.sh`).
+
+They reuse the querysets, filters, pagination and serializers of the sync
+views and render the same JSON, but wait for Postgres and Redis through the
+async ORM and cache APIs: under uvicorn workers a slow query holds a
+coroutine, not a worker. The cached entries are shared with the sync views.
+They serve JSON to GET and HEAD requests only, without the browsable API.
+"""
+from functools import wraps
+from http import HTTPMethod
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import Http404, HttpResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, MethodNotAllowed
+from rest_framework.request import Request
+from rest_framework.views import exception_handler
+
+from book.cache import BOOKS_NAMESPACE, CATEGORIES_NAMESPACE, acache_response, book_namespace, reviews_namespace
+from book.conditional import aconditional_response
+from book.views import BookViewSet, ReviewListAPIView, newest_reviews
+from book_platform.metrics import render_timer, serialize_timer
+from book_platform.renderers import ORJSONRenderer
+
+ALLOWED_METHODS = (HTTPMethod.GET, HTTPMethod.HEAD)
+
+renderer = ORJSONRenderer()
+
+
+def render(data, status_code=status.HTTP_200_OK, headers=None):
+    with render_timer():
+        content = renderer.render(data)
+    return HttpResponse(content, content_type=renderer.media_type, status=status_code, headers=headers)
+
+
+def async_api_view(view):
+    """Renders the payload a read endpoint coroutine returns, and its errors the way DRF does."""
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            if request.method not in ALLOWED_METHODS:
+                raise MethodNotAllowed(request.method)
+            data = await view(Request(request), *args, **kwargs)
+        except (Http404, APIException) as exc:
+            response = exception_handler(exc, {"request": request})
+            headers = {"Allow": ", ".join(ALLOWED_METHODS)} if isinstance(exc, MethodNotAllowed) else None
+            return render(response.data, response.status_code, headers)
+        return render(data)
+    return wrapper
+
+
+async def paginated_data(view, queryset):
+    # the `ValuesListMixin.list` of the sync views
+    serializer = view.get_values_serializer()
+    queryset = serializer.values(queryset)
+
+    page = await view.paginator.apaginate_queryset(queryset, view.request, view)
+    if page is None:
+        return serializer.serialize([row async for row in queryset])
+    return view.paginator.get_paginated_response(serializer.serialize(page)).data
+
+
+@async_api_view
+@acache_response("books-list", BOOKS_NAMESPACE)
+async def book_list(request):
+    view = BookViewSet(request=request, args=(), kwargs={}, format_kwarg=None, action="list")
+    return await paginated_data(view, view.filter_queryset(view.get_queryset()))
+
+
+@aconditional_response(
+    "books-detail", lambda book_id, **kwargs: book_namespace(book_id), CATEGORIES_NAMESPACE,
+    last_modified=newest_reviews,
+)
+@async_api_view
+@acache_response("books-detail", lambda book_id, **kwargs: book_namespace(book_id), CATEGORIES_NAMESPACE)
+async def book_detail(request, book_id):
+    view = BookViewSet(request=request, args=(), kwargs={"book_id": book_id}, format_kwarg=None, action="retrieve")
+    queryset = view.filter_queryset(view.get_queryset())
+    # the same errors as `get_object_or_404` of DRF
+    try:
+        book = await queryset.aget(**{view.lookup_field: book_id})
+    except queryset.model.DoesNotExist:
+        raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+    except (TypeError, ValueError, DjangoValidationError):
+        raise Http404
+    with serialize_timer():
+        return view.get_serializer(book).data
+
+
+@aconditional_response(
+    "book-reviews-list", lambda book_id, **kwargs: reviews_namespace(book_id), last_modified=newest_reviews,
+)
+@async_api_view
+async def review_list(request, book_id):
+    view = ReviewListAPIView(request=request, args=(), kwargs={"book_id": book_id}, format_kwarg=None)
+    return await paginated_data(view, view.filter_queryset(view.get_queryset()))
@@ -0,0 +1,237 @@
+"""
+Versioned response cache for the book endpoints.
+
+Every cached response key embeds the current version of the namespaces it
+depends on. Model signals bump those versions, so stale entries are simply
+never read again and expire on their own, which makes long TTLs safe.
+"""
+import hashlib
+import time
+from functools import partial, wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+BOOKS_NAMESPACE = "books"
+CATEGORIES_NAMESPACE = "categories"
+# book counts and ratings of the category listing
+CATEGORY_STATS_NAMESPACE = "category-stats"
+
+HITS = "hits"
+MISSES = "misses"
+
+# names of the cached views, filled by `cache_response`
+cached_view_names = []
+
+
+def _register(name):
+    # a sync and an async view may share their entries under one name
+    if name not in cached_view_names:
+        cached_view_names.append(name)
+
+
+def book_namespace(book_id):
+    return f"book:{book_id}"
+
+
+def reviews_namespace(book_id):
+    # the reviews of a book with their reaction counters, apart from `book_namespace`
+    # so that reactions on a hot book leave its cached detail alone
+    return f"reviews:{book_id}"
+
+
+def get_cache():
+    return caches[settings.BOOK_CACHE_ALIAS]
+
+
+def _version_key(namespace):
+    return f"version:{namespace}"
+
+
+def _stats_key(name, outcome):
+    return f"stats:{name}:{outcome}"
+
+
+def _version_timeout():
+    # Any id in a URL gets a version key, expiring keeps crawled ids from piling up.
+    # An expired version is reseeded ahead of the old ones, like a lost one.
+    return settings.BOOK_CACHE_TIMEOUT
+
+
+def _incr(key, timeout=None):
+    cache = get_cache()
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # A lost key must never restart from a value that was already handed out,
+        # a timestamp based seed keeps new versions ahead of the old ones.
+        cache.add(key, time.time_ns(), timeout=timeout)
+        return cache.incr(key)
+
+
+async def _aincr(key):
+    cache = get_cache()
+    try:
+        return await cache.aincr(key)
+    except ValueError:
+        await cache.aadd(key, time.time_ns(), timeout=None)
+        return await cache.aincr(key)
+
+
+def get_versions(*namespaces):
+    cache = get_cache()
+    keys = [_version_key(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=_version_timeout())
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+async def aget_versions(*namespaces):
+    cache = get_cache()
+    keys = [_version_key(namespace) for namespace in namespaces]
+    versions = await cache.aget_many(keys)
+
+    for key in keys:
+        if key not in versions:
+            await cache.aadd(key, time.time_ns(), timeout=_version_timeout())
+            versions[key] = await cache.aget(key)
+    return [versions[key] for key in keys]
+
+
+def _incr_versions(namespaces):
+    for namespace in namespaces:
+        _incr(_version_key(namespace), _version_timeout())
+
+
+def bump_versions(*namespaces):
+    _incr_versions(namespaces)
+
+    # Readers inside the commit window may cache the old rows under the new
+    # version, bump once more when the data is actually visible.
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(partial(_incr_versions, namespaces))
+
+
+def record(name, outcome):
+    _incr(_stats_key(name, outcome))
+
+
+async def arecord(name, outcome):
+    await _aincr(_stats_key(name, outcome))
+
+
+def get_stats(name):
+    cache = get_cache()
+    stats = cache.get_many([_stats_key(name, HITS), _stats_key(name, MISSES)])
+    return {
+        HITS: stats.get(_stats_key(name, HITS), 0),
+        MISSES: stats.get(_stats_key(name, MISSES), 0),
+    }
+
+
+def reset_stats(name):
+    get_cache().delete_many([_stats_key(name, HITS), _stats_key(name, MISSES)])
+
+
+def _response_cache_key(name, request, versions):
+    versions = ".".join(str(version) for version in versions)
+    # hyperlinks in the payload are absolute, so the host is part of the key
+    digest = hashlib.md5(request.build_absolute_uri().encode("utf-8")).hexdigest()
+    return f"response:{name}:{versions}:{digest}"
+
+
+def response_cache_key(name, request, namespaces):
+    return _response_cache_key(name, request, get_versions(*namespaces))
+
+
+async def aresponse_cache_key(name, request, namespaces):
+    return _response_cache_key(name, request, await aget_versions(*namespaces))
+
+
+def _resolve(namespaces, kwargs):
+    return [namespace(**kwargs) if callable(namespace) else namespace for namespace in namespaces]
+
+
+def cache_response(name, *namespaces, timeout=None):
+    """
+    Caches `response.data` of a DRF view method.
+
+    `namespaces` are names or callables receiving the view kwargs,
+    e.g. `lambda book_id, **kwargs: book_namespace(book_id)`.
+    """
+    _register(name)
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            cache = get_cache()
+            key = response_cache_key(name, request, _resolve(namespaces, kwargs))
+
+            data = cache.get(key)
+            if data is not None:
+                record(name, HITS)
+                return Response(data)
+
+            record(name, MISSES)
+            response = method(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, settings.BOOK_CACHE_TIMEOUT if timeout is None else timeout)
+            return response
+        return wrapper
+    return decorator
+
+
+def cache_result(name, *namespaces, timeout=None):
+    """Caches the result of a function without arguments, for payloads that don't depend on the request."""
+    _register(name)
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper():
+            cache = get_cache()
+            versions = ".".join(str(version) for version in get_versions(*namespaces))
+            key = f"result:{name}:{versions}"
+
+            data = cache.get(key)
+            if data is not None:
+                record(name, HITS)
+                return data
+
+            record(name, MISSES)
+            data = func()
+            cache.set(key, data, settings.BOOK_CACHE_TIMEOUT if timeout is None else timeout)
+            return data
+        return wrapper
+    return decorator
+
+
+def acache_response(name, *namespaces, timeout=None):
+    """
+    `cache_response` for a coroutine computing the payload of an async view,
+    entries of the same `name` are shared with the sync view.
+    """
+    _register(name)
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(request, *args, **kwargs):
+            cache = get_cache()
+            key = await aresponse_cache_key(name, request, _resolve(namespaces, kwargs))
+
+            data = await cache.aget(key)
+            if data is not None:
+                await arecord(name, HITS)
+                return data
+
+            await arecord(name, MISSES)
+            data = await func(request, *args, **kwargs)
+            await cache.aset(key, data, settings.BOOK_CACHE_TIMEOUT if timeout is None else timeout)
+            return data
+        return wrapper
+    return decorator
@@ -0,0 +1,130 @@
+"""
+HTTP conditional requests for the book resources.
+
+The strong ETag of a response is derived from the versions of the cache
+namespaces it depends on (see book/cache.py), so `If-None-Match` is answered
+with a 304 after one Redis lookup, before the view queries or serializes
+anything. `Last-Modified` comes from a `last_modified` queryset of datetimes,
+the newest one counts, and is cached under the same versions.
+
+`Last-Modified` only moves with the newest review: clients revalidating with
+`If-Modified-Since` alone miss edits, deletions and reactions, the ETag
+follows all of them. If-None-Match takes precedence when both are sent.
+"""
+import hashlib
+from functools import wraps
+from http import HTTPMethod
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from book.cache import _resolve, aget_versions, get_cache, get_versions
+
+CONDITIONAL_METHODS = (HTTPMethod.GET, HTTPMethod.HEAD)
+
+# a resource without any review, no `Last-Modified` is sent
+NEVER = 0
+
+
+def _etag(request, versions):
+    # the URL tells the resources and pages apart, Accept the renderers
+    source = "\n".join((
+        ".".join(str(version) for version in versions),
+        request.build_absolute_uri(),
+        request.META.get("HTTP_ACCEPT", ""),
+    ))
+    return quote_etag(hashlib.md5(source.encode("utf-8")).hexdigest())
+
+
+def _last_modified_key(name, versions):
+    versions = ".".join(str(version) for version in versions)
+    return f"last-modified:{name}:{versions}"
+
+
+def _timestamp(newest):
+    return int(newest.timestamp()) if newest is not None else NEVER
+
+
+def _finish(response, etag, timestamp):
+    # a 304 repeats the validators of the 200 it stands for
+    if response.status_code in (200, 304):
+        response.headers["ETag"] = etag
+        if timestamp:
+            response.headers["Last-Modified"] = http_date(timestamp)
+    return response
+
+
+def conditional_response(name, *namespaces, last_modified=None):
+    """
+    Answers conditional GET and HEAD requests of a DRF view method.
+
+    `namespaces` are names or callables receiving the view kwargs, as for
+    `cache_response`; `last_modified` receives the view kwargs and returns
+    a queryset of datetimes ordered newest first.
+    """
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            if request.method not in CONDITIONAL_METHODS:
+                return method(view, request, *args, **kwargs)
+
+            versions = get_versions(*_resolve(namespaces, kwargs))
+            etag = _etag(request, versions)
+
+            def get_timestamp():
+                if last_modified is None:
+                    return NEVER
+                cache = get_cache()
+                key = _last_modified_key(name, versions)
+                timestamp = cache.get(key)
+                if timestamp is None:
+                    timestamp = _timestamp(last_modified(**kwargs).first())
+                    cache.set(key, timestamp, settings.BOOK_CACHE_TIMEOUT)
+                return timestamp
+
+            # If-Modified-Since is not evaluated along with If-None-Match, no lookup is needed to answer
+            timestamp = None if "HTTP_IF_NONE_MATCH" in request.META else get_timestamp()
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp or None)
+            if response is None:
+                response = method(view, request, *args, **kwargs)
+            if timestamp is None and response.status_code == 200:
+                timestamp = get_timestamp()
+            return _finish(response, etag, timestamp)
+        return wrapper
+    return decorator
+
+
+def aconditional_response(name, *namespaces, last_modified=None):
+    """`conditional_response` for an async view, the ETags are the same as the sync view's."""
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in CONDITIONAL_METHODS:
+                return await view(request, *args, **kwargs)
+
+            versions = await aget_versions(*_resolve(namespaces, kwargs))
+            etag = _etag(request, versions)
+
+            async def get_timestamp():
+                if last_modified is None:
+                    return NEVER
+                cache = get_cache()
+                key = _last_modified_key(name, versions)
+                timestamp = await cache.aget(key)
+                if timestamp is None:
+                    timestamp = _timestamp(await last_modified(**kwargs).afirst())
+                    await cache.aset(key, timestamp, settings.BOOK_CACHE_TIMEOUT)
+                return timestamp
+
+            timestamp = None if "HTTP_IF_NONE_MATCH" in request.META else await get_timestamp()
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp or None)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if timestamp is None and response.status_code == 200:
+                timestamp = await get_timestamp()
+            return _finish(response, etag, timestamp)
+        return wrapper
+    return decorator
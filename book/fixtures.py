@@ -0,0 +1,178 @@
+"""
+Streaming fixture loader used by the `load_fixtures` command.
+
+Unlike `loaddata` the file is never read into memory as a whole: objects are
+decoded one at a time, deserialized in batches and upserted with a single
+`INSERT ... ON CONFLICT` per batch. Model signals don't fire, so the derived
+book ratings, category stats and cache versions are refreshed once at the end.
+"""
+import hashlib
+import json
+import os
+import re
+
+from django.apps import apps
+from django.core.management.color import no_style
+from django.core.serializers.base import DeserializationError
+from django.core.serializers.python import Deserializer
+from django.db import connection, transaction
+
+from book.cache import (
+    BOOKS_NAMESPACE, CATEGORIES_NAMESPACE, CATEGORY_STATS_NAMESPACE, book_namespace, bump_versions
+)
+from book.models import Book, Category, FixtureLoad
+
+READ_SIZE = 64 * 1024
+
+_whitespace = re.compile(r"\s*")
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(READ_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_json_array(file, read_size=READ_SIZE):
+    """Yields the items of the top level JSON array of `file` one by one."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+
+    while True:
+        chunk = file.read(read_size)
+        buffer = buffer[position:] + chunk
+        position = 0
+
+        while True:
+            position = _whitespace.match(buffer, position).end()
+            if not started:
+                if not buffer[position:position + 1]:
+                    break
+                if buffer[position] != "[":
+                    raise DeserializationError("A fixture must be a JSON array")
+                started = True
+                position += 1
+                continue
+
+            if buffer[position:position + 1] == ",":
+                position += 1
+                continue
+            if buffer[position:position + 1] == "]":
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break  # the item continues in the next chunk
+            yield item
+
+        if not chunk:
+            raise DeserializationError("Unexpected end of the fixture")
+
+
+def load_fixture(path, batch_size=1000, force=False):
+    """
+    Loads one fixture file and returns the number of objects, or None when a
+    file with the same content has been loaded before.
+    """
+    sha256 = file_sha256(path)
+    if not force and FixtureLoad.objects.filter(sha256=sha256).exists():
+        return None
+
+    with transaction.atomic():
+        # containers starting at the same time load a file only once
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [int(sha256[:15], 16)])
+        if not force and FixtureLoad.objects.filter(sha256=sha256).exists():
+            return None
+
+        loader = _BatchLoader(batch_size)
+        with open(path, encoding="utf-8") as file:
+            for item in iter_json_array(file):
+                loader.add(item)
+        loader.flush()
+        loader.finish()
+
+        FixtureLoad.objects.update_or_create(
+            sha256=sha256,
+            defaults={"name": os.path.basename(path), "objects_count": loader.count},
+        )
+    return loader.count
+
+
+class _BatchLoader:
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.model = None
+        self.items = []
+        self.count = 0
+        self.models = set()
+        self.book_ids = set()
+
+    def add(self, item):
+        try:
+            model = apps.get_model(item["model"])
+        except (KeyError, LookupError) as exc:
+            raise DeserializationError(f"Invalid model identifier in {item!r}") from exc
+
+        # flushing on every model change keeps the order the fixture relies on
+        if model is not self.model or len(self.items) >= self.batch_size:
+            self.flush()
+            self.model = model
+        self.items.append(item)
+
+    def flush(self):
+        if not self.items:
+            return
+        model, items = self.model, self.items
+        self.items = []
+
+        objects = []
+        for deserialized in Deserializer(items):
+            if deserialized.m2m_data:
+                raise DeserializationError("Many to many relations are not supported, use loaddata")
+            objects.append(deserialized.object)
+
+        with_pk = [obj for obj in objects if obj.pk is not None]
+        without_pk = [obj for obj in objects if obj.pk is None]
+
+        if with_pk:
+            pk_name = model._meta.pk.name
+            concrete = {field.name for field in model._meta.concrete_fields if not field.generated}
+            # only the columns the fixture spells out, derived counters keep their values
+            update_fields = sorted({
+                name for item in items for name in item.get("fields", {})
+                if name in concrete and name != pk_name
+            })
+            if update_fields:
+                model.objects.bulk_create(
+                    with_pk, update_conflicts=True, unique_fields=[pk_name], update_fields=update_fields,
+                )
+            else:
+                model.objects.bulk_create(with_pk, ignore_conflicts=True)
+        if without_pk:
+            model.objects.bulk_create(without_pk)
+
+        self.count += len(objects)
+        self.models.add(model)
+        if model is Book:
+            self.book_ids.update(obj.pk for obj in objects)
+
+    def finish(self):
+        # explicit primary keys don't advance the sequences
+        statements = connection.ops.sequence_reset_sql(no_style(), list(self.models))
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+        if self.book_ids:
+            Book.objects.filter(pk__in=self.book_ids).recalculate_ratings()
+        if self.models & {Book, Category}:
+            Category.objects.recalculate_stats()
+            bump_versions(
+                BOOKS_NAMESPACE, CATEGORIES_NAMESPACE, CATEGORY_STATS_NAMESPACE,
+                *(book_namespace(book_id) for book_id in self.book_ids),
+            )
@@ -0,0 +1,110 @@
+"""
+Cover thumbnails.
+
+Every cover is rendered into the fixed sizes of `COVER_THUMBNAIL_SIZES` in each
+of `COVER_THUMBNAIL_FORMATS`. File names carry a hash of their content, so a
+URL never changes its bytes and nginx may cache `media/books/thumbs/` forever.
+Rendering runs in a small thread pool after the book is committed, Pillow
+releases the GIL while decoding and resampling.
+"""
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections
+from PIL import Image, ImageOps
+
+from book.cache import BOOKS_NAMESPACE, book_namespace, bump_versions
+from book.models import Book
+
+logger = logging.getLogger(__name__)
+
+THUMBNAILS_DIR = "books/thumbs"
+
+SAVE_OPTIONS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "jpeg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+}
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.COVER_THUMBNAIL_WORKERS, thread_name_prefix="cover-thumbnails"
+        )
+    return _executor
+
+
+def _open_cover(file):
+    image = Image.open(file)
+    # JPEG covers are decoded at a reduced scale when it is still large enough
+    sizes = settings.COVER_THUMBNAIL_SIZES.values()
+    image.draft("RGB", (max(width for width, _ in sizes), max(height for _, height in sizes)))
+    image = ImageOps.exif_transpose(image)
+
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def render_thumbnails(file, storage):
+    """Writes the thumbnails of one cover and returns their names by size and format."""
+    cover = _open_cover(file)
+
+    thumbnails = {}
+    for label, size in settings.COVER_THUMBNAIL_SIZES.items():
+        thumbnail = ImageOps.fit(cover, size, Image.Resampling.LANCZOS)
+        thumbnails[label] = {}
+        for extension in settings.COVER_THUMBNAIL_FORMATS:
+            buffer = io.BytesIO()
+            thumbnail.save(buffer, **SAVE_OPTIONS[extension])
+            content = buffer.getvalue()
+
+            digest = hashlib.sha256(content).hexdigest()[:20]
+            name = f"{THUMBNAILS_DIR}/{digest}-{label}.{extension}"
+            if not storage.exists(name):
+                name = storage.save(name, ContentFile(content))
+            thumbnails[label][extension] = name
+    return thumbnails
+
+
+def generate_cover_thumbnails(book_id):
+    """Renders the thumbnails of the current cover of a book and stores their names on it."""
+    book = Book.objects.only("id", "cover_img").filter(pk=book_id).first()
+    if book is None or not book.cover_img:
+        return None
+
+    with book.cover_img.open("rb") as file:
+        thumbnails = render_thumbnails(file, book.cover_img.storage)
+
+    cover_thumbnails = {"source": book.cover_img.name, "sizes": thumbnails}
+    # the cover may have been replaced while rendering, its own job will take over
+    updated = Book.objects.filter(pk=book_id, cover_img=book.cover_img.name).update(
+        cover_thumbnails=cover_thumbnails
+    )
+    if updated:
+        bump_versions(BOOKS_NAMESPACE, book_namespace(book_id))
+    return cover_thumbnails
+
+
+def _run(book_id):
+    try:
+        return generate_cover_thumbnails(book_id)
+    except Exception:
+        logger.exception("Cover thumbnails of book %s failed", book_id)
+    finally:
+        # pool threads are not request threads, nothing else closes their connections
+        connections.close_all()
+
+
+def schedule_cover_thumbnails(book_id):
+    return _get_executor().submit(_run, book_id)
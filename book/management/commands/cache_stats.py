@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from book import cache
+import book.views  # noqa: F401, registers the cached views
+
+
+class Command(BaseCommand):
+    help = "Shows hit/miss counters of the versioned book response cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Reset the counters after printing")
+
+    def handle(self, *args, **options):
+        for name in cache.cached_view_names:
+            stats = cache.get_stats(name)
+            total = stats[cache.HITS] + stats[cache.MISSES]
+            ratio = stats[cache.HITS] / total if total else 0
+            self.stdout.write(
+                f"{name:<20} hits={stats[cache.HITS]:<10} misses={stats[cache.MISSES]:<10} hit ratio={ratio:.2%}"
+            )
+            if options["reset"]:
+                cache.reset_stats(name)
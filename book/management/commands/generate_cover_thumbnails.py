@@ -0,0 +1,43 @@
+from concurrent.futures import wait
+
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from django.db.models.fields.json import KT
+
+from book.images import schedule_cover_thumbnails
+from book.models import Book
+
+
+class Command(BaseCommand):
+    help = "Renders missing or outdated cover thumbnails, e.g. of books loaded from fixtures"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Render the thumbnails of every cover again")
+        parser.add_argument("--batch-size", type=int, default=100)
+
+    def handle(self, *args, **options):
+        books = Book.objects.exclude(Q(cover_img="") | Q(cover_img__isnull=True))
+        if not options["all"]:
+            books = books.alias(source=KT("cover_thumbnails__source")).filter(
+                Q(source__isnull=True) | ~Q(source=F("cover_img"))
+            )
+
+        rendered = failed = 0
+        book_ids = books.order_by("id").values_list("id", flat=True).iterator(chunk_size=options["batch_size"])
+        batch = []
+        for book_id in book_ids:
+            batch.append(schedule_cover_thumbnails(book_id))
+            if len(batch) >= options["batch_size"]:
+                done, failures = self.collect(batch)
+                rendered, failed, batch = rendered + done, failed + failures, []
+        done, failures = self.collect(batch)
+        rendered, failed = rendered + done, failed + failures
+
+        self.stdout.write(self.style.SUCCESS(f"Rendered thumbnails of {rendered} covers"))
+        if failed:
+            self.stderr.write(f"{failed} covers failed, see the log")
+
+    def collect(self, futures):
+        wait(futures)
+        done = sum(future.result() is not None for future in futures)
+        return done, len(futures) - done
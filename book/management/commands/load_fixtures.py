@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.base import DeserializationError
+
+from book.fixtures import load_fixture
+
+
+class Command(BaseCommand):
+    help = "Streams fixture files and upserts them in batches, files loaded before are skipped"
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--force", action="store_true", help="Load files even if their content was loaded before")
+
+    def handle(self, *args, **options):
+        for path in options["paths"]:
+            try:
+                count = load_fixture(path, batch_size=options["batch_size"], force=options["force"])
+            except (OSError, DeserializationError) as exc:
+                raise CommandError(f"Could not load {path}: {exc}") from exc
+
+            if count is None:
+                self.stdout.write(f"Skipped {path}, already loaded")
+            else:
+                self.stdout.write(self.style.SUCCESS(f"Loaded {count} objects from {path}"))
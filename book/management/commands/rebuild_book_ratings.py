@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from book.models import Book, Category
+
+
+class Command(BaseCommand):
+    help = "Recomputes the running rating sums and counts of books from their reviews, then the category stats"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        last_id = Book.objects.aggregate(last_id=Max("id"))["last_id"] or 0
+
+        updated = 0
+        for start in range(0, last_id + 1, batch_size):
+            updated += Book.objects.filter(id__gte=start, id__lt=start + batch_size).recalculate_ratings()
+
+        categories = Category.objects.recalculate_stats()
+        self.stdout.write(self.style.SUCCESS(f"Recomputed ratings of {updated} books and stats of {categories} categories"))
@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from book import ranking
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the top and trending book rankings in Redis from the database, "
+        "run it on cold starts and periodically (`--every`) to move the trending epoch forward"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument(
+            "--if-missing", action="store_true",
+            help="Only rebuild when Redis has no rankings, with --every for the first round only",
+        )
+        parser.add_argument("--every", type=int, default=None, help="Keep running and rebuild every N seconds")
+
+    def handle(self, *args, **options):
+        self.rebuild(options["batch_size"], options["if_missing"])
+        every = options["every"]
+        if every is None:
+            return
+
+        while True:
+            time.sleep(every)
+            try:
+                self.rebuild(options["batch_size"])
+            except Exception as exc:
+                # the current rankings stay in place, the next round tries again
+                self.stderr.write(f"Rebuilding the rankings failed: {exc}")
+            close_old_connections()
+
+    def rebuild(self, batch_size, if_missing=False):
+        client = ranking.get_client()
+        if if_missing and client.exists(*ranking.RANKINGS) == len(ranking.RANKINGS):
+            self.stdout.write("Rankings are in place")
+            return
+
+        ranking.rebuild_top(batch_size)
+        ranking.rebuild_trending(batch_size)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Ranked {client.zcard(ranking.TOP)} top and {client.zcard(ranking.TRENDING)} trending books"
+        ))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Max, Q
+
+from book.models import Review, REACTION_COUNTER_FIELDS
+
+
+class Command(BaseCommand):
+    help = "Rebuilds (or with --verify only checks) the denormalized reaction counters of reviews"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verify", action="store_true", help="Report mismatches without writing")
+        parser.add_argument("--batch-size", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        last_id = Review.objects.aggregate(last_id=Max("id"))["last_id"] or 0
+
+        affected = 0
+        for start in range(0, last_id + 1, batch_size):
+            batch = Review.objects.filter(id__gte=start, id__lt=start + batch_size)
+            if options["verify"]:
+                affected += self.count_mismatches(batch)
+            else:
+                affected += batch.rebuild_reaction_counts()
+
+        if not options["verify"]:
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt reaction counters of {affected} reviews"))
+        elif affected:
+            raise CommandError(f"{affected} reviews have out of sync reaction counters")
+        else:
+            self.stdout.write(self.style.SUCCESS("Reaction counters are in sync"))
+
+    def count_mismatches(self, batch):
+        mismatch = Q()
+        for field in REACTION_COUNTER_FIELDS.values():
+            mismatch |= ~Q(**{field: F(f"actual_{field}")})
+        return batch.with_actual_reaction_counts().filter(mismatch).count()
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from book.views import category_listing
+
+
+class Command(BaseCommand):
+    help = "Fills the book cache with the responses every client asks for first"
+
+    def handle(self, *args, **options):
+        categories = category_listing()
+        self.stdout.write(self.style.SUCCESS(f"Cached the listing of {len(categories)} categories"))
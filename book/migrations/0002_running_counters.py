@@ -0,0 +1,57 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:44
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+REACTION_COUNTER_FIELDS = {'LIKE': 'likes_count', 'DIS': 'dislikes_count'}
+
+
+def fill_running_counters(apps, schema_editor):
+    Book = apps.get_model('book', 'Book')
+    Review = apps.get_model('book', 'Review')
+    ReviewReaction = apps.get_model('book', 'ReviewReaction')
+
+    # databases created from the baseline schema already hold reviews and reactions
+    reviews = Review.objects.filter(book_id=OuterRef('pk')).order_by().values('book_id')
+    Book.objects.update(
+        rating_sum=Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total')), 0),
+        rating_count=Coalesce(Subquery(reviews.annotate(total=Count('pk')).values('total')), 0),
+    )
+
+    reactions = ReviewReaction.objects.filter(review_id=OuterRef('pk')).order_by().values('review_id')
+    Review.objects.update(**{
+        field: Coalesce(Subquery(reactions.filter(reaction=reaction).annotate(total=Count('pk')).values('total')), 0)
+        for reaction, field in REACTION_COUNTER_FIELDS.items()
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='dislikes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_running_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # indexes are built concurrently so the tables stay writable,
+    # the foreign key indexes they cover are dropped only afterwards
+    atomic = False
+
+    dependencies = [
+        ('book', '0003_book_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='book',
+            index=models.Index(fields=['category', 'id'], name='book_category_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='review',
+            index=models.Index(fields=['book', 'created_at', 'id'], name='review_book_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='reviewreaction',
+            index=models.Index(fields=['review', 'reaction'], name='reaction_review_idx'),
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='category',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='books', to='book.category'),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='book',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to='book.book'),
+        ),
+        migrations.AlterField(
+            model_name='reviewreaction',
+            name='review',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='reacts', to='book.review'),
+        ),
+    ]
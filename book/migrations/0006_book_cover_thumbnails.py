@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0005_fixture_load'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='cover_thumbnails',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
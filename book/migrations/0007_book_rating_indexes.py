@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-18 19:05
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('book', '0006_book_cover_thumbnails'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='book',
+            index=models.Index(fields=['rating', 'id'], name='book_rating_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='book',
+            index=models.Index(fields=['category', 'rating', 'id'], name='book_category_rating_idx'),
+        ),
+    ]
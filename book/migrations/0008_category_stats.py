@@ -0,0 +1,43 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:54
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_category_stats(apps, schema_editor):
+    Book = apps.get_model('book', 'Book')
+    Category = apps.get_model('book', 'Category')
+
+    books = Book.objects.filter(category_id=OuterRef('pk')).order_by().values('category_id')
+    Category.objects.update(
+        books_count=Coalesce(Subquery(books.annotate(total=Count('pk')).values('total')), 0),
+        rating_sum=Coalesce(Subquery(books.annotate(total=Sum('rating_sum')).values('total')), 0),
+        rating_count=Coalesce(Subquery(books.annotate(total=Sum('rating_count')).values('total')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0007_book_rating_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='books_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_category_stats, migrations.RunPython.noop),
+    ]
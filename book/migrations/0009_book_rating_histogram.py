@@ -0,0 +1,54 @@
+# Generated by Django 5.1.2 on 2026-10-18 19:40
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_rating_histogram(apps, schema_editor):
+    Book = apps.get_model('book', 'Book')
+    Review = apps.get_model('book', 'Review')
+
+    reviews = Review.objects.filter(book_id=OuterRef('pk')).order_by().values('book_id')
+    Book.objects.update(**{
+        f'rating_{rating}_count': Coalesce(
+            Subquery(reviews.filter(rating=rating).annotate(total=Count('pk')).values('total')), 0
+        )
+        for rating in range(1, 6)
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0008_category_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_rating_histogram, migrations.RunPython.noop),
+    ]
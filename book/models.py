@@ -1,36 +1,166 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models
+from django.db import connections, models
+from django.db.models import Case, Count, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest, Least, Round
+from django.db.models.lookups import GreaterThan
 from django.db.models.query import RawQuerySet
 from django.utils.translation import gettext_lazy as _
 
 
+SEARCH_CONFIG = "english"
+RATINGS = range(1, 6)
+# reviews per rating on `Book`, maintained with the running rating
+RATING_COUNT_FIELDS = {rating: f"rating_{rating}_count" for rating in RATINGS}
+
+
+class CategoryQuerySet(models.QuerySet):
+    def shift_stats(self, books_delta=0, rating_delta=0, count_delta=0) -> int:
+        return self.update(
+            books_count=F("books_count") + books_delta,
+            rating_sum=F("rating_sum") + rating_delta,
+            rating_count=F("rating_count") + count_delta,
+        )
+
+    def recalculate_stats(self) -> int:
+        books = Book.objects.filter(category_id=OuterRef("pk")).order_by().values("category_id")
+        return self.update(
+            books_count=Coalesce(Subquery(books.annotate(total=Count("pk")).values("total")), 0),
+            rating_sum=Coalesce(Subquery(books.annotate(total=Sum("rating_sum")).values("total")), 0),
+            rating_count=Coalesce(Subquery(books.annotate(total=Sum("rating_count")).values("total")), 0),
+        )
+
+
 class Category(models.Model):
+    objects = CategoryQuerySet.as_manager()
+
     slug = models.SlugField(max_length=255, primary_key=True)
     title = models.CharField(max_length=255)
+    # maintained by the book and review signals, see `CategoryQuerySet`
+    books_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.slug
 
+    @property
+    def average_rating(self):
+        if not self.rating_count:
+            return None
+        return round(self.rating_sum / self.rating_count, 2)
+
     class Meta:
         ordering = ["slug"]
         verbose_name_plural = _('Categories')
 
 
+class BookQuerySet(models.QuerySet):
+    def shift_rating(self, book_id, rating_delta, count_delta=0, histogram_delta=None) -> int:
+        """
+        Applies a review write to the running rating of one book with a single atomic UPDATE,
+        `histogram_delta` maps ratings to the change of their review counts.
+        """
+        rating_sum = F("rating_sum") + rating_delta
+        rating_count = F("rating_count") + count_delta
+        histogram = {
+            RATING_COUNT_FIELDS[rating]: F(RATING_COUNT_FIELDS[rating]) + delta
+            for rating, delta in (histogram_delta or {}).items() if delta
+        }
+        return self.filter(pk=book_id).update(
+            rating_sum=rating_sum,
+            rating_count=rating_count,
+            rating=_rounded_rating(rating_sum, rating_count),
+            **histogram,
+        )
+
+    def recalculate_ratings(self) -> int:
+        reviews = Review.objects.filter(book_id=OuterRef("pk")).order_by().values("book_id")
+        rating_sum = Coalesce(Subquery(reviews.annotate(total=Sum("rating")).values("total")), 0)
+        rating_count = Coalesce(Subquery(reviews.annotate(total=Count("pk")).values("total")), 0)
+        histogram = {
+            field: Coalesce(Subquery(reviews.filter(rating=rating).annotate(total=Count("pk")).values("total")), 0)
+            for rating, field in RATING_COUNT_FIELDS.items()
+        }
+        return self.update(
+            rating_sum=rating_sum,
+            rating_count=rating_count,
+            rating=_rounded_rating(rating_sum, rating_count),
+            **histogram,
+        )
+
+
+def _rounded_rating(rating_sum, rating_count):
+    # SET expressions see the old row, so the new sum and count are spelled out
+    average = Round(Cast(rating_sum, models.DecimalField(max_digits=12, decimal_places=2)) / rating_count)
+    return Case(
+        When(
+            GreaterThan(rating_count, 0),
+            then=Greatest(Value(1), Least(Value(5), Cast(average, models.IntegerField()))),
+        ),
+        default=Value(1),
+        output_field=models.IntegerField(),
+    )
+
+
 class Book(models.Model):
+    objects = BookQuerySet.as_manager()
+
     title = models.CharField(max_length=255)
     author = models.CharField(max_length=255)
-    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="books")
+    # indexed by `book_category_idx`
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="books", db_index=False)
     description = models.TextField(blank=True, null=True)
     cover_img = models.ImageField(upload_to="books", blank=True, null=True)
+    # {"source": <cover name>, "sizes": {<size>: {<format>: <thumbnail name>}}}, see book/images.py
+    cover_thumbnails = models.JSONField(default=dict, blank=True, editable=False)
     rating = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    # the rating histogram of the detail, see `RATING_COUNT_FIELDS`
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False)
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector("title", weight="A", config=SEARCH_CONFIG)
+            + SearchVector("author", weight="A", config=SEARCH_CONFIG)
+            + SearchVector("description", weight="B", config=SEARCH_CONFIG)
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
 
     class Meta:
         ordering = ["id"]
+        indexes = (
+            models.Index(fields=["category", "id"], name="book_category_idx"),
+            # cursor pages of the book list ordered by rating
+            models.Index(fields=["rating", "id"], name="book_rating_idx"),
+            models.Index(fields=["category", "rating", "id"], name="book_category_rating_idx"),
+            GinIndex(fields=["search_vector"], name="book_search_vector_idx"),
+            GinIndex(fields=["title"], name="book_title_trgm_idx", opclasses=["gin_trgm_ops"]),
+        )
+
+    # written with queryset updates only, see `BookQuerySet` and book/images.py
+    derived_fields = ("rating", "rating_sum", "rating_count", *RATING_COUNT_FIELDS.values(), "cover_thumbnails")
 
     def __str__(self):
         return f"{self.title} ({self.author})"
 
+    def save(self, *args, **kwargs):
+        # a stale instance (e.g. an admin form) must not overwrite the running counters
+        if not self._state.adding and not kwargs.get("force_insert") and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and not field.generated and field.name not in self.derived_fields
+            ]
+        super().save(*args, **kwargs)
+
 
 class ReviewQuerySet(models.QuerySet):
     def reviews_with_reactions(self) -> RawQuerySet:
@@ -65,6 +195,48 @@ class ReviewQuerySet(models.QuerySet):
             """
         )
 
+    def with_author(self) -> "ReviewQuerySet":
+        # `Review.author` is read for every row, join the username in instead of a query per review
+        return self.select_related("user").only(
+            "id", "book_id", "comment", "rating", "created_at", "likes_count", "dislikes_count", "user__username",
+        )
+
+    def shift_reaction_counts(self, review_id, added=None, removed=None) -> int:
+        """Moves the denormalized counters of one review with a single atomic UPDATE."""
+        if added == removed:
+            return 0
+
+        changes = {}
+        if added:
+            field = REACTION_COUNTER_FIELDS[added]
+            changes[field] = F(field) + 1
+        if removed:
+            field = REACTION_COUNTER_FIELDS[removed]
+            # a reaction the counters never saw (admin, ORM, before the backfill)
+            # must not push them below the CHECK >= 0 of the column
+            changes[field] = Greatest(F(field) - 1, 0)
+        return self.filter(pk=review_id).update(**changes)
+
+    def with_actual_reaction_counts(self) -> "ReviewQuerySet":
+        return self.annotate(**{
+            f"actual_{field}": _reaction_count_subquery(reaction)
+            for reaction, field in REACTION_COUNTER_FIELDS.items()
+        })
+
+    def rebuild_reaction_counts(self) -> int:
+        return self.update(**{
+            field: _reaction_count_subquery(reaction)
+            for reaction, field in REACTION_COUNTER_FIELDS.items()
+        })
+
+
+def _reaction_count_subquery(reaction):
+    reactions = ReviewReaction.objects.filter(
+        review_id=OuterRef("pk"),
+        reaction=reaction,
+    ).order_by().values("review_id").annotate(count=Count("pk")).values("count")
+    return Coalesce(Subquery(reactions), 0)
+
 
 def get_sentinel_user():
     sentinel_user, _ = get_user_model().objects.get_or_create(username="deleted", is_active=False)
@@ -74,23 +246,189 @@ def get_sentinel_user():
 class Review(models.Model):
     objects = ReviewQuerySet.as_manager()
 
-    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="reviews")
+    # indexed by `review_book_created_idx`
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="reviews", db_index=False)
     user = models.ForeignKey(get_user_model(), on_delete=models.SET(get_sentinel_user), related_name="reviews")
     comment = models.TextField(blank=True, null=True)
     rating = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
     created_at = models.DateTimeField(auto_now_add=True)
+    likes_count = models.PositiveIntegerField(default=0, editable=False)
+    dislikes_count = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ["id"]
+        indexes = (
+            # per-book listing with keyset pagination on (created_at, id)
+            models.Index(fields=["book", "created_at", "id"], name="review_book_created_idx"),
+        )
 
     @property
     def author(self):
         return self.user.username
 
+    @property
+    def reaction_counts(self):
+        return [
+            {"reaction": reaction, "count": getattr(self, field)}
+            for reaction, field in REACTION_COUNTER_FIELDS.items()
+            if getattr(self, field)
+        ] or None
+
     def __str__(self):
         return f"{self.author}({self.rating}) -> {self.book} "
 
 
+class ReviewReactionQuerySet(models.QuerySet):
+    def upsert(self, review_id, user_id, reaction):
+        """
+        Sets the reaction of a user to a review and moves the review counters in
+        one statement. Returns None when the review doesn't exist, otherwise a dict
+        with `book_id`, `created`, `reaction` and the new counters.
+        """
+        params = {"review_id": review_id, "user_id": user_id, "reaction": reaction}
+        counter_changes = []
+        for index, (counted, field) in enumerate(REACTION_COUNTER_FIELDS.items()):
+            params[f"counted_{index}"] = counted
+            # clamped as in `shift_reaction_counts`, the previous reaction may never have been counted
+            counter_changes.append(
+                f"{field} = GREATEST({field}"
+                f" + (CASE WHEN %(reaction)s = %(counted_{index})s THEN 1 ELSE 0 END)"
+                f" - (CASE WHEN (SELECT reaction FROM previous) = %(counted_{index})s THEN 1 ELSE 0 END), 0)"
+            )
+        fields = ", ".join(REACTION_COUNTER_FIELDS.values())
+        current_fields = ", ".join(f"COALESCE(counted.{field}, r.{field})" for field in REACTION_COUNTER_FIELDS.values())
+
+        # All parts of the statement share one snapshot. `previous` locks the old
+        # row and is read before the insert, which depends on it, so the old reaction
+        # is known without a second round trip.
+        sql = f"""
+            WITH previous AS MATERIALIZED (
+                SELECT reaction FROM book_reviewreaction
+                WHERE review_id = %(review_id)s AND user_id = %(user_id)s
+                FOR UPDATE
+            ),
+            upserted AS (
+                INSERT INTO book_reviewreaction (review_id, user_id, reaction, created_at, updated_at)
+                SELECT id, %(user_id)s, %(reaction)s, NOW(), NOW()
+                FROM book_review
+                WHERE id = %(review_id)s AND (SELECT COUNT(*) FROM previous) >= 0
+                ON CONFLICT (review_id, user_id) DO UPDATE
+                    SET reaction = EXCLUDED.reaction, updated_at = EXCLUDED.updated_at
+                    WHERE book_reviewreaction.reaction <> EXCLUDED.reaction
+                RETURNING (xmax = 0) AS inserted
+            ),
+            counted AS (
+                UPDATE book_review SET {", ".join(counter_changes)}
+                WHERE id = %(review_id)s
+                    AND EXISTS (SELECT 1 FROM upserted WHERE inserted OR EXISTS (SELECT 1 FROM previous))
+                RETURNING id, {fields}
+            )
+            SELECT
+                r.book_id,
+                (SELECT inserted FROM upserted),
+                EXISTS (SELECT 1 FROM previous),
+                {current_fields}
+            FROM book_review r
+            LEFT JOIN counted ON counted.id = r.id
+            WHERE r.id = %(review_id)s
+        """
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+        if row is None:
+            return None
+
+        book_id, inserted, existed, *counts = row
+        if inserted is False and not existed:
+            # a first reaction of the same user was inserted concurrently, its value
+            # was not visible to this statement, so the counters are counted instead
+            reviews = Review.objects.filter(pk=review_id)
+            reviews.rebuild_reaction_counts()
+            counts = reviews.values_list(*REACTION_COUNTER_FIELDS.values()).get()
+
+        return {
+            "book_id": book_id,
+            "created": bool(inserted),
+            "reaction": reaction,
+            **dict(zip(REACTION_COUNTER_FIELDS.values(), counts)),
+        }
+
+    def cancel(self, review_id, user_id):
+        """
+        Deletes the reaction of a user to a review and moves the review counters
+        in one statement. Returns the deleted reaction with the new counters,
+        or None when there was nothing to delete.
+        """
+        params = {"review_id": review_id, "user_id": user_id}
+        counter_changes = []
+        for index, (counted, field) in enumerate(REACTION_COUNTER_FIELDS.items()):
+            params[f"counted_{index}"] = counted
+            counter_changes.append(
+                # clamped as in `shift_reaction_counts`, the deleted reaction may never have been counted
+                f"{field} = GREATEST({field} - (SELECT COUNT(*) FROM deleted WHERE reaction = %(counted_{index})s), 0)"
+            )
+        fields = ", ".join(REACTION_COUNTER_FIELDS.values())
+
+        sql = f"""
+            WITH deleted AS (
+                DELETE FROM book_reviewreaction
+                WHERE review_id = %(review_id)s AND user_id = %(user_id)s
+                RETURNING review_id, reaction
+            ),
+            counted AS (
+                UPDATE book_review SET {", ".join(counter_changes)}
+                WHERE id IN (SELECT review_id FROM deleted)
+                RETURNING id, book_id, {fields}
+            )
+            SELECT deleted.reaction, counted.book_id, {", ".join(f"counted.{field}" for field in REACTION_COUNTER_FIELDS.values())}
+            FROM deleted
+            JOIN counted ON counted.id = deleted.review_id
+        """
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+        if row is None:
+            return None
+
+        reaction, book_id, *counts = row
+        return {"book_id": book_id, "reaction": reaction, **dict(zip(REACTION_COUNTER_FIELDS.values(), counts))}
+
+    def insert_missing(self, reactions, batch_size=None):
+        """
+        Inserts the reactions whose (review, user) pair doesn't exist yet, one
+        statement per batch. Returns only the inserted reactions, with their pk set.
+        """
+        batch_size = batch_size or len(reactions) or 1
+        inserted = []
+        with connections[self.db].cursor() as cursor:
+            for start in range(0, len(reactions), batch_size):
+                batch = reactions[start:start + batch_size]
+                # the first of the pairs repeated within a batch is inserted
+                pending = {}
+                for reaction in batch:
+                    pending.setdefault((reaction.review_id, reaction.user_id), reaction)
+                cursor.execute(
+                    """
+                    INSERT INTO book_reviewreaction (review_id, user_id, reaction, created_at, updated_at)
+                    SELECT review_id, user_id, reaction, NOW(), NOW()
+                    FROM UNNEST(%s::bigint[], %s::bigint[], %s::varchar[]) AS batch (review_id, user_id, reaction)
+                    ON CONFLICT (review_id, user_id) DO NOTHING
+                    RETURNING id, review_id, user_id, created_at
+                    """,
+                    [
+                        [reaction.review_id for reaction in pending.values()],
+                        [reaction.user_id for reaction in pending.values()],
+                        [reaction.reaction for reaction in pending.values()],
+                    ],
+                )
+                for pk, review_id, user_id, created_at in cursor.fetchall():
+                    reaction = pending[review_id, user_id]
+                    reaction.pk = pk
+                    reaction.created_at = reaction.updated_at = created_at
+                    inserted.append(reaction)
+        return inserted
+
+
 class ReviewReaction(models.Model):
     class Reaction(models.TextChoices):
         # I thought it would be nice to leave the possibility in the future
@@ -98,8 +436,11 @@ class ReviewReaction(models.Model):
         like = "LIKE", _("like")
         dislike = "DIS", _("dislike")
 
+    objects = ReviewReactionQuerySet.as_manager()
+
     user = models.ForeignKey(get_user_model(), on_delete=models.SET(get_sentinel_user), related_name="review_reacts")
-    review = models.ForeignKey(Review, on_delete=models.CASCADE, related_name="reacts")
+    # indexed by `unique_user_react` and `reaction_review_idx`
+    review = models.ForeignKey(Review, on_delete=models.CASCADE, related_name="reacts", db_index=False)
     reaction = models.CharField(max_length=4, choices=Reaction.choices, default=Reaction.like)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -111,3 +452,27 @@ class ReviewReaction(models.Model):
                 name="unique_user_react"
             ),
         )
+        indexes = (
+            # per-review reaction counts
+            models.Index(fields=["review", "reaction"], name="reaction_review_idx"),
+        )
+
+
+REACTION_COUNTER_FIELDS = {
+    ReviewReaction.Reaction.like: "likes_count",
+    ReviewReaction.Reaction.dislike: "dislikes_count",
+}
+
+
+class FixtureLoad(models.Model):
+    """A fixture file already loaded by `load_fixtures`, identified by the hash of its content."""
+    sha256 = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255)
+    objects_count = models.PositiveIntegerField(default=0)
+    loaded_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-loaded_at"]
+
+    def __str__(self):
+        return f"{self.name} ({self.sha256[:12]})"
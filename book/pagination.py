@@ -0,0 +1,349 @@
+import base64
+import binascii
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connections
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a unique ``ordering``.
+
+    The cursor carries the values of every ordering field of the last row, or
+    of the first one for the `previous` link, which scans the ordering backwards.
+    Each page is an index range scan + LIMIT no matter how deep the client goes
+    (no OFFSET and no COUNT(*)).
+    """
+    ordering = ("id",)
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = "cursor"
+    invalid_cursor_message = _("Invalid cursor")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.get_page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.set_page([row async for row in self.get_page_queryset(queryset, request)])
+
+    def get_page_queryset(self, queryset, request):
+        self.request = request
+        self.model = queryset.model
+
+        self.position, self.reverse = self.decode_cursor(request)
+        ordering = self.ordering
+        if self.reverse:
+            ordering = [field[1:] if field.startswith("-") else f"-{field}" for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if self.position is not None:
+            queryset = queryset.filter(self.get_position_filter(self.position, self.reverse))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        has_more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        # the row of the cursor itself lies on the other side
+        if self.reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.position is not None
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {
+                    "type": "string",
+                    "nullable": True,
+                    "format": "uri",
+                },
+                "previous": {
+                    "type": "string",
+                    "nullable": True,
+                    "format": "uri",
+                },
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+        ]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        cursor = self.encode_cursor(self.page[-1]) if self.page else self.encode_position(self.position)
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.page:
+            cursor = self.encode_cursor(self.page[0], reverse=True)
+        else:
+            cursor = self.encode_position(self.position, reverse=True)
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_ordering_fields(self, reverse=False):
+        after, before = ("gt", "lt") if not reverse else ("lt", "gt")
+        return [(field.lstrip("-"), before if field.startswith("-") else after) for field in self.ordering]
+
+    def get_position_filter(self, position, reverse=False):
+        # (a, b) > (x, y) is spelled as `a >= x AND (a > x OR (a = x AND b > y))`,
+        # the leading inclusive bound gives the planner an index range to scan.
+        fields = self.get_ordering_fields(reverse)
+
+        condition = None
+        for (name, lookup), value in reversed(list(zip(fields, position))):
+            strict = Q(**{f"{name}__{lookup}": value})
+            condition = strict if condition is None else strict | (Q(**{name: value}) & condition)
+
+        (first_name, first_lookup), first_value = fields[0], position[0]
+        return Q(**{f"{first_name}__{first_lookup}e": first_value}) & condition
+
+    def encode_cursor(self, row, reverse=False):
+        # a model instance, or a dict of `.values()` for the fast list serializers
+        if isinstance(row, dict):
+            position = [row[name] for name, _lookup in self.get_ordering_fields()]
+        else:
+            position = [getattr(row, name) for name, _lookup in self.get_ordering_fields()]
+        return self.encode_position(position, reverse)
+
+    def encode_position(self, position, reverse=False):
+        # a list of the values after which the page starts, {"before": [...]} for a previous page
+        payload = {"before": position} if reverse else position
+        encoded = json.dumps(payload, default=str, separators=(",", ":"))
+        return base64.urlsafe_b64encode(encoded.encode("utf-8")).decode("ascii")
+
+    def decode_cursor(self, request):
+        """Returns the position of the cursor, None without one, and whether it pages backwards."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        fields = self.get_ordering_fields()
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")).decode("utf-8"))
+            reverse = isinstance(position, dict)
+            if reverse:
+                position = position.get("before")
+            if not isinstance(position, list) or len(position) != len(fields):
+                raise ValueError(encoded)
+            return [
+                self.model._meta.get_field(name).to_python(value)
+                for (name, _lookup), value in zip(fields, position)
+            ], reverse
+        except (binascii.Error, UnicodeError, ValueError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class ReviewCursorPagination(KeysetPagination):
+    ordering = ("created_at", "id")
+
+
+class BookKeysetPagination(KeysetPagination):
+    """
+    Keyset pagination of the book list in one of `orderings`.
+
+    The total is not computed unless asked for: `count=exact` runs a COUNT(*),
+    `count=estimate` reads the planner estimate, which costs the same at any size.
+    """
+    orderings = {
+        "id": ("id",),
+        "rating": ("rating", "id"),
+        "-rating": ("-rating", "-id"),
+    }
+    ordering_query_param = "ordering"
+    count_query_param = "count"
+    count_modes = ("exact", "estimate")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.ordering = self.orderings.get(request.query_params.get(self.ordering_query_param), ("id",))
+        self.count = self.get_count(queryset, request.query_params.get(self.count_query_param))
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.ordering = self.orderings.get(request.query_params.get(self.ordering_query_param), ("id",))
+        self.count = await self.aget_count(queryset, request.query_params.get(self.count_query_param))
+        return await super().apaginate_queryset(queryset, request, view)
+
+    def get_count(self, queryset, mode):
+        if mode == "exact":
+            return queryset.count()
+        if mode == "estimate":
+            return estimate_count(queryset)
+        return None
+
+    async def aget_count(self, queryset, mode):
+        if mode == "exact":
+            return await queryset.acount()
+        if mode == "estimate":
+            return await sync_to_async(estimate_count)(queryset)
+        return None
+
+    def get_paginated_response(self, data):
+        return Response({
+            "count": self.count,
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"] = {
+            "count": {"type": "integer", "nullable": True, "example": 123},
+            **response_schema["properties"],
+        }
+        return response_schema
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                "name": self.ordering_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Ordering of the cursor pages.",
+                "schema": {"type": "string", "enum": list(self.orderings), "default": "id"},
+            },
+            {
+                "name": self.count_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Adds the exact or estimated total to cursor pages.",
+                "schema": {"type": "string", "enum": list(self.count_modes)},
+            },
+        ]
+
+
+def estimate_count(queryset):
+    """
+    Row count from the planner statistics: `pg_class.reltuples` of the table when
+    nothing is filtered, the row estimate of the query plan otherwise. Tables
+    that were never analyzed are counted exactly.
+    """
+    connection = connections[queryset.db]
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+            if row is not None and row[0] >= 0:
+                return row[0]
+            return queryset.count()
+
+        sql, params = queryset.order_by().values("pk").query.sql_with_params()
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+    return plan[0]["Plan"]["Plan Rows"]
+
+
+class AsyncPageNumberPagination(PageNumberPagination):
+    """`PageNumberPagination` that can also paginate with the async ORM."""
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # `Paginator.count` is a cached property, counted here it is never queried synchronously
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+
+        # the page holds a lazy slice of the queryset until here
+        self.page.object_list = [row async for row in self.page.object_list]
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+
+class BookPagination(BasePagination):
+    """
+    Page numbers by default, `paginate=cursor` switches to `BookKeysetPagination`.
+    The mode parameter is kept in the `next` links of both.
+    """
+    mode_query_param = "paginate"
+    cursor_mode = "cursor"
+
+    def __init__(self):
+        self.page_number_paginator = AsyncPageNumberPagination()
+        self.cursor_paginator = BookKeysetPagination()
+        self.paginator = self.page_number_paginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.mode_query_param) == self.cursor_mode:
+            self.paginator = self.cursor_paginator
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.mode_query_param) == self.cursor_mode:
+            self.paginator = self.cursor_paginator
+        return await self.paginator.apaginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_results(self, data):
+        return data["results"]
+
+    def to_html(self):
+        return self.paginator.to_html() if self.paginator is self.page_number_paginator else ""
+
+    def get_paginated_response_schema(self, schema):
+        page_schema = self.page_number_paginator.get_paginated_response_schema(schema)
+        cursor_schema = self.cursor_paginator.get_paginated_response_schema(schema)
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {**page_schema["properties"], **cursor_schema["properties"]},
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.mode_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Set to `cursor` for cursor pages, no page numbers and no total by default.",
+                "schema": {"type": "string", "enum": [self.cursor_mode]},
+            },
+            *self.page_number_paginator.get_schema_operation_parameters(view),
+            *self.cursor_paginator.get_schema_operation_parameters(view),
+        ]
@@ -0,0 +1,30 @@
+import codecs
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from book_platform.parsers import loads
+
+
+class NDJSONParser(BaseParser):
+    """
+    Newline delimited JSON: one object per line, blank lines are skipped.
+    The stream is decoded line by line instead of being read into one string first.
+    """
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        reader = codecs.getreader(encoding)(stream)
+
+        rows = []
+        for number, line in enumerate(reader, 1):
+            if not line.strip():
+                continue
+            try:
+                rows.append(loads(line))
+            except ValueError as exc:
+                raise ParseError(f"NDJSON parse error on line {number} - {exc}")
+        return rows
@@ -0,0 +1,178 @@
+"""
+Book rankings kept in Redis sorted sets.
+
+`TOP` scores books by their Bayesian average rating: every book starts with
+`BOOK_RANKING_PRIOR_WEIGHT` virtual reviews at `BOOK_RANKING_PRIOR_MEAN`, so
+one 5 star review doesn't outrank a hundred 4.8 ones. The prior is fixed
+rather than the live mean of all reviews, a score then only changes with the
+reviews of its own book and stays comparable to the others.
+
+`TRENDING` scores books by review activity with exponential decay. Instead
+of decaying every score over time, each event adds `2 ** (age of the event
+since the epoch / half-life)`, which keeps the same order and makes a write a
+single ZINCRBY. The rebuild moves the epoch forward before the scores grow
+too large.
+
+Reads are ZREVRANGE calls, O(log n) plus the page, whatever the catalog size.
+"""
+import time
+
+from django.conf import settings
+from django.db import connection
+from django_redis import get_redis_connection
+
+from book.models import Book
+
+TOP = "ranking:top"
+TRENDING = "ranking:trending"
+RANKINGS = (TOP, TRENDING)
+
+_EPOCH_KEY = "ranking:trending:epoch"
+
+
+def get_client():
+    return get_redis_connection(settings.BOOK_RANKING_ALIAS)
+
+
+def bayesian_score(rating_sum, rating_count):
+    weight = settings.BOOK_RANKING_PRIOR_WEIGHT
+    return (weight * settings.BOOK_RANKING_PRIOR_MEAN + rating_sum) / (weight + rating_count)
+
+
+def update_top(book_id):
+    """Scores a book again from its committed running rating."""
+    client = get_client()
+    counters = Book.objects.filter(pk=book_id).values_list("rating_sum", "rating_count").first()
+    if counters is None or not counters[1]:
+        client.zrem(TOP, book_id)
+        return
+    client.zadd(TOP, {book_id: bayesian_score(*counters)})
+
+
+def _trending_weight(client, weight, timestamp=None):
+    epoch = client.get(_EPOCH_KEY)
+    if epoch is None:
+        client.setnx(_EPOCH_KEY, int(time.time()))
+        epoch = client.get(_EPOCH_KEY)
+    timestamp = time.time() if timestamp is None else timestamp
+    return weight * 2 ** ((timestamp - float(epoch)) / settings.BOOK_TRENDING_HALF_LIFE)
+
+
+def record_activity(book_id, weight):
+    client = get_client()
+    client.zincrby(TRENDING, _trending_weight(client, weight), book_id)
+
+
+def clear():
+    get_client().delete(*RANKINGS, _EPOCH_KEY)
+
+
+def remove_book(book_id):
+    pipeline = get_client().pipeline()
+    for ranking in RANKINGS:
+        pipeline.zrem(ranking, book_id)
+    pipeline.execute()
+
+
+class RankedBooks:
+    """
+    A lazy, sliceable sequence of the books of one ranking for `Paginator`:
+    `count()` is a ZCARD and a slice is one ZREVRANGE plus one primary key query.
+    """
+
+    def __init__(self, ranking, queryset):
+        self.ranking = ranking
+        self.queryset = queryset
+
+    def count(self):
+        return get_client().zcard(self.ranking)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError("RankedBooks only supports slicing")
+        start, stop = index.start or 0, index.stop
+        if stop is not None and stop <= start:
+            return []
+
+        ranked = get_client().zrevrange(self.ranking, start, -1 if stop is None else stop - 1, withscores=True)
+        ranked = [(int(book_id), score) for book_id, score in ranked]
+        books = self.queryset.in_bulk([book_id for book_id, _score in ranked])
+
+        page = []
+        for book_id, score in ranked:
+            book = books.get(book_id)
+            if book is not None:  # deleted meanwhile
+                book.score = score
+                page.append(book)
+        return page
+
+
+def rebuild_top(batch_size=10_000):
+    books = (
+        Book.objects.filter(rating_count__gt=0)
+        .order_by()
+        .values_list("id", "rating_sum", "rating_count")
+        .iterator(chunk_size=batch_size)
+    )
+    scores = ((book_id, bayesian_score(rating_sum, rating_count)) for book_id, rating_sum, rating_count in books)
+    _swap(get_client(), TOP, scores, batch_size)
+
+
+def rebuild_trending(batch_size=10_000):
+    """Scores the activity of the last `BOOK_TRENDING_WINDOW` half-lives against a new epoch."""
+    client = get_client()
+    epoch = int(time.time())
+    half_life = settings.BOOK_TRENDING_HALF_LIFE
+    since = epoch - half_life * settings.BOOK_TRENDING_WINDOW
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT book_id, SUM(weight * power(2, (extract(epoch FROM created_at) - %(epoch)s) / %(half_life)s))
+            FROM (
+                SELECT r.book_id, r.created_at, %(review_weight)s AS weight
+                FROM book_review r
+                WHERE r.created_at >= to_timestamp(%(since)s)
+                UNION ALL
+                SELECT r.book_id, rr.created_at, %(reaction_weight)s AS weight
+                FROM book_reviewreaction rr
+                JOIN book_review r ON r.id = rr.review_id
+                WHERE rr.created_at >= to_timestamp(%(since)s)
+            ) events
+            GROUP BY book_id
+            """,
+            {
+                "epoch": epoch,
+                "half_life": half_life,
+                "since": since,
+                "review_weight": settings.BOOK_TRENDING_REVIEW_WEIGHT,
+                "reaction_weight": settings.BOOK_TRENDING_REACTION_WEIGHT,
+            },
+        )
+        # events scored against the old epoch in between are dropped with the old set,
+        # which is better than mixing scales
+        client.set(_EPOCH_KEY, epoch)
+        _swap(client, TRENDING, ((book_id, float(score)) for book_id, score in cursor), batch_size)
+
+
+def _swap(client, key, scores, batch_size):
+    # filled aside and renamed, readers never see a half built ranking
+    temporary = f"{key}:rebuild"
+    client.delete(temporary)
+
+    batch = {}
+    for book_id, score in scores:
+        batch[book_id] = score
+        if len(batch) >= batch_size:
+            client.zadd(temporary, batch)
+            batch = {}
+    if batch:
+        client.zadd(temporary, batch)
+
+    if client.exists(temporary):
+        client.rename(temporary, key)
+    else:
+        client.delete(key)
@@ -1,8 +1,50 @@
+from abc import ABC, abstractmethod
+from collections import Counter
+from functools import partial
+from operator import itemgetter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.utils.translation import gettext_lazy as _
-from drf_spectacular.utils import extend_schema_serializer
+from drf_spectacular.utils import extend_schema_field, extend_schema_serializer
 from rest_framework import serializers
 
-from book.models import Book, Category, Review, ReviewReaction
+from accounts.authentication import TokenUser
+from book import ranking
+from book.cache import BOOKS_NAMESPACE, CATEGORY_STATS_NAMESPACE, book_namespace, bump_versions, reviews_namespace
+from book.models import Book, Category, Review, ReviewReaction, RATING_COUNT_FIELDS, REACTION_COUNTER_FIELDS
+from book_platform.metrics import serialize_timer
+
+
+def cover_thumbnail_urls(cover_name, thumbnails, storage, build_url):
+    # thumbnails of a replaced cover are not served
+    if not cover_name or thumbnails.get("source") != cover_name:
+        return None
+    return {
+        label: {extension: build_url(storage.url(name)) for extension, name in formats.items()}
+        for label, formats in thumbnails["sizes"].items()
+    }
+
+
+@extend_schema_field({
+    "type": "object",
+    "nullable": True,
+    "additionalProperties": {"type": "object", "additionalProperties": {"type": "string", "format": "uri"}},
+    "example": {"small": {"webp": "http://localhost/media/books/thumbs/1f3a-small.webp"}},
+})
+class CoverThumbnailsField(serializers.Field):
+    """URLs of the cover thumbnails by size and format, null until they are rendered."""
+
+    def __init__(self, **kwargs):
+        kwargs["source"] = "*"
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, book):
+        request = self.context.get("request")
+        build_url = request.build_absolute_uri if request is not None else str
+        return cover_thumbnail_urls(book.cover_img.name, book.cover_thumbnails, book.cover_img.storage, build_url)
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -11,26 +53,52 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ("title", "slug")
 
 
+class CategoryStatsSerializer(serializers.ModelSerializer):
+    reviews_count = serializers.IntegerField(source="rating_count", read_only=True)
+    average_rating = serializers.FloatField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = Category
+        fields = ("slug", "title", "books_count", "reviews_count", "average_rating")
+
+
 class BookSerializer(serializers.ModelSerializer):
     category = CategorySerializer(many=False, read_only=True)
+    cover_thumbnails = CoverThumbnailsField()
 
     class Meta:
         model = Book
-        fields = ("id", "title", "author", "cover_img", "rating", "category")
+        fields = ("id", "title", "author", "cover_img", "cover_thumbnails", "rating", "category")
+
+
+class RankedBookSerializer(BookSerializer):
+    score = serializers.FloatField(read_only=True)
+
+    class Meta(BookSerializer.Meta):
+        fields = BookSerializer.Meta.fields + ("score",)
 
 
 class BookDetailSerializer(serializers.ModelSerializer):
     category = CategorySerializer(many=False, read_only=True)
-    reviews = serializers.HyperlinkedRelatedField(
-        many=True,
-        read_only=True,
+    cover_thumbnails = CoverThumbnailsField()
+    reviews_count = serializers.IntegerField(source="rating_count", read_only=True)
+    rating_histogram = serializers.SerializerMethodField()
+    reviews_url = serializers.HyperlinkedIdentityField(
         view_name="book-reviews-list",
+        lookup_field="id",
         lookup_url_kwarg="book_id",
     )
 
     class Meta:
         model = Book
-        fields = ("id", "title", "author", "description", "cover_img", "rating", "category", "reviews")
+        fields = (
+            "id", "title", "author", "description", "cover_img", "cover_thumbnails", "rating", "category",
+            "reviews_count", "rating_histogram", "reviews_url",
+        )
+
+    @extend_schema_field({"type": "object", "additionalProperties": {"type": "integer"}})
+    def get_rating_histogram(self, obj) -> dict:
+        return {str(rating): getattr(obj, field) for rating, field in RATING_COUNT_FIELDS.items()}
 
 
 
@@ -60,18 +128,102 @@ class ReviewSerializer(serializers.ModelSerializer):
         write_only=True,
         required=True
     )
-    reactions = ReactionCountListField()
+    reactions = ReactionCountListField(source="reaction_counts")
 
     class Meta:
         model = Review
         fields = ("id", "book", "author", "comment", "rating", "created_at", "reactions")
 
     def validate(self, attrs):
-        request = self.context["request"]
-        attrs["user"] = request.user
+        user = self.context["request"].user
+        # a token user is no model instance, its claims make an unsaved stand-in
+        attrs["user"] = user.as_author() if isinstance(user, TokenUser) else user
         return attrs
 
 
+class ValuesListSerializer(ABC):
+    """
+    Read-only list serialization from `.values()` rows.
+
+    A `ModelSerializer` binds a field instance tree and resolves the source of
+    every field for every row. Here `get_accessors()` turns each output field
+    into a plain function of the row once per request, and a row is one dict
+    comprehension. The output is the same as `serializer_class` with
+    `many=True`, which stays for writes, detail responses and the schema.
+    """
+    serializer_class = None
+    lookups = ()
+
+    def __init__(self, context=None):
+        self.context = context or {}
+        self.accessors = tuple(self.get_accessors())
+
+    @abstractmethod
+    def get_accessors(self):
+        """(name, function of the row) pairs in the field order of `serializer_class`."""
+
+    def values(self, queryset):
+        return queryset.values(*self.lookups)
+
+    def serialize(self, rows):
+        accessors = self.accessors
+        with serialize_timer():
+            return [{name: accessor(row) for name, accessor in accessors} for row in rows]
+
+
+class BookValuesListSerializer(ValuesListSerializer):
+    serializer_class = BookSerializer
+    lookups = ("id", "title", "author", "cover_img", "cover_thumbnails", "rating", "category__title", "category__slug")
+
+    def get_accessors(self):
+        request = self.context.get("request")
+        build_url = request.build_absolute_uri if request is not None else str
+        storage = Book._meta.get_field("cover_img").storage
+
+        def cover_img(row):
+            return build_url(storage.url(row["cover_img"])) if row["cover_img"] else None
+
+        def cover_thumbnails(row):
+            return cover_thumbnail_urls(row["cover_img"], row["cover_thumbnails"], storage, build_url)
+
+        def category(row):
+            return {"title": row["category__title"], "slug": row["category__slug"]}
+
+        return (
+            ("id", itemgetter("id")),
+            ("title", itemgetter("title")),
+            ("author", itemgetter("author")),
+            ("cover_img", cover_img),
+            ("cover_thumbnails", cover_thumbnails),
+            ("rating", itemgetter("rating")),
+            ("category", category),
+        )
+
+
+class ReviewValuesListSerializer(ValuesListSerializer):
+    serializer_class = ReviewSerializer
+    lookups = ("id", "user__username", "comment", "rating", "created_at", *REACTION_COUNTER_FIELDS.values())
+
+    def get_accessors(self):
+        # the timezone and format settings are applied by the field itself
+        format_datetime = serializers.DateTimeField().to_representation
+        labels = dict(ReviewReaction.Reaction.choices)
+        counters = tuple((labels[reaction], field) for reaction, field in REACTION_COUNTER_FIELDS.items())
+
+        def reactions(row):
+            # `Review.reaction_counts` as shown by `ReactionCountListField`
+            return [{"reaction": label, "count": row[field]} for label, field in counters if row[field]] or None
+
+        return (
+            ("id", itemgetter("id")),
+            ("author", itemgetter("user__username")),
+            ("comment", itemgetter("comment")),
+            ("rating", itemgetter("rating")),
+            ("created_at", lambda row: format_datetime(row["created_at"])),
+            ("reactions", reactions),
+        )
+
+
 @extend_schema_serializer(exclude_fields=('review',))
 class ReviewReactionSerializer(serializers.ModelSerializer):
     review = serializers.PrimaryKeyRelatedField(
@@ -93,9 +245,130 @@ class ReviewReactionSerializer(serializers.ModelSerializer):
         if self.instance:  # to avoid sending user when updating
             return attrs
 
-        user = self.context["request"].user
+        user_id = self.context["request"].user.id
 
-        if ReviewReaction.objects.filter(user=user, review=attrs["review"]).exists():
+        if ReviewReaction.objects.filter(user_id=user_id, review=attrs["review"]).exists():
             raise serializers.ValidationError({"detail": _('Already exists! Try update')})
-        attrs["user"] = user
+        attrs["user_id"] = user_id
         return attrs
+
+
+class ReviewReactionUpsertSerializer(serializers.Serializer):
+    """Validates a PUT reaction without touching the database, the upsert reports the counters back."""
+    reaction = serializers.ChoiceField(choices=ReviewReaction.Reaction.choices)
+    likes_count = serializers.IntegerField(read_only=True)
+    dislikes_count = serializers.IntegerField(read_only=True)
+
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Looks objects up in `context["prefetched"][model]`, filled once per batch by
+    `BulkCreateListSerializer`, instead of running a query per row.
+    """
+
+    def to_internal_value(self, data):
+        prefetched = self.context.get("prefetched", {}).get(self.get_queryset().model)
+        if prefetched is None:
+            return super().to_internal_value(data)
+
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            return prefetched[int(data)]
+        except KeyError:
+            self.fail("does_not_exist", pk_value=data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+
+
+class BulkCreateListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.prefetch_related_objects(data)
+        return super().to_internal_value(data)
+
+    def prefetch_related_objects(self, rows):
+        prefetched = self.context.setdefault("prefetched", {})
+        for name, field in self.child.fields.items():
+            if not isinstance(field, PrefetchedPrimaryKeyRelatedField):
+                continue
+
+            keys = set()
+            for row in rows:
+                try:
+                    keys.add(int(row[name]))
+                except (KeyError, TypeError, ValueError):
+                    pass  # reported by the field itself
+            queryset = field.get_queryset()
+            prefetched[queryset.model] = queryset.in_bulk(keys)
+
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        # only the inserted rows are returned, skipped conflicts aren't
+        objects = self.child.bulk_create([model(**attrs) for attrs in validated_data])
+        self.created_count = len(objects)
+        self.child.after_bulk_create(objects)
+        return objects
+
+
+class BulkReviewSerializer(ReviewSerializer):
+    book = PrefetchedPrimaryKeyRelatedField(queryset=Book.objects.only("id"), write_only=True)
+    user = PrefetchedPrimaryKeyRelatedField(queryset=get_user_model().objects.only("id"), write_only=True)
+    reactions = None
+
+    class Meta(ReviewSerializer.Meta):
+        fields = ("book", "user", "comment", "rating")
+        list_serializer_class = BulkCreateListSerializer
+
+    def validate(self, attrs):
+        return attrs
+
+    def bulk_create(self, reviews):
+        return Review.objects.bulk_create(reviews, batch_size=settings.BULK_INGEST_CHUNK_SIZE)
+
+    def after_bulk_create(self, reviews):
+        # signals don't fire on bulk_create, ratings are recomputed once per batch
+        book_ids = {review.book_id for review in reviews}
+        Book.objects.filter(pk__in=book_ids).recalculate_ratings()
+        Category.objects.filter(books__pk__in=book_ids).recalculate_stats()
+        bump_versions(
+            BOOKS_NAMESPACE, CATEGORY_STATS_NAMESPACE,
+            *(book_namespace(book_id) for book_id in book_ids),
+            *(reviews_namespace(book_id) for book_id in book_ids),
+        )
+
+        for book_id, count in Counter(review.book_id for review in reviews).items():
+            transaction.on_commit(partial(ranking.update_top, book_id), robust=True)
+            transaction.on_commit(partial(
+                ranking.record_activity, book_id, settings.BOOK_TRENDING_REVIEW_WEIGHT * count
+            ), robust=True)
+
+
+class BulkReviewReactionSerializer(ReviewReactionSerializer):
+    review = PrefetchedPrimaryKeyRelatedField(queryset=Review.objects.only("id", "book_id"), write_only=True)
+    user = PrefetchedPrimaryKeyRelatedField(queryset=get_user_model().objects.only("id"), write_only=True)
+
+    class Meta(ReviewReactionSerializer.Meta):
+        fields = ("review", "user", "reaction")
+        list_serializer_class = BulkCreateListSerializer
+        # conflicts are left to the database, no per row uniqueness query
+        validators = []
+
+    def validate(self, attrs):
+        return attrs
+
+    def bulk_create(self, reactions):
+        # an already existing (review, user) reaction is skipped
+        return ReviewReaction.objects.insert_missing(reactions, batch_size=settings.BULK_INGEST_CHUNK_SIZE)
+
+    def after_bulk_create(self, reactions):
+        if not reactions:
+            return
+        Review.objects.filter(pk__in={reaction.review_id for reaction in reactions}).rebuild_reaction_counts()
+
+        activity = Counter(reaction.review.book_id for reaction in reactions)
+        bump_versions(*(reviews_namespace(book_id) for book_id in activity))
+        for book_id, count in activity.items():
+            transaction.on_commit(partial(
+                ranking.record_activity, book_id, settings.BOOK_TRENDING_REACTION_WEIGHT * count
+            ), robust=True)
@@ -1,20 +1,153 @@
-from django.db.models import Avg
-from django.db.models.signals import post_save
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
 
-from book.models import Review
+from book.cache import (
+    BOOKS_NAMESPACE, CATEGORIES_NAMESPACE, CATEGORY_STATS_NAMESPACE, book_namespace, bump_versions, reviews_namespace
+)
+from book import ranking
+from book.images import schedule_cover_thumbnails
+from book.models import Book, Category, Review, ReviewReaction
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, raw, **kwargs):
+    instance._previous_rating = None
+    if not instance._state.adding and not raw:
+        instance._previous_rating = Review.objects.filter(pk=instance.pk).values_list("book_id", "rating").first()
+
+
+def shift_book_rating(book_id, rating_delta, count_delta=0, histogram_delta=None):
+    Book.objects.shift_rating(book_id, rating_delta, count_delta, histogram_delta)
+    Category.objects.filter(books__pk=book_id).shift_stats(rating_delta=rating_delta, count_delta=count_delta)
+    # rankings live in Redis, rolled back writes must not reach them
+    transaction.on_commit(partial(ranking.update_top, book_id), robust=True)
 
 
 @receiver(post_save, sender=Review)
 def update_book_rating(sender, instance, created, **kwargs):
-    book = instance.book
-    avg_rating = book.reviews.aggregate(avg_rating=Avg("rating", default=0))["avg_rating"]
+    if created:
+        shift_book_rating(instance.book_id, instance.rating, 1, {instance.rating: 1})
+        transaction.on_commit(
+            partial(ranking.record_activity, instance.book_id, settings.BOOK_TRENDING_REVIEW_WEIGHT), robust=True
+        )
+        return
+
+    previous = getattr(instance, "_previous_rating", None)
+    if previous is None:
+        return
+
+    previous_book_id, previous_rating = previous
+    if previous_book_id != instance.book_id:
+        shift_book_rating(previous_book_id, -previous_rating, -1, {previous_rating: -1})
+        shift_book_rating(instance.book_id, instance.rating, 1, {instance.rating: 1})
+    elif previous_rating != instance.rating:
+        shift_book_rating(
+            instance.book_id, instance.rating - previous_rating, 0, {previous_rating: -1, instance.rating: 1},
+        )
+
+
+@receiver(post_delete, sender=Review)
+def remove_book_rating(sender, instance, **kwargs):
+    shift_book_rating(instance.book_id, -instance.rating, -1, {instance.rating: -1})
+
+
+@receiver(pre_save, sender=Book)
+def remember_previous_category(sender, instance, raw, **kwargs):
+    instance._previous_category = None
+    if not instance._state.adding and not raw:
+        instance._previous_category = (
+            Book.objects.filter(pk=instance.pk).values_list("category_id", "rating_sum", "rating_count").first()
+        )
+
+
+@receiver(post_save, sender=Book)
+def update_category_stats(sender, instance, created, **kwargs):
+    if created:
+        Category.objects.filter(pk=instance.category_id).shift_stats(1, instance.rating_sum, instance.rating_count)
+        return
+
+    previous = getattr(instance, "_previous_category", None)
+    if previous is None or previous[0] == instance.category_id:
+        return
+
+    previous_category_id, rating_sum, rating_count = previous
+    Category.objects.filter(pk=previous_category_id).shift_stats(-1, -rating_sum, -rating_count)
+    Category.objects.filter(pk=instance.category_id).shift_stats(1, rating_sum, rating_count)
+
+
+@receiver(post_delete, sender=Book)
+def remove_category_book(sender, instance, **kwargs):
+    # the ratings have left the category with the reviews deleted along with the book
+    Category.objects.filter(pk=instance.category_id).shift_stats(books_delta=-1)
+    transaction.on_commit(partial(ranking.remove_book, instance.pk), robust=True)
+
+
+@receiver(post_save, sender=ReviewReaction)
+def record_reaction_activity(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        transaction.on_commit(
+            partial(ranking.record_activity, instance.review.book_id, settings.BOOK_TRENDING_REACTION_WEIGHT),
+            robust=True,
+        )
+
+
+@receiver(post_save, sender=ReviewReaction)
+def invalidate_reaction_cache(sender, instance, **kwargs):
+    # cancels bump in the view, deletes in `remove_reaction_count`
+    bump_versions(reviews_namespace(instance.review.book_id))
+
+
+@receiver(post_delete, sender=ReviewReaction)
+def remove_reaction_count(sender, instance, origin, **kwargs):
+    # the cancel view deletes with raw SQL and moves the counters itself; reactions
+    # deleted along with their review or book need no per reaction query
+    if not isinstance(origin, ReviewReaction) and getattr(origin, "model", None) is not ReviewReaction:
+        return
+
+    Review.objects.shift_reaction_counts(instance.review_id, removed=instance.reaction)
+    bump_versions(reviews_namespace(instance.review.book_id))
+
+
+@receiver([post_save, post_delete], sender=Review)
+def invalidate_review_cache(sender, instance, **kwargs):
+    # the running ratings of the book and its category have changed, of both books for a moved review
+    book_ids = {instance.book_id}
+    previous = getattr(instance, "_previous_rating", None)
+    if previous is not None:
+        book_ids.add(previous[0])
+    bump_versions(
+        BOOKS_NAMESPACE, CATEGORY_STATS_NAMESPACE,
+        *(book_namespace(book_id) for book_id in book_ids),
+        *(reviews_namespace(book_id) for book_id in book_ids),
+    )
+
+
+@receiver(post_save, sender=Book)
+def update_cover_thumbnails(sender, instance, raw, **kwargs):
+    if raw:
+        return
+
+    if not instance.cover_img:
+        if instance.cover_thumbnails:
+            instance.cover_thumbnails = {}
+            Book.objects.filter(pk=instance.pk).update(cover_thumbnails={})
+        return
+
+    if instance.cover_thumbnails.get("source") != instance.cover_img.name:
+        # rendering is kept off the request, it starts once the new cover is committed
+        transaction.on_commit(partial(schedule_cover_thumbnails, instance.pk))
+
+
+@receiver([post_save, post_delete], sender=Book)
+def invalidate_book_cache(sender, instance, **kwargs):
+    bump_versions(BOOKS_NAMESPACE, CATEGORY_STATS_NAMESPACE, book_namespace(instance.pk))
 
-    if avg_rating >= 5:
-        book.rating = 5
-    elif avg_rating <= 1:
-        book.rating = 1
-    else:
-        book.rating = avg_rating
 
-    book.save()
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    # categories are nested into every book payload
+    bump_versions(BOOKS_NAMESPACE, CATEGORIES_NAMESPACE, CATEGORY_STATS_NAMESPACE)
@@ -1,11 +1,36 @@
+import io
+import json
+import shutil
+import tempfile
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import AsyncRequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
 from django.utils.translation import gettext_lazy
+from django_redis import get_redis_connection
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
 from rest_framework.reverse import reverse
-from rest_framework.test import APITestCase
+from rest_framework.test import APIRequestFactory, APITestCase
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from book import async_views, ranking
+from book_platform import metrics
+from book_platform.renderers import ORJSONRenderer
+from book.cache import BOOKS_NAMESPACE, CATEGORIES_NAMESPACE, book_namespace, bump_versions, get_cache
+from book.images import generate_cover_thumbnails
 from book.models import Category, Book, Review, ReviewReaction
+from book.pagination import BookKeysetPagination
+from book.serializers import BookValuesListSerializer, ReviewValuesListSerializer
+from book.throttles import ReactionRateThrottle
 from book.views import ReviewCreateAPIView
 
 user_model = get_user_model()
@@ -54,15 +79,143 @@ class BookAPITest(APITestCase):
         self.assertIn("title", first_book)
         self.assertIn("tes", first_book["title"])
 
+    def test_search_by_author(self):
+        Book.objects.create(title="Gone Girl", author="Gillian Flynn", category=self.test_category, rating=1)
+        response = self.client.get(self.list_url, data={"search": "flynn"})
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+
+        data = response.json()
+        self.assertEquals([book["title"] for book in data["results"]], ["Gone Girl"])
+
+    def test_search_ranks_title_matches_first(self):
+        Book.objects.create(
+            title="Carrie", author="Stephen King", category=self.test_category, rating=1,
+            description="A novel in the shadow of The Shining",
+        )
+        Book.objects.create(title="The Shining", author="Stephen King", category=self.test_category, rating=1)
+
+        response = self.client.get(self.list_url, data={"search": "shining"})
+        data = response.json()
+        self.assertEquals([book["title"] for book in data["results"]], ["The Shining", "Carrie"])
+
+    def test_search_tolerates_typos(self):
+        Book.objects.create(title="The Shining", author="Stephen King", category=self.test_category, rating=1)
+        response = self.client.get(self.list_url, data={"search": "shinning"})
+        data = response.json()
+        self.assertEquals([book["title"] for book in data["results"]], ["The Shining"])
+
     def test_pagination(self):
         response = self.client.get(self.list_url, data={"page": 2})
         self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
 
+    def iter_cursor_pages(self, **params):
+        response = self.client.get(self.list_url, data={"paginate": "cursor", **params})
+        while True:
+            self.assertEquals(response.status_code, status.HTTP_200_OK)
+            data = response.json()
+            yield data
+            if not data["next"]:
+                return
+            response = self.client.get(data["next"])
+
+    def test_cursor_pagination(self):
+        for i in range(12):
+            Book.objects.create(title=f"book_{i}", author="someone", category=self.test_category, rating=1 + i % 5)
+
+        pages = list(self.iter_cursor_pages())
+        self.assertEquals(len(pages), 2)
+        self.assertIsNone(pages[0]["count"])
+        ids = [book["id"] for page in pages for book in page["results"]]
+        self.assertEquals(ids, sorted(Book.objects.values_list("id", flat=True)))
+
+        pages = list(self.iter_cursor_pages(ordering="-rating", count="exact"))
+        self.assertEquals(pages[0]["count"], 13)
+        ids = [book["id"] for page in pages for book in page["results"]]
+        self.assertEquals(ids, list(Book.objects.order_by("-rating", "-id").values_list("id", flat=True)))
+
+        # the previous link pages the descending ordering backwards
+        previous = self.client.get(pages[-1]["previous"]).json()
+        self.assertEquals(previous["results"], pages[0]["results"])
+        self.assertIsNone(previous["previous"])
+
+    def test_cursor_pagination_with_filters(self):
+        other_category = Category.objects.create(slug="other_cat", title="other_cat")
+        for i in range(12):
+            Book.objects.create(title=f"Shining {i}", author="someone", category=other_category, rating=1)
+
+        pages = list(self.iter_cursor_pages(category="other_cat", search="shining", count="estimate"))
+        self.assertIsInstance(pages[0]["count"], int)
+        titles = [book["title"] for page in pages for book in page["results"]]
+        self.assertEquals(titles, [f"Shining {i}" for i in range(12)])
+
+    def test_cursor_pagination_invalid_cursor(self):
+        response = self.client.get(self.list_url, data={"paginate": "cursor", "cursor": "broken"})
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_success_detail(self):
         url = reverse('books-detail', args=[self.test_book.id])
         response = self.client.get(url)
         self.assertEquals(response.status_code, status.HTTP_200_OK)
 
+        data = response.json()
+        self.assertNotIn("reviews", data)
+        self.assertEquals(data["reviews_count"], 0)
+        self.assertEquals(data["rating_histogram"], {"1": 0, "2": 0, "3": 0, "4": 0, "5": 0})
+        self.assertTrue(data["reviews_url"].endswith(reverse("book-reviews-list", args=[self.test_book.id])))
+
+    def test_detail_rating_histogram(self):
+        for rating in (5, 5, 2):
+            reviewer = user_model.objects.create_user(username=f"reviewer_{user_model.objects.count()}")
+            Review.objects.create(book=self.test_book, user=reviewer, rating=rating)
+
+        response = self.client.get(reverse('books-detail', args=[self.test_book.id]))
+        data = response.json()
+        self.assertEquals(data["reviews_count"], 3)
+        self.assertEquals(data["rating_histogram"], {"1": 0, "2": 1, "3": 0, "4": 0, "5": 2})
+
+    def test_list_cache_invalidated_on_book_change(self):
+        self.client.get(self.list_url)
+        Book.objects.create(title="new_book", author="someone", category=self.test_category, rating=1)
+
+        response = self.client.get(self.list_url)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(len(response.json()["results"]), 2)
+
+    def test_detail_cache_invalidated_on_review(self):
+        url = reverse('books-detail', args=[self.test_book.id])
+        self.assertEquals(self.client.get(url).json()["rating"], 1)
+
+        reviewer = user_model.objects.create_user(username="reviewer")
+        Review.objects.create(book=self.test_book, user=reviewer, rating=5)
+
+        response = self.client.get(url)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response.json()["rating"], 5)
+
+    def test_caches_invalidated_on_review_move(self):
+        other_book = Book.objects.create(title="other_book", author="someone", category=self.test_category, rating=1)
+        reviewer = user_model.objects.create_user(username="reviewer")
+        review = Review.objects.create(book=self.test_book, user=reviewer, rating=5)
+
+        detail_url = reverse('books-detail', args=[self.test_book.id])
+        reviews_url = reverse('book-reviews-list', args=[self.test_book.id])
+        self.assertEquals(self.client.get(detail_url).json()["reviews_count"], 1)
+        self.assertEquals(len(self.client.get(reviews_url).json()["results"]), 1)
+
+        review.book = other_book
+        review.save()
+
+        self.assertEquals(self.client.get(detail_url).json()["reviews_count"], 0)
+        self.assertEquals(self.client.get(reviews_url).json()["results"], [])
+        self.assertEquals(self.client.get(reverse('books-detail', args=[other_book.id])).json()["reviews_count"], 1)
+
+    def test_version_keys_expire(self):
+        self.assertEquals(self.client.get(reverse('books-detail', args=["abc"])).status_code, 404)
+        # junk and missing ids must not leave keys behind forever
+        ttl = get_cache().ttl(f"version:{book_namespace('abc')}")
+        self.assertGreater(ttl, 0)
+        self.assertLessEqual(ttl, settings.BOOK_CACHE_TIMEOUT)
+
 
 class ReviewAPITest(APITestCase):
     def setUp(self):
@@ -75,13 +228,52 @@ class ReviewAPITest(APITestCase):
         self.test_review = Review.objects.create(book=self.test_book, user=self.test_user, rating=1)
 
     def test_success_list(self):
-        url = reverse("book-reviews-list", args=[self.test_review.id])
+        url = reverse("book-reviews-list", args=[self.test_book.id])
         response = self.client.get(url)
         self.assertEquals(response.status_code, status.HTTP_200_OK)
         data = response.json()
         self.assertIn("results", data)
         self.assertEquals(len(data["results"]), 1)
 
+    def test_list_only_book_reviews(self):
+        other_book = Book.objects.create(title="other_book", author="someone", category=self.test_category, rating=1)
+        Review.objects.create(book=other_book, user=self.test_user, rating=5)
+
+        url = reverse("book-reviews-list", args=[self.test_book.id])
+        response = self.client.get(url)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEquals([review["id"] for review in data["results"]], [self.test_review.id])
+
+    def test_list_cursor_pagination(self):
+        reviews = [self.test_review] + [
+            Review.objects.create(book=self.test_book, user=self.test_user, rating=2) for _ in range(10)
+        ]
+        url = reverse("book-reviews-list", args=[self.test_book.id])
+
+        first_page = self.client.get(url).json()
+        self.assertEquals(len(first_page["results"]), 10)
+        self.assertIsNotNone(first_page["next"])
+
+        self.assertIsNone(first_page["previous"])
+
+        second_page = self.client.get(first_page["next"]).json()
+        self.assertEquals([review["id"] for review in second_page["results"]], [reviews[-1].id])
+        self.assertIsNone(second_page["next"])
+
+        # back from the second page, the first one again
+        previous_page = self.client.get(second_page["previous"]).json()
+        self.assertEquals(previous_page["results"], first_page["results"])
+        self.assertIsNone(previous_page["previous"])
+        self.assertEquals(
+            self.client.get(previous_page["next"]).json()["results"], second_page["results"],
+        )
+
+    def test_failure_list_invalid_cursor(self):
+        url = reverse("book-reviews-list", args=[self.test_book.id])
+        response = self.client.get(url, data={"cursor": "not-a-cursor"})
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_create_review(self):
         ReviewCreateAPIView.throttle_classes = ()  # to avoid throttling
         url = reverse("book-reviews-create")
@@ -126,6 +318,10 @@ class ReviewReactionAPITest(APITestCase):
         response = self.client.post(url, data)
         self.assertEquals(response.status_code, status.HTTP_201_CREATED, response.json())
 
+        test_review.refresh_from_db()
+        self.assertEquals(test_review.likes_count, 1)
+        self.assertEquals(test_review.dislikes_count, 0)
+
     def test_failure_create_on_exist(self):
         test_review = Review.objects.create(book=self.test_book, user=self.test_user, rating=1)
         ReviewReaction.objects.create(
@@ -164,9 +360,675 @@ class ReviewReactionAPITest(APITestCase):
         self.assertEquals(react.review_id, test_review.id)
         self.assertEquals(react.user_id, self.react_user.id)
 
+    def test_update_react_moves_counters(self):
+        test_review = Review.objects.create(book=self.test_book, user=self.test_user, rating=5)
+        url = reverse("book-review-react", args=[test_review.id])
+
+        self.client.post(url, {"reaction": ReviewReaction.Reaction.dislike.value})
+        response = self.client.patch(url, {"reaction": ReviewReaction.Reaction.like.value})
+        self.assertEquals(response.status_code, status.HTTP_200_OK, response.json())
+
+        test_review.refresh_from_db()
+        self.assertEquals(test_review.likes_count, 1)
+        self.assertEquals(test_review.dislikes_count, 0)
+
+    def test_update_uncounted_react(self):
+        test_review = Review.objects.create(book=self.test_book, user=self.test_user, rating=5)
+        # created behind the API, the counters don't know about it
+        ReviewReaction.objects.create(review=test_review, user=self.react_user, reaction=ReviewReaction.Reaction.dislike)
+
+        url = reverse("book-review-react", args=[test_review.id])
+        response = self.client.patch(url, {"reaction": ReviewReaction.Reaction.like.value})
+        self.assertEquals(response.status_code, status.HTTP_200_OK, response.json())
+
+        test_review.refresh_from_db()
+        self.assertEquals(test_review.likes_count, 1)
+        self.assertEquals(test_review.dislikes_count, 0)
+
+    def test_remove_react(self):
+        test_review = Review.objects.create(book=self.test_book, user=self.test_user, rating=5)
+        url = reverse("book-review-react", args=[test_review.id])
+        self.client.post(url, {"reaction": ReviewReaction.Reaction.like.value})
+
+        response = self.client.delete(url)
+        self.assertEquals(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        test_review.refresh_from_db()
+        self.assertEquals(test_review.likes_count, 0)
+        self.assertFalse(ReviewReaction.objects.filter(review=test_review).exists())
+
+    def test_cancel_react(self):
+        test_review = Review.objects.create(book=self.test_book, user=self.test_user, rating=5)
+        other_user = user_model.objects.create_user(username="other")
+        ReviewReaction.objects.create(review=test_review, user=other_user, reaction=ReviewReaction.Reaction.dislike)
+        self.client.put(reverse("book-review-react", args=[test_review.id]), {"reaction": "DIS"})
+
+        url = reverse("book-review-react-cancel", args=[test_review.id])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(url)
+        self.assertEquals(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEquals(len([query for query in queries if "book_reviewreaction" in query["sql"]]), 1)
+
+        # the ORM created dislike was never counted
+        test_review.refresh_from_db()
+        self.assertEquals(test_review.dislikes_count, 0)
+        self.assertFalse(ReviewReaction.objects.filter(review=test_review, user=self.react_user).exists())
+        self.assertTrue(ReviewReaction.objects.filter(review=test_review, user=other_user).exists())
+
+        # a retry has nothing left to delete
+        response = self.client.delete(url)
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # cancelling an uncounted reaction leaves the counter at zero
+        ReviewReaction.objects.create(review=test_review, user=self.react_user, reaction=ReviewReaction.Reaction.like)
+        response = self.client.delete(url)
+        self.assertEquals(response.status_code, status.HTTP_204_NO_CONTENT)
+        test_review.refresh_from_db()
+        self.assertEquals(test_review.likes_count, 0)
+
+    def test_list_shows_reaction_counts(self):
+        test_review = Review.objects.create(book=self.test_book, user=self.test_user, rating=5)
+        self.client.post(reverse("book-review-react", args=[test_review.id]), {"reaction": "LIKE"})
+
+        response = self.client.get(reverse("book-reviews-list", args=[self.test_book.id]))
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(
+            response.json()["results"][0]["reactions"],
+            [{"reaction": ReviewReaction.Reaction.like.label, "count": 1}],
+        )
+
+    def test_put_react_upserts(self):
+        test_review = Review.objects.create(book=self.test_book, user=self.test_user, rating=5)
+        url = reverse("book-review-react", args=[test_review.id])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(url, {"reaction": ReviewReaction.Reaction.like.value})
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED, response.json())
+        self.assertEquals(response.json(), {"reaction": "LIKE", "likes_count": 1, "dislikes_count": 0})
+        self.assertEquals(len([query for query in queries if "book_reviewreaction" in query["sql"]]), 1)
+
+        # idempotent
+        response = self.client.put(url, {"reaction": ReviewReaction.Reaction.like.value})
+        self.assertEquals(response.status_code, status.HTTP_200_OK, response.json())
+        self.assertEquals(response.json(), {"reaction": "LIKE", "likes_count": 1, "dislikes_count": 0})
+
+        response = self.client.put(url, {"reaction": ReviewReaction.Reaction.dislike.value})
+        self.assertEquals(response.status_code, status.HTTP_200_OK, response.json())
+        self.assertEquals(response.json(), {"reaction": "DIS", "likes_count": 0, "dislikes_count": 1})
+
+        test_review.refresh_from_db()
+        self.assertEquals((test_review.likes_count, test_review.dislikes_count), (0, 1))
+        self.assertEquals(ReviewReaction.objects.get(review=test_review, user=self.react_user).reaction, "DIS")
+
+    def test_put_uncounted_react(self):
+        test_review = Review.objects.create(book=self.test_book, user=self.test_user, rating=5)
+        ReviewReaction.objects.create(review=test_review, user=self.react_user, reaction=ReviewReaction.Reaction.dislike)
+
+        response = self.client.put(reverse("book-review-react", args=[test_review.id]), {"reaction": "LIKE"})
+        self.assertEquals(response.status_code, status.HTTP_200_OK, response.json())
+        self.assertEquals(response.json(), {"reaction": "LIKE", "likes_count": 1, "dislikes_count": 0})
+
+    def test_failure_put_react(self):
+        response = self.client.put(reverse("book-review-react", args=[0]), {"reaction": "LIKE"})
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        test_review = Review.objects.create(book=self.test_book, user=self.test_user, rating=5)
+        response = self.client.put(reverse("book-review-react", args=[test_review.id]), {"reaction": "LOVE"})
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_failure_update_not_exist(self):
         url = reverse("book-review-react", args=["not_exist"])
         data = {"reaction": ReviewReaction.Reaction.like.value}
 
         response = self.client.patch(url, data)
         self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND, response.json())
+
+
+class BulkIngestAPITest(APITestCase):
+    def setUp(self):
+        self.staff_user = user_model.objects.create_user(username="staff", password="secret", is_staff=True)
+        token = RefreshToken.for_user(user=self.staff_user)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(token.access_token))
+
+        self.reviewers = [user_model.objects.create_user(username=f"partner_{i}") for i in range(3)]
+        self.test_category = Category.objects.create(title="test_cat", slug="test_cat")
+        self.test_book = Book.objects.create(title="test_book", author="someone", category=self.test_category, rating=1)
+
+    def post_ndjson(self, kind, rows):
+        body = "\n".join(json.dumps(row) for row in rows)
+        return self.client.post(
+            reverse("book-bulk-ingest", args=[kind]), data=body, content_type="application/x-ndjson"
+        )
+
+    def test_bulk_reviews(self):
+        rows = [
+            {"book": self.test_book.id, "user": reviewer.id, "rating": rating, "comment": "imported"}
+            for reviewer, rating in zip(self.reviewers, (5, 4, 3))
+        ]
+        response = self.post_ndjson("reviews", rows)
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED, response.json())
+        self.assertEquals(response.json()["created"], 3)
+
+        self.test_book.refresh_from_db()
+        self.assertEquals((self.test_book.rating_sum, self.test_book.rating_count), (12, 3))
+        self.assertEquals(self.test_book.rating, 4)
+
+    def test_bulk_reviews_reports_invalid_lines(self):
+        rows = [
+            {"book": self.test_book.id, "user": self.reviewers[0].id, "rating": 5},
+            {"book": 0, "user": self.reviewers[1].id, "rating": 9},
+        ]
+        response = self.post_ndjson("reviews", rows)
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        errors = response.json()["errors"]
+        self.assertEquals([error["line"] for error in errors], [2])
+        self.assertIn("book", errors[0]["errors"])
+        self.assertIn("rating", errors[0]["errors"])
+        self.assertFalse(Review.objects.exists())
+
+    def test_bulk_reactions(self):
+        review = Review.objects.create(book=self.test_book, user=self.reviewers[0], rating=5)
+        rows = [
+            {"review": review.id, "user": self.reviewers[1].id, "reaction": "LIKE"},
+            {"review": review.id, "user": self.reviewers[2].id, "reaction": "DIS"},
+            {"review": review.id, "user": self.reviewers[2].id, "reaction": "LIKE"},  # duplicate, skipped
+        ]
+        response = self.post_ndjson("reactions", rows)
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED, response.json())
+        self.assertEquals(response.json(), {"received": 3, "created": 2})
+
+        review.refresh_from_db()
+        self.assertEquals((review.likes_count, review.dislikes_count), (1, 1))
+
+    def test_bulk_reactions_already_imported(self):
+        review = Review.objects.create(book=self.test_book, user=self.reviewers[0], rating=5)
+        rows = [{"review": review.id, "user": self.reviewers[1].id, "reaction": "LIKE"}]
+
+        self.assertEquals(self.post_ndjson("reactions", rows).json()["created"], 1)
+        response = self.post_ndjson("reactions", rows * 3)
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED, response.json())
+        self.assertEquals(response.json(), {"received": 3, "created": 0})
+
+    def test_bulk_reactions_next_to_existing_ones(self):
+        review = Review.objects.create(book=self.test_book, user=self.reviewers[0], rating=5)
+        ReviewReaction.objects.create(review=review, user=self.reviewers[1], reaction="DIS")
+        rows = [
+            {"review": review.id, "user": self.reviewers[1].id, "reaction": "LIKE"},  # existing, skipped
+            {"review": review.id, "user": self.reviewers[2].id, "reaction": "LIKE"},
+        ]
+        response = self.post_ndjson("reactions", rows)
+        self.assertEquals(response.json(), {"received": 2, "created": 1})
+        self.assertEquals(
+            set(ReviewReaction.objects.filter(review=review).values_list("user_id", "reaction")),
+            {(self.reviewers[1].id, "DIS"), (self.reviewers[2].id, "LIKE")},
+        )
+
+    def test_failure_not_staff(self):
+        token = RefreshToken.for_user(user=self.reviewers[0])
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(token.access_token))
+
+        response = self.post_ndjson("reviews", [])
+        self.assertEquals(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class CoverThumbnailsAPITest(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.test_category = Category.objects.create(slug="test_cat", title="test_cat")
+        with mock.patch("book.signals.schedule_cover_thumbnails") as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.test_book = Book.objects.create(
+                    title="test_book", author="someone", category=self.test_category, rating=1,
+                    cover_img=self.make_cover(),
+                )
+        schedule.assert_called_once_with(self.test_book.id)
+
+    @staticmethod
+    def make_cover():
+        buffer = io.BytesIO()
+        Image.new("RGBA", (600, 900), "red").save(buffer, format="PNG")
+        return SimpleUploadedFile("cover.png", buffer.getvalue(), content_type="image/png")
+
+    def test_thumbnails_in_list(self):
+        response = self.client.get(reverse("books-list"))
+        self.assertIsNone(response.json()["results"][0]["cover_thumbnails"])
+
+        generate_cover_thumbnails(self.test_book.id)
+
+        thumbnails = self.client.get(reverse("books-list")).json()["results"][0]["cover_thumbnails"]
+        self.assertEquals(set(thumbnails), {"small", "medium", "large"})
+        self.assertTrue(thumbnails["small"]["webp"].startswith("http://testserver/media/books/thumbs/"))
+        self.assertTrue(thumbnails["small"]["jpeg"].endswith("-small.jpeg"))
+
+    def test_thumbnails_of_replaced_cover_are_hidden(self):
+        generate_cover_thumbnails(self.test_book.id)
+        self.test_book.refresh_from_db()
+
+        with mock.patch("book.signals.schedule_cover_thumbnails") as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.test_book.cover_img = self.make_cover()
+                self.test_book.save()
+        schedule.assert_called_once_with(self.test_book.id)
+
+        response = self.client.get(reverse("books-detail", args=[self.test_book.id]))
+        self.assertIsNone(response.json()["cover_thumbnails"])
+
+
+class CategoryAPITest(APITestCase):
+    def setUp(self):
+        self.test_category = Category.objects.create(slug="test_cat", title="test_cat")
+        Category.objects.create(slug="empty_cat", title="empty_cat")
+        self.test_book = Book.objects.create(title="test_book", author="someone", category=self.test_category, rating=1)
+        self.url = reverse("book-categories-list")
+
+    def test_success_list(self):
+        response = self.client.get(self.url)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response.json(), [
+            {"slug": "empty_cat", "title": "empty_cat", "books_count": 0, "reviews_count": 0, "average_rating": None},
+            {"slug": "test_cat", "title": "test_cat", "books_count": 1, "reviews_count": 0, "average_rating": None},
+        ])
+
+    def test_cache_invalidated_on_review(self):
+        self.client.get(self.url)
+        reviewer = user_model.objects.create_user(username="reviewer")
+        Review.objects.create(book=self.test_book, user=reviewer, rating=4)
+
+        categories = {category["slug"]: category for category in self.client.get(self.url).json()}
+        self.assertEquals(categories["test_cat"]["reviews_count"], 1)
+        self.assertEquals(categories["test_cat"]["average_rating"], 4.0)
+
+
+class RankingAPITest(APITestCase):
+    def setUp(self):
+        ranking.clear()
+        self.addCleanup(ranking.clear)
+
+        self.test_category = Category.objects.create(slug="test_cat", title="test_cat")
+        self.books = {
+            title: Book.objects.create(title=title, author="someone", category=self.test_category, rating=1)
+            for title in ("steady", "lucky", "poor")
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            for title, ratings in (("steady", (5, 5, 5, 5)), ("lucky", (5,)), ("poor", (1, 1))):
+                for rating in ratings:
+                    self.add_review(self.books[title], rating)
+
+    def add_review(self, book, rating):
+        reviewer = user_model.objects.create_user(username=f"ranking_user_{user_model.objects.count()}")
+        return Review.objects.create(book=book, user=reviewer, rating=rating)
+
+    def titles(self, url_name):
+        response = self.client.get(reverse(url_name))
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        return [book["title"] for book in response.json()["results"]]
+
+    def test_top(self):
+        # a single 5 star review doesn't beat four of them
+        self.assertEquals(self.titles("books-top"), ["steady", "lucky", "poor"])
+        self.assertEquals(self.client.get(reverse("books-top")).json()["count"], 3)
+
+    def test_trending_follows_activity(self):
+        self.assertEquals(self.titles("books-trending")[0], "steady")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(6):
+                self.add_review(self.books["poor"], 2)
+        self.assertEquals(self.titles("books-trending")[0], "poor")
+
+    def test_deleted_book_leaves_rankings(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.books["steady"].delete()
+        self.assertEquals(self.titles("books-top"), ["lucky", "poor"])
+        self.assertNotIn("steady", self.titles("books-trending"))
+
+    def test_rebuild(self):
+        ranking.clear()
+        ranking.rebuild_top()
+        ranking.rebuild_trending()
+        self.assertEquals(self.titles("books-top"), ["steady", "lucky", "poor"])
+        self.assertEquals(self.titles("books-trending")[0], "steady")
+
+
+class ThrottleTest(APITestCase):
+    def setUp(self):
+        self.redis = get_redis_connection(ReactionRateThrottle.redis_alias)
+        self.clear_throttles()
+        self.addCleanup(self.clear_throttles)
+
+        self.test_category = Category.objects.create(slug="test_cat", title="test_cat")
+        self.test_book = Book.objects.create(title="test_book", author="someone", category=self.test_category, rating=1)
+        author = user_model.objects.create_user(username="throttle_author")
+        self.test_review = Review.objects.create(book=self.test_book, user=author, rating=4)
+
+    def clear_throttles(self):
+        keys = list(self.redis.scan_iter("throttle:*"))
+        if keys:
+            self.redis.delete(*keys)
+
+    def login(self, username):
+        user = user_model.objects.create_user(username=username)
+        token = RefreshToken.for_user(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(token.access_token))
+        return user
+
+    def react(self):
+        url = reverse("book-review-react", args=[self.test_review.id])
+        return self.client.put(url, {"reaction": ReviewReaction.Reaction.like.value})
+
+    @mock.patch.object(ReactionRateThrottle, "THROTTLE_RATES", {"review_react": "2/minute"})
+    def test_burst_then_throttled(self):
+        self.login("throttled")
+        self.assertEquals(self.react().status_code, status.HTTP_201_CREATED)
+        self.assertEquals(self.react().status_code, status.HTTP_200_OK)
+
+        response = self.react()
+        self.assertEquals(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # one more request is allowed every 30 seconds
+        self.assertTrue(0 < int(response["Retry-After"]) <= 30, response["Retry-After"])
+
+    @mock.patch.object(ReactionRateThrottle, "THROTTLE_RATES", {"review_react": "1/minute"})
+    def test_rate_per_user(self):
+        user = self.login("first")
+        self.assertEquals(self.react().status_code, status.HTTP_201_CREATED)
+        self.assertEquals(self.react().status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        self.login("second")
+        self.assertEquals(self.react().status_code, status.HTTP_201_CREATED)
+
+        # the state is one arrival time that expires with the period
+        ttl = self.redis.pttl(f"throttle:review_react:{user.pk}")
+        self.assertTrue(0 < ttl <= 60_000, ttl)
+
+    @mock.patch.object(ReactionRateThrottle, "THROTTLE_RATES", {"review_react": "100/minute"})
+    def test_one_redis_call_per_request(self):
+        self.login("counted")
+        with mock.patch.object(ReactionRateThrottle, "get_client", return_value=self.redis):
+            with mock.patch.object(self.redis, "evalsha", wraps=self.redis.evalsha) as evalsha:
+                for _ in range(3):
+                    self.react()
+        self.assertEquals(evalsha.call_count, 3)
+
+
+class AsyncReadViewsTest(APITestCase):
+    factory = AsyncRequestFactory()
+
+    def setUp(self):
+        self.test_category = Category.objects.create(slug="test_cat", title="test_cat")
+        self.books = [
+            Book.objects.create(title=f"async book {i}", author="someone", category=self.test_category, rating=1)
+            for i in range(12)
+        ]
+        for i in range(12):
+            reviewer = user_model.objects.create_user(username=f"async_reviewer_{i}")
+            Review.objects.create(book=self.books[0], user=reviewer, rating=i % 5 + 1)
+
+    def assertSameAsSync(self, view, url, params=None, **kwargs):
+        # without the cache both compute the payload
+        bump_versions(BOOKS_NAMESPACE, CATEGORIES_NAMESPACE, *(book_namespace(book.id) for book in self.books))
+        response = self.client.get(url, data=params)
+        bump_versions(BOOKS_NAMESPACE, CATEGORIES_NAMESPACE, *(book_namespace(book.id) for book in self.books))
+        async_response = async_to_sync(view)(self.factory.get(url, data=params), **kwargs)
+
+        self.assertEquals(async_response.status_code, response.status_code)
+        self.assertEquals(async_response.content, response.content)
+        return async_response
+
+    def test_book_list(self):
+        url = reverse("books-list")
+        for params in (
+            {},
+            {"page": 2},
+            {"page": 3},
+            {"category": self.test_category.slug},
+            {"category": "Failure SLUG"},
+            {"search": "async"},
+            {"paginate": "cursor", "ordering": "-rating", "count": "exact"},
+        ):
+            with self.subTest(**params):
+                self.assertSameAsSync(async_views.book_list, url, params)
+
+    def test_book_detail(self):
+        for book_id in (str(self.books[0].id), "0", "abc"):
+            with self.subTest(book_id=book_id):
+                url = reverse("books-detail", args=[book_id])
+                self.assertSameAsSync(async_views.book_detail, url, book_id=book_id)
+
+    def test_review_list(self):
+        url = reverse("book-reviews-list", args=[self.books[0].id])
+        response = self.assertSameAsSync(async_views.review_list, url, book_id=str(self.books[0].id))
+        cursor = parse_qs(urlparse(json.loads(response.content)["next"]).query)["cursor"][0]
+        self.assertSameAsSync(async_views.review_list, url, {"cursor": cursor}, book_id=str(self.books[0].id))
+
+        self.assertSameAsSync(async_views.review_list, reverse("book-reviews-list", args=["x"]), book_id="x")
+
+    def test_read_only(self):
+        url = reverse("books-list")
+        response = async_to_sync(async_views.book_list)(self.factory.post(url))
+        self.assertEquals(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class MetricsTest(APITestCase):
+    def setUp(self):
+        metrics.registry.reset()
+        self.test_category = Category.objects.create(slug="test_cat", title="test_cat")
+        self.test_book = Book.objects.create(title="test_book", author="someone", category=self.test_category, rating=1)
+
+    def scrape(self):
+        response = self.client.get(reverse("metrics"))
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        return response.content.decode()
+
+    def test_per_view_metrics(self):
+        bump_versions(BOOKS_NAMESPACE)
+        self.client.get(reverse("books-list"))
+        self.client.get(reverse("books-list"))
+        self.client.get(reverse("books-detail", args=[self.test_book.id]))
+
+        exposition = self.scrape()
+        self.assertIn('http_request_duration_seconds_count{view="books-list"} 2', exposition)
+        self.assertIn('http_request_duration_seconds_count{view="books-detail"} 1', exposition)
+        # a miss counts the books and reads a page, the second request is a hit
+        self.assertIn('db_queries_bucket{view="books-list",le="0"} 1', exposition)
+        self.assertIn('db_queries_bucket{view="books-list",le="2"} 2', exposition)
+        self.assertIn('cache_requests_total{view="books-list",alias="pages_cache",result="hit"}', exposition)
+        self.assertIn('cache_requests_total{view="books-list",alias="pages_cache",result="miss"}', exposition)
+        self.assertIn('render_duration_seconds_count{view="books-list"} 2', exposition)
+        # rows serialized on the miss, the page served from the cache on the hit
+        self.assertIn('serialize_duration_seconds_count{view="books-list"} 2', exposition)
+        self.assertNotIn('serialize_duration_seconds_sum{view="books-list"} 0\n', exposition)
+        self.assertNotIn('serialize_duration_seconds_sum{view="books-detail"} 0\n', exposition)
+
+    def test_asgi_db_queries(self):
+        # the view and its queries run in a `sync_to_async` thread, not in the thread of the middleware
+        bump_versions(BOOKS_NAMESPACE)
+        response = async_to_sync(self.async_client.get)(reverse("books-list"))
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+
+        exposition = self.scrape()
+        self.assertIn('db_queries_bucket{view="books-list",le="1"} 0', exposition)
+        self.assertIn('db_queries_bucket{view="books-list",le="2"} 1', exposition)
+
+    @override_settings(QUERY_BUDGETS={"books-list": 1})
+    def test_query_budget(self):
+        bump_versions(BOOKS_NAMESPACE)
+        with self.assertLogs("book_platform.metrics", "WARNING") as logs:
+            self.client.get(reverse("books-list"))
+        self.assertIn("books-list ran 2 queries, its budget is 1", logs.output[0])
+
+        bump_versions(BOOKS_NAMESPACE)
+        with override_settings(QUERY_BUDGET_STRICT=True), self.assertRaises(metrics.QueryBudgetExceeded):
+            self.client.get(reverse("books-list"))
+
+
+class ValuesListSerializerTest(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.test_category = Category.objects.create(slug="test_cat", title="test «cat»")
+        with mock.patch("book.signals.schedule_cover_thumbnails"):
+            self.books = [
+                Book.objects.create(title="no cover", author="someone", category=self.test_category, rating=1),
+                Book.objects.create(
+                    title="cover", author="Ünïcode", category=self.test_category, rating=3,
+                    cover_img=CoverThumbnailsAPITest.make_cover(),
+                ),
+                Book.objects.create(
+                    title="thumbnails", author="someone", category=self.test_category, rating=5,
+                    cover_img=CoverThumbnailsAPITest.make_cover(),
+                ),
+            ]
+        generate_cover_thumbnails(self.books[2].id)
+
+        for i, (comment, likes, dislikes) in enumerate(((None, 0, 0), ("", 2, 0), ("nice", 0, 1), ("🙂", 5, 3))):
+            reviewer = user_model.objects.create_user(username=f"values_reviewer_{i}")
+            review = Review.objects.create(book=self.books[0], user=reviewer, rating=i + 1, comment=comment)
+            Review.objects.filter(pk=review.pk).update(likes_count=likes, dislikes_count=dislikes)
+
+        self.request = Request(APIRequestFactory().get("/api/v1/books/"))
+
+    def assertSameBytes(self, values_serializer_class, queryset):
+        context = {"request": self.request}
+        serializer = values_serializer_class(context=context)
+        expected = values_serializer_class.serializer_class(queryset, many=True, context=context).data
+        actual = serializer.serialize(serializer.values(queryset))
+        self.assertEquals(JSONRenderer().render(actual), JSONRenderer().render(expected))
+
+    def test_books(self):
+        self.assertSameBytes(BookValuesListSerializer, Book.objects.select_related("category"))
+
+    def test_books_without_request(self):
+        self.request = None
+        self.assertSameBytes(BookValuesListSerializer, Book.objects.select_related("category"))
+
+    def test_reviews(self):
+        self.assertSameBytes(ReviewValuesListSerializer, Review.objects.with_author())
+
+    def test_list_responses(self):
+        # through the views, including the keyset cursors built from the rows
+        bump_versions(BOOKS_NAMESPACE)
+        with mock.patch.object(BookKeysetPagination, "page_size", 2):
+            response = self.client.get(reverse("books-list"), {"paginate": "cursor", "ordering": "-rating"})
+            self.assertEquals([book["title"] for book in response.json()["results"]], ["thumbnails", "cover"])
+            response = self.client.get(response.json()["next"])
+            self.assertEquals([book["title"] for book in response.json()["results"]], ["no cover"])
+
+        response = self.client.get(reverse("book-reviews-list", args=[self.books[0].id]))
+        self.assertEquals([review["rating"] for review in response.json()["results"]], [1, 2, 3, 4])
+        self.assertEquals(response.json()["results"][3]["reactions"], [
+            {"reaction": "like", "count": 5}, {"reaction": "dislike", "count": 3},
+        ])
+
+
+class ORJSONRendererTest(APITestCase):
+    def setUp(self):
+        self.test_category = Category.objects.create(slug="test_cat", title="test_cat")
+        self.test_book = Book.objects.create(title="test_book", author="someone", category=self.test_category, rating=1)
+        for i, comment in enumerate((None, "line\u2028separator", "ünïcode 🙂")):
+            reviewer = user_model.objects.create_user(username=f"orjson_reviewer_{i}")
+            review = Review.objects.create(book=self.test_book, user=reviewer, rating=i + 1, comment=comment)
+            Review.objects.filter(pk=review.pk).update(likes_count=i)
+
+    def test_same_bytes_as_json_renderer(self):
+        response = self.client.get(reverse("book-reviews-list", args=[self.test_book.id]))
+        self.assertEquals(response.content, JSONRenderer().render(response.data))
+        self.assertIn(b"line\\u2028separator", response.content)
+
+        data = {"created_at": self.test_book.reviews.first().created_at, "reaction": gettext_lazy("like")}
+        self.assertEquals(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_indent_falls_back(self):
+        data = {"id": 1, "big": 2 ** 70}
+        self.assertEquals(
+            ORJSONRenderer().render(data, "application/json; indent=4"),
+            JSONRenderer().render(data, "application/json; indent=4"),
+        )
+        self.assertEquals(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_parser(self):
+        user = user_model.objects.create_user(username="orjson_writer")
+        self.client.force_authenticate(user)
+        url = reverse("book-reviews-create")
+        with mock.patch.object(ReviewCreateAPIView, "throttle_classes", ()):
+            response = self.client.post(
+                url, data=f'{{"book": {self.test_book.id}, "rating": 5, "comment": "é"}}',
+                content_type="application/json",
+            )
+            self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+            self.assertEquals(response.json()["comment"], "é")
+
+            response = self.client.post(url, data="{", content_type="application/json")
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(response.json()["detail"].startswith("JSON parse error"))
+
+
+class ConditionalRequestTest(APITestCase):
+    def setUp(self):
+        self.test_category = Category.objects.create(slug="test_cat", title="test_cat")
+        self.test_book = Book.objects.create(title="test_book", author="someone", category=self.test_category, rating=1)
+        self.reviewer = user_model.objects.create_user(username="conditional_reviewer")
+        self.review = Review.objects.create(book=self.test_book, user=self.reviewer, rating=4)
+        self.detail_url = reverse("books-detail", args=[self.test_book.id])
+        self.reviews_url = reverse("book-reviews-list", args=[self.test_book.id])
+
+    def test_if_none_match(self):
+        for url in (self.detail_url, self.reviews_url):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEquals(response.status_code, status.HTTP_200_OK)
+                self.assertTrue(response["ETag"].startswith('"'))
+                self.assertIn("Last-Modified", response)
+
+                # answered from the versions in Redis
+                with self.assertNumQueries(0):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+                self.assertEquals(response.status_code, status.HTTP_304_NOT_MODIFIED)
+                self.assertEquals(response.content, b"")
+                self.assertIn("ETag", response)
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get(self.reviews_url)["Last-Modified"]
+        response = self.client.get(self.reviews_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEquals(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_changes_renew_the_etag(self):
+        detail_etag = self.client.get(self.detail_url)["ETag"]
+        reviews_etag = self.client.get(self.reviews_url)["ETag"]
+
+        # a reaction changes the review list only
+        self.client.force_authenticate(self.reviewer)
+        with mock.patch.object(ReactionRateThrottle, "THROTTLE_RATES", {"review_react": "100/minute"}):
+            url = reverse("book-review-react", args=[self.review.id])
+            self.client.put(url, {"reaction": ReviewReaction.Reaction.like.value})
+        self.client.force_authenticate(None)
+
+        self.assertEquals(self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=detail_etag).status_code, 304)
+        response = self.client.get(self.reviews_url, HTTP_IF_NONE_MATCH=reviews_etag)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response.json()["results"][0]["reactions"], [{"reaction": "like", "count": 1}])
+        reviews_etag = response["ETag"]
+
+        # a review changes both
+        Review.objects.create(book=self.test_book, user=user_model.objects.create_user(username="another"), rating=2)
+        self.assertEquals(self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=detail_etag).status_code, 200)
+        self.assertEquals(self.client.get(self.reviews_url, HTTP_IF_NONE_MATCH=reviews_etag).status_code, 200)
+
+    def test_async_views_share_the_etags(self):
+        factory = AsyncRequestFactory()
+        book_id = str(self.test_book.id)
+        for view, url in ((async_views.book_detail, self.detail_url), (async_views.review_list, self.reviews_url)):
+            with self.subTest(url=url):
+                etag = self.client.get(url)["ETag"]
+                response = async_to_sync(view)(factory.get(url, headers={"If-None-Match": etag}), book_id=book_id)
+                self.assertEquals(response.status_code, status.HTTP_304_NOT_MODIFIED)
+                self.assertEquals(response["ETag"], etag)
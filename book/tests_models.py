@@ -1,13 +1,19 @@
+import json
+import os
+import tempfile
 from unittest import mock
 
+from django.contrib import admin
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError
+from django.db import IntegrityError, connection
 from django.db.models.query import RawQuerySet
 from django.db.models.signals import post_save
-from django.test import TestCase
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
 
-from book.models import Review, Category, Book, ReviewReaction
+from book.fixtures import load_fixture
+from book.models import Review, Category, Book, ReviewReaction, FixtureLoad, RATING_COUNT_FIELDS
 
 user_model = get_user_model()
 
@@ -71,6 +77,76 @@ class ReviewTest(TestCase):
         self.test_book.refresh_from_db()
         self.assertEquals(self.test_book.rating, usr_rating)
 
+    def test_running_rating_on_create_update_delete(self):
+        first = Review.objects.create(book=self.test_book, user=self.test_user, rating=5)
+        second = Review.objects.create(book=self.test_book, user=self.test_user, rating=2)
+        self.test_book.refresh_from_db()
+        self.assertEquals((self.test_book.rating_sum, self.test_book.rating_count), (7, 2))
+        self.assertEquals(self.test_book.rating, 4)
+
+        second.rating = 1
+        second.save()
+        self.test_book.refresh_from_db()
+        self.assertEquals((self.test_book.rating_sum, self.test_book.rating_count), (6, 2))
+        self.assertEquals(self.test_book.rating, 3)
+
+        first.delete()
+        self.test_book.refresh_from_db()
+        self.assertEquals((self.test_book.rating_sum, self.test_book.rating_count), (1, 1))
+        self.assertEquals(self.test_book.rating, 1)
+
+        second.delete()
+        self.test_book.refresh_from_db()
+        self.assertEquals((self.test_book.rating_sum, self.test_book.rating_count), (0, 0))
+        self.assertEquals(self.test_book.rating, 1)
+
+    def histogram(self):
+        self.test_book.refresh_from_db()
+        return [getattr(self.test_book, field) for field in RATING_COUNT_FIELDS.values()]
+
+    def test_rating_histogram_counters(self):
+        first = Review.objects.create(book=self.test_book, user=self.test_user, rating=5)
+        second = Review.objects.create(book=self.test_book, user=self.test_user, rating=2)
+        self.assertEquals(self.histogram(), [0, 1, 0, 0, 1])
+
+        second.rating = 4
+        second.save()
+        self.assertEquals(self.histogram(), [0, 0, 0, 1, 1])
+
+        first.delete()
+        self.assertEquals(self.histogram(), [0, 0, 0, 1, 0])
+
+        Book.objects.filter(pk=self.test_book.pk).update(rating_4_count=0)
+        Book.objects.recalculate_ratings()
+        self.assertEquals(self.histogram(), [0, 0, 0, 1, 0])
+
+    def test_recalculate_ratings(self):
+        Review.objects.create(book=self.test_book, user=self.test_user, rating=4)
+        Book.objects.filter(pk=self.test_book.pk).update(rating_sum=0, rating_count=0, rating=1)
+
+        Book.objects.recalculate_ratings()
+        self.test_book.refresh_from_db()
+        self.assertEquals((self.test_book.rating_sum, self.test_book.rating_count), (4, 1))
+        self.assertEquals(self.test_book.rating, 4)
+
+    def test_stale_book_save_keeps_running_rating(self):
+        Review.objects.create(book=self.test_book, user=self.test_user, rating=5)
+        self.test_book.title = "renamed"
+        self.test_book.save()
+
+        self.test_book.refresh_from_db()
+        self.assertEquals(
+            (self.test_book.title, self.test_book.rating, self.test_book.rating_sum, self.test_book.rating_count),
+            ("renamed", 5, 5, 1),
+        )
+
+    def test_admin_rating_read_only_once_created(self):
+        # `save()` keeps the running rating, the form must not offer to change it
+        book_admin = admin.site._registry[Book]
+        request = RequestFactory().get("/")
+        self.assertNotIn("rating", book_admin.get_readonly_fields(request))
+        self.assertIn("rating", book_admin.get_readonly_fields(request, self.test_book))
+
     def test_sentinel_user_on_remove_user(self):
         remove_usr = user_model.objects.create_user(username="remove_usr")
         review = Review.objects.create(
@@ -143,6 +219,30 @@ class ReviewReactionTest(TestCase):
         self.assertEquals(reaction.user.username, "deleted")
         self.assertFalse(reaction.user.is_active)
 
+    def test_delete_moves_reaction_counts(self):
+        users = [user_model.objects.create_user(username=f"reactor_{i}") for i in range(3)]
+        for user in users:
+            ReviewReaction.objects.create(user=user, review=self.test_review, reaction=ReviewReaction.Reaction.like)
+        Review.objects.filter(pk=self.test_review.pk).rebuild_reaction_counts()
+
+        # as the admin deletes, one reaction and a selection
+        ReviewReaction.objects.get(user=users[0]).delete()
+        self.test_review.refresh_from_db()
+        self.assertEquals(self.test_review.likes_count, 2)
+
+        ReviewReaction.objects.filter(user__in=users[1:]).delete()
+        self.test_review.refresh_from_db()
+        self.assertEquals(self.test_review.likes_count, 0)
+
+    def test_cascaded_reactions_skip_the_counters(self):
+        for i in range(3):
+            user = user_model.objects.create_user(username=f"reactor_{i}")
+            ReviewReaction.objects.create(user=user, review=self.test_review, reaction=ReviewReaction.Reaction.like)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.test_review.delete()
+        self.assertFalse([query for query in queries if "likes_count" in query["sql"]])
+
     def test_review_with_reactions(self):
         reviews = Review.objects.reviews_with_reactions()
 
@@ -151,3 +251,111 @@ class ReviewReactionTest(TestCase):
 
         first_review = reviews[0]
         self.assertTrue(hasattr(first_review, "reactions"))
+
+    def test_shift_reaction_counts(self):
+        Review.objects.shift_reaction_counts(self.test_review.id, added=ReviewReaction.Reaction.like)
+        Review.objects.shift_reaction_counts(
+            self.test_review.id,
+            added=ReviewReaction.Reaction.dislike,
+            removed=ReviewReaction.Reaction.like,
+        )
+        self.test_review.refresh_from_db()
+
+        self.assertEquals(self.test_review.likes_count, 0)
+        self.assertEquals(self.test_review.dislikes_count, 1)
+
+    def test_rebuild_reaction_counts(self):
+        ReviewReaction.objects.create(
+            user=self.test_user,
+            review=self.test_review,
+            reaction=ReviewReaction.Reaction.like
+        )
+        mismatched = Review.objects.with_actual_reaction_counts().get(pk=self.test_review.pk)
+        self.assertEquals(mismatched.likes_count, 0)
+        self.assertEquals(mismatched.actual_likes_count, 1)
+
+        Review.objects.rebuild_reaction_counts()
+        self.test_review.refresh_from_db()
+
+        self.assertEquals(self.test_review.likes_count, 1)
+        self.assertEquals(self.test_review.dislikes_count, 0)
+
+
+class FixtureLoaderTest(TestCase):
+    def write_fixture(self, objects):
+        file = tempfile.NamedTemporaryFile("w", suffix=".json", delete=False)
+        with file:
+            json.dump(objects, file)
+        self.addCleanup(os.remove, file.name)
+        return file.name
+
+    def test_load_and_skip_loaded(self):
+        self.assertEquals(load_fixture("static/fixtures/category_fixtures.json"), 3)
+        self.assertEquals(load_fixture("static/fixtures/book_fixtures.json", batch_size=3), 4)
+        self.assertEquals(Book.objects.count(), 4)
+
+        self.assertIsNone(load_fixture("static/fixtures/book_fixtures.json"))
+        self.assertEquals(Book.objects.count(), 4)
+        self.assertEquals(FixtureLoad.objects.count(), 2)
+
+    def test_upsert_keeps_derived_counters(self):
+        path = self.write_fixture([
+            {"model": "book.Category", "pk": "cat", "fields": {"title": "Cat"}},
+            {"model": "book.Book", "pk": 10, "fields": {"title": "Old", "author": "a", "category": "cat", "rating": 1}},
+        ])
+        load_fixture(path)
+        user = user_model.objects.create_user(username="fixture_reader")
+        Review.objects.create(book_id=10, user=user, rating=5)
+
+        path = self.write_fixture([
+            {"model": "book.Book", "pk": 10, "fields": {"title": "New", "author": "a", "category": "cat", "rating": 1}},
+        ])
+        self.assertEquals(load_fixture(path), 1)
+
+        book = Book.objects.get(pk=10)
+        self.assertEquals(book.title, "New")
+        self.assertEquals((book.rating, book.rating_count), (5, 1))
+        # the sequence moved past the explicit primary keys
+        self.assertGreater(Book.objects.create(title="t", author="a", category_id="cat", rating=1).pk, 10)
+
+
+class CategoryStatsTest(TestCase):
+    def setUp(self):
+        self.first_category = Category.objects.create(title="first", slug="first")
+        self.second_category = Category.objects.create(title="second", slug="second")
+        self.test_user = user_model.objects.create_user(username="test")
+
+    def assertStats(self, category, books_count, rating_sum, rating_count):
+        category.refresh_from_db()
+        self.assertEquals((category.books_count, category.rating_sum, category.rating_count),
+                          (books_count, rating_sum, rating_count))
+
+    def test_stats_follow_books_and_reviews(self):
+        book = Book.objects.create(title="book", author="someone", category=self.first_category, rating=1)
+        Book.objects.create(title="other", author="someone", category=self.first_category, rating=1)
+        Review.objects.create(book=book, user=self.test_user, rating=5)
+        review = Review.objects.create(book=book, user=self.test_user, rating=2)
+        self.assertStats(self.first_category, 2, 7, 2)
+        self.assertEquals(self.first_category.average_rating, 3.5)
+
+        review.rating = 4
+        review.save()
+        self.assertStats(self.first_category, 2, 9, 2)
+
+        book.category = self.second_category
+        book.save()
+        self.assertStats(self.first_category, 1, 0, 0)
+        self.assertStats(self.second_category, 1, 9, 2)
+        self.assertIsNone(self.first_category.average_rating)
+
+        book.delete()
+        self.assertStats(self.second_category, 0, 0, 0)
+
+    def test_recalculate_stats(self):
+        book = Book.objects.create(title="book", author="someone", category=self.first_category, rating=1)
+        Review.objects.create(book=book, user=self.test_user, rating=3)
+        Category.objects.update(books_count=0, rating_sum=0, rating_count=0)
+
+        Category.objects.recalculate_stats()
+        self.assertStats(self.first_category, 1, 3, 1)
+        self.assertStats(self.second_category, 0, 0, 0)
@@ -0,0 +1,190 @@
+import json
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from book.models import Category, Book, Review, ReviewReaction
+from book.pagination import ReviewCursorPagination
+from book.views import ReviewCreateAPIView, ReviewReactionAPIView
+
+user_model = get_user_model()
+
+CHECKED_STATEMENTS = ("SELECT", "UPDATE", "DELETE", "WITH")
+
+
+def iter_plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from iter_plan_nodes(child)
+
+
+class QueryPlanTestMixin:
+    """Seeds a small catalog and checks the plans of the queries an API call runs."""
+
+    def seed(self, books=30, reviews_per_book=5):
+        self.users = [user_model.objects.create_user(username=f"plan_user_{i}") for i in range(reviews_per_book)]
+        self.categories = [Category.objects.create(slug=f"plan-cat-{i}", title=f"Plan cat {i}") for i in range(3)]
+        self.books = Book.objects.bulk_create(
+            Book(title=f"Plan book {i}", author="someone", category=self.categories[i % 3], rating=1)
+            for i in range(books)
+        )
+        self.reviews = [
+            Review.objects.create(book=book, user=user, rating=3)
+            for book in self.books
+            for user in self.users
+        ]
+        ReviewReaction.objects.bulk_create(
+            ReviewReaction(review=review, user=self.users[0], reaction=ReviewReaction.Reaction.like)
+            for review in self.reviews
+        )
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            # with sequential scans priced out a Seq Scan means there is no usable index
+            cursor.execute("SET enable_seqscan = off")
+            try:
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+                plan = cursor.fetchone()[0]
+            finally:
+                cursor.execute("RESET enable_seqscan")
+        return json.loads(plan)[0]["Plan"] if isinstance(plan, str) else plan[0]["Plan"]
+
+    def assertNoSeqScan(self, call):
+        with CaptureQueriesContext(connection) as context:
+            response = call()
+
+        for query in context.captured_queries:
+            sql = query["sql"]
+            if not sql.lstrip().upper().startswith(CHECKED_STATEMENTS):
+                continue
+            for node in iter_plan_nodes(self.explain(sql)):
+                relation = node.get("Relation Name", "")
+                if node["Node Type"] == "Seq Scan" and relation.startswith("book_"):
+                    self.fail(f"Sequential scan on {relation}:\n{sql}")
+        return response
+
+
+@mock.patch.object(ReviewCreateAPIView, "throttle_classes", ())
+@mock.patch.object(ReviewReactionAPIView, "throttle_classes", ())
+class APIQueryPlanTest(QueryPlanTestMixin, APITestCase):
+    def setUp(self):
+        self.seed()
+        self.user = user_model.objects.create_user(username="plan_author", password="secret")
+        token = RefreshToken.for_user(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(token.access_token))
+        self.book = self.books[len(self.books) // 2]
+
+    def test_book_list(self):
+        url = reverse("books-list")
+        self.assertNoSeqScan(lambda: self.client.get(url))
+        self.assertNoSeqScan(lambda: self.client.get(url, data={"page": 2}))
+
+    def test_book_list_by_category(self):
+        url = reverse("books-list")
+        self.assertNoSeqScan(lambda: self.client.get(url, data={"category": self.categories[1].slug}))
+
+    def test_book_search(self):
+        url = reverse("books-list")
+        self.assertNoSeqScan(lambda: self.client.get(url, data={"search": "book"}))
+
+    def test_book_list_cursor(self):
+        url = reverse("books-list")
+        for params in ({}, {"ordering": "-rating"}, {"ordering": "-rating", "category": self.categories[1].slug}):
+            response = self.assertNoSeqScan(lambda: self.client.get(url, data={"paginate": "cursor", **params}))
+            next_url = response.json()["next"]
+            if next_url:
+                self.assertNoSeqScan(lambda: self.client.get(next_url))
+
+    def test_book_detail(self):
+        url = reverse("books-detail", args=[self.book.id])
+        self.assertNoSeqScan(lambda: self.client.get(url))
+
+    def test_review_list(self):
+        url = reverse("book-reviews-list", args=[self.book.id])
+        cursor = ReviewCursorPagination().encode_cursor(self.book.reviews.order_by("created_at", "id").first())
+        self.assertNoSeqScan(lambda: self.client.get(url))
+        self.assertNoSeqScan(lambda: self.client.get(url, data={"cursor": cursor}))
+
+    def test_review_create_and_destroy(self):
+        response = self.assertNoSeqScan(
+            lambda: self.client.post(reverse("book-reviews-create"), {"book": self.book.id, "rating": 4})
+        )
+        url = reverse("book-reviews-destroy", args=[response.json()["id"]])
+        self.assertNoSeqScan(lambda: self.client.delete(url))
+
+    def test_review_reaction(self):
+        url = reverse("book-review-react", args=[self.reviews[0].id])
+        self.assertNoSeqScan(lambda: self.client.post(url, {"reaction": ReviewReaction.Reaction.like.value}))
+        self.assertNoSeqScan(lambda: self.client.patch(url, {"reaction": ReviewReaction.Reaction.dislike.value}))
+        self.assertNoSeqScan(lambda: self.client.delete(url))
+        self.assertNoSeqScan(lambda: self.client.put(url, {"reaction": ReviewReaction.Reaction.like.value}))
+        self.assertNoSeqScan(lambda: self.client.put(url, {"reaction": ReviewReaction.Reaction.dislike.value}))
+
+
+class QueryCountTestMixin:
+    """Fails when the number of queries of an endpoint grows with the number of rows it returns."""
+
+    def assertQueryCountStable(self, call, grow):
+        with CaptureQueriesContext(connection) as small:
+            response = call()
+        self.assertEquals(response.status_code, 200)
+
+        grow()
+        with CaptureQueriesContext(connection) as large:
+            response = call()
+        self.assertEquals(response.status_code, 200)
+
+        self.assertEquals(
+            len(small), len(large),
+            "Query count grows with the result size (N+1?):\n" + "\n".join(q["sql"] for q in large.captured_queries),
+        )
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class APIQueryCountTest(QueryCountTestMixin, APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(slug="count-cat", title="Count cat")
+        self.book = Book.objects.create(title="Count book", author="someone", category=self.category, rating=1)
+        self.add_reviews(2)
+
+    def add_books(self, count):
+        for i in range(count):
+            Book.objects.create(title=f"Count book {i}", author="someone", category=self.category, rating=1)
+
+    def add_reviews(self, count):
+        for _ in range(count):
+            user = user_model.objects.create_user(username=f"count_user_{user_model.objects.count()}")
+            review = Review.objects.create(book=self.book, user=user, rating=4)
+            ReviewReaction.objects.create(review=review, user=user, reaction=ReviewReaction.Reaction.like)
+
+    def test_book_list(self):
+        url = reverse("books-list")
+        self.assertQueryCountStable(lambda: self.client.get(url), lambda: self.add_books(3))
+
+    def test_book_list_by_category(self):
+        url = reverse("books-list")
+        self.assertQueryCountStable(
+            lambda: self.client.get(url, data={"category": self.category.slug}),
+            lambda: self.add_books(3),
+        )
+
+    def test_book_search(self):
+        url = reverse("books-list")
+        self.assertQueryCountStable(
+            lambda: self.client.get(url, data={"search": "count"}),
+            lambda: self.add_books(3),
+        )
+
+    def test_book_detail(self):
+        url = reverse("books-detail", args=[self.book.id])
+        self.assertQueryCountStable(lambda: self.client.get(url), lambda: self.add_reviews(3))
+
+    def test_review_list(self):
+        url = reverse("book-reviews-list", args=[self.book.id])
+        self.assertQueryCountStable(lambda: self.client.get(url), lambda: self.add_reviews(3))
@@ -1,12 +1,81 @@
-from django.core.cache import caches
+"""
+Throttles backed by one atomic Redis call per request.
+
+DRF's `SimpleRateThrottle` keeps a pickled history of timestamps per user and
+rewrites it on every request, which is racy across workers and grows with the
+rate. `RedisRateThrottle` runs GCRA (the generic cell rate algorithm) in a Lua
+script instead: the only state is the theoretical arrival time of the next
+request, and the check and the update happen in the same EVALSHA.
+
+A rate of `n/period` lets a burst of `n` requests through and then one more
+every `period / n`, so no window of `period` ever holds more than `n`.
+"""
+from django_redis import get_redis_connection
 from rest_framework.throttling import UserRateThrottle
 
+GCRA_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+if tat - now > tolerance then
+    return {0, tat - now - tolerance}
+end
+
+tat = tat + interval
+redis.call('SET', KEYS[1], tat, 'PX', math.ceil(tat - now))
+return {1, 0}
+"""
+
+
+class RedisRateThrottle(UserRateThrottle):
+    """
+    `UserRateThrottle` with the same scopes and `DEFAULT_THROTTLE_RATES`, checked
+    by `GCRA_SCRIPT`. The Redis client comes from `get_client()`, tests may
+    override it with any client that supports `register_script`.
+    """
+    cache_format = "throttle:%(scope)s:%(ident)s"
+    redis_alias = "throttle"
+
+    _script = None
+
+    def get_client(self):
+        return get_redis_connection(self.redis_alias)
+
+    def get_script(self, client):
+        # a `Script` sends EVALSHA to the client it is called with and loads
+        # itself again after a SCRIPT FLUSH, one instance serves every client
+        if RedisRateThrottle._script is None:
+            RedisRateThrottle._script = client.register_script(GCRA_SCRIPT)
+        return RedisRateThrottle._script
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        interval = self.duration * 1000 / self.num_requests
+        client = self.get_client()
+        allowed, self.retry_after = self.get_script(client)(
+            keys=[self.key], args=[interval, interval * (self.num_requests - 1)], client=client,
+        )
+        return bool(allowed)
+
+    def wait(self):
+        return int(self.retry_after) / 1000
+
 
-class ReviewRateThrottle(UserRateThrottle):
+class ReviewRateThrottle(RedisRateThrottle):
     scope = 'review'
-    cache = caches["throttle"]
 
 
-class ReactionRateThrottle(UserRateThrottle):
+class ReactionRateThrottle(RedisRateThrottle):
     scope = 'review_react'
-    cache = caches["throttle"]
@@ -1,20 +1,43 @@
+from django.conf import settings
 from django.urls import path, include, re_path
 from rest_framework.routers import SimpleRouter
 
+from book import async_views
 from book.views import (
     BookViewSet, ReviewListAPIView, ReviewCreateAPIView, ReviewDestroyAPIView,
-    ReviewReactionAPIView
+    ReviewReactionAPIView, BulkIngestAPIView, CategoryListAPIView, TopBooksAPIView, TrendingBooksAPIView,
+    review_reaction_cancel_view
 )
 
 router = SimpleRouter()
 router.register('', BookViewSet, basename="books")
 
+if settings.ASYNC_READ_VIEWS:
+    # matched before the sync routes, which stay for the schema
+    async_book_urlpatterns = [
+        re_path('^$', async_views.book_list, name='books-list'),
+        re_path('^(?P<book_id>[^/.]+)/$', async_views.book_detail, name='books-detail'),
+    ]
+    async_review_urlpatterns = [
+        re_path('^(?P<book_id>.+)/reviews/$', async_views.review_list, name='book-reviews-list'),
+    ]
+else:
+    async_book_urlpatterns = async_review_urlpatterns = []
+
 urlpatterns = [
     re_path('^reviews/$', ReviewCreateAPIView.as_view(), name='book-reviews-create'),
     re_path('^reviews/(?P<pk>.+)$', ReviewDestroyAPIView.as_view(), name='book-reviews-destroy'),
+    re_path('^bulk/(?P<kind>reviews|reactions)/$', BulkIngestAPIView.as_view(), name='book-bulk-ingest'),
+    re_path('^categories/$', CategoryListAPIView.as_view(), name='book-categories-list'),
+    re_path('^top/$', TopBooksAPIView.as_view(), name='books-top'),
+    re_path('^trending/$', TrendingBooksAPIView.as_view(), name='books-trending'),
+    *async_book_urlpatterns,
     path('', include(router.urls)),
+    *async_review_urlpatterns,
     re_path('^(?P<book_id>.+)/reviews/$', ReviewListAPIView.as_view(), name='book-reviews-list'),
 
+    re_path('^react/reviews/(?P<review_id>.+)/cancel/$', review_reaction_cancel_view,
+            name='book-review-react-cancel'),
     re_path('^react/reviews/(?P<review_id>.+)/$', ReviewReactionAPIView.as_view(),
             name='book-review-react'),
 ]
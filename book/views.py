@@ -1,24 +1,68 @@
+from functools import partial
 from http import HTTPMethod
 
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
 from django.core.exceptions import ValidationError as DjangoValidationError
 from django.core.validators import validate_slug
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
 from django.http import Http404
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from django.utils.translation import gettext_lazy as _
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema
 from rest_framework import status
-from rest_framework.decorators import permission_classes, api_view
+from rest_framework.decorators import permission_classes, api_view, throttle_classes
 from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.generics import ListAPIView, CreateAPIView, UpdateAPIView, DestroyAPIView
 from rest_framework.filters import BaseFilterBackend, SearchFilter
-from rest_framework.permissions import IsAuthenticated, BasePermission
+from rest_framework.permissions import IsAuthenticated, BasePermission, IsAdminUser
+from rest_framework.views import APIView
 from rest_framework.viewsets import ReadOnlyModelViewSet
 from rest_framework.pagination import PageNumberPagination
 
-from book.models import Book, Review, ReviewReaction
-from book.serializers import BookSerializer, ReviewSerializer, ReviewReactionSerializer, BookDetailSerializer
+from book import ranking
+from book.cache import (
+    BOOKS_NAMESPACE, CATEGORIES_NAMESPACE, CATEGORY_STATS_NAMESPACE, book_namespace, bump_versions, cache_response,
+    cache_result, reviews_namespace
+)
+from book.conditional import conditional_response
+from book.models import Book, Category, Review, ReviewReaction, SEARCH_CONFIG
+from book.pagination import BookPagination, ReviewCursorPagination
+from book.parsers import NDJSONParser
+from book.ranking import TOP, TRENDING, RankedBooks
+from book.serializers import (
+    BookSerializer, ReviewSerializer, ReviewReactionSerializer, BookDetailSerializer,
+    BulkReviewSerializer, BulkReviewReactionSerializer, CategoryStatsSerializer, RankedBookSerializer,
+    ReviewReactionUpsertSerializer, BookValuesListSerializer, ReviewValuesListSerializer
+)
 from book.throttles import ReviewRateThrottle, ReactionRateThrottle
+from book_platform.metrics import serialize_timer
+
+
+def newest_reviews(book_id, **kwargs):
+    """`created_at` of the reviews of a book, newest first along `review_book_created_idx`."""
+    if not book_id.isdigit():
+        return Review.objects.none()
+    return Review.objects.filter(book_id=book_id).order_by("-created_at").values_list("created_at", flat=True)
+
+
+class ValuesListMixin:
+    """Serializes list responses from `.values()` rows with `values_serializer_class`."""
+    values_serializer_class = None
+
+    def get_values_serializer(self):
+        return self.values_serializer_class(context=self.get_serializer_context())
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_values_serializer()
+        queryset = serializer.values(self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.serialize(page))
+        return Response(serializer.serialize(queryset))
 
 
 class BookCategoryFilter(BaseFilterBackend):
@@ -37,13 +81,34 @@ class BookCategoryFilter(BaseFilterBackend):
         return queryset
 
 
-class BookViewSet(ReadOnlyModelViewSet):
-    queryset = Book.objects.select_related("category").all()
+class BookSearchFilter(SearchFilter):
+    """
+    Ranked full-text search over the `search_vector` of books (title, author, description),
+    titles that are only a typo away are matched by trigram word similarity.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search_terms = self.get_search_terms(request)
+        if not search_terms:
+            return queryset
+
+        text = " ".join(search_terms)
+        query = SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+        return queryset.annotate(
+            rank=SearchRank(F("search_vector"), query),
+            similarity=TrigramWordSimilarity(text, "title"),
+        ).filter(
+            Q(search_vector=query) | Q(title__trigram_word_similar=text)
+        ).order_by("-rank", "-similarity", "id")
+
+
+class BookViewSet(ValuesListMixin, ReadOnlyModelViewSet):
+    queryset = Book.objects.select_related("category").defer("search_vector")
     serializer_class = BookSerializer
+    values_serializer_class = BookValuesListSerializer
     retrieve_serializer_class = BookDetailSerializer
-    pagination_class = PageNumberPagination
-    filter_backends = (BookCategoryFilter, SearchFilter)
-    search_fields = ["title"]
+    pagination_class = BookPagination
+    filter_backends = (BookCategoryFilter, BookSearchFilter)
     lookup_url_kwarg = "book_id"
     lookup_field = "id"
 
@@ -52,18 +117,90 @@ class BookViewSet(ReadOnlyModelViewSet):
             return self.retrieve_serializer_class
         return super().get_serializer_class()
 
-    @method_decorator(cache_page(60))
+    @cache_response("books-list", BOOKS_NAMESPACE)
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
+    @conditional_response(
+        "books-detail", lambda book_id, **kwargs: book_namespace(book_id), CATEGORIES_NAMESPACE,
+        last_modified=newest_reviews,
+    )
+    @cache_response("books-detail", lambda book_id, **kwargs: book_namespace(book_id), CATEGORIES_NAMESPACE)
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        with serialize_timer():
+            data = self.get_serializer(instance).data
+        return Response(data)
 
-class ReviewListAPIView(ListAPIView):
-    queryset = Review.objects.reviews_with_reactions()
-    serializer_class = ReviewSerializer
+
+class RankedBookListAPIView(ListAPIView):
+    """
+    Books in the order of a Redis ranking (see book/ranking.py), pages are read
+    with ZREVRANGE instead of sorting the books table.
+    """
+    queryset = Book.objects.select_related("category").defer("search_vector")
+    serializer_class = RankedBookSerializer
     pagination_class = PageNumberPagination
+    filter_backends = ()
+    ranking = None
+
+    def get_queryset(self):
+        return RankedBooks(self.ranking, super().get_queryset())
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        with serialize_timer():
+            data = self.get_serializer(page, many=True).data
+        return self.get_paginated_response(data)
+
+
+class TopBooksAPIView(RankedBookListAPIView):
+    """Books by Bayesian average rating."""
+    ranking = TOP
+
+
+class TrendingBooksAPIView(RankedBookListAPIView):
+    """Books by recent review and reaction activity, older activity fades with a half-life of a few days."""
+    ranking = TRENDING
+
+
+@cache_result("categories-list", CATEGORY_STATS_NAMESPACE)
+def category_listing():
+    categories = list(Category.objects.all())
+    with serialize_timer():
+        return CategoryStatsSerializer(categories, many=True).data
+
+
+class CategoryListAPIView(ListAPIView):
+    """Categories with their book counts and average ratings, read from the materialized counters."""
+    queryset = Category.objects.all()
+    serializer_class = CategoryStatsSerializer
+    pagination_class = None
+
+    def list(self, request, *args, **kwargs):
+        return Response(category_listing())
+
+
+class ReviewListAPIView(ValuesListMixin, ListAPIView):
+    queryset = Review.objects.all()
+    serializer_class = ReviewSerializer
+    values_serializer_class = ReviewValuesListSerializer
+    pagination_class = ReviewCursorPagination
     lookup_field = "book_id"
     lookup_url_kwarg = "book_id"
 
+    def get_queryset(self):
+        book_id = self.kwargs[self.lookup_url_kwarg]
+        if not book_id.isdigit():
+            raise Http404("Book not found")
+        return super().get_queryset().filter(**{self.lookup_field: book_id}).with_author()
+
+    @conditional_response(
+        "book-reviews-list", lambda book_id, **kwargs: reviews_namespace(book_id), last_modified=newest_reviews,
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
 
 class ReviewCreateAPIView(CreateAPIView):
     serializer_class = ReviewSerializer
@@ -94,12 +231,66 @@ class ReviewReactionAPIView(
     lookup_field = "review_id"
 
     def get_queryset(self):
-        return super().get_queryset().filter(user=self.request.user)
+        queryset = super().get_queryset().filter(user_id=self.request.user.id)
+        if self.request.method != HTTPMethod.POST:
+            # the old reaction decides which counter goes down
+            queryset = queryset.select_for_update()
+        return queryset
 
     def create(self, request, *args, **kwargs):
         request.data["review"] = kwargs["review_id"]
         return super().create(request, *args, **kwargs)
 
+    @extend_schema(
+        request=ReviewReactionUpsertSerializer,
+        responses={
+            status.HTTP_200_OK: ReviewReactionUpsertSerializer,
+            status.HTTP_201_CREATED: ReviewReactionUpsertSerializer,
+        },
+    )
+    def put(self, request, *args, **kwargs):
+        """Sets the reaction whether or not there is one, idempotent and a single query."""
+        serializer = ReviewReactionUpsertSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        review_id = kwargs[self.lookup_url_kwarg]
+        if not review_id.isdigit():
+            raise Http404("Review not found")
+        result = ReviewReaction.objects.upsert(int(review_id), request.user.id, serializer.validated_data["reaction"])
+        if result is None:
+            raise Http404("Review not found")
+
+        bump_versions(reviews_namespace(result["book_id"]))
+        if result["created"]:
+            transaction.on_commit(partial(
+                ranking.record_activity, result["book_id"], settings.BOOK_TRENDING_REACTION_WEIGHT
+            ), robust=True)
+        return Response(
+            ReviewReactionUpsertSerializer(result).data,
+            status=status.HTTP_201_CREATED if result["created"] else status.HTTP_200_OK,
+        )
+
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
+
+    def destroy(self, request, *args, **kwargs):
+        return cancel_review_reaction(kwargs[self.lookup_url_kwarg], request.user)
+
+    def perform_create(self, serializer):
+        try:
+            with transaction.atomic():
+                react = serializer.save()
+                Review.objects.shift_reaction_counts(react.review_id, added=react.reaction)
+        except IntegrityError:
+            # lost the race against `unique_user_react` after the exists() check
+            raise ValidationError({"detail": _('Already exists! Try update')})
+
+    def perform_update(self, serializer):
+        removed = serializer.instance.reaction
+        react = serializer.save()
+        Review.objects.shift_reaction_counts(react.review_id, added=react.reaction, removed=removed)
+
 
 class ReviewReactionCreateAPIView(CreateAPIView):
     serializer_class = ReviewReactionSerializer
@@ -114,14 +305,51 @@ class ReviewReactionUpdateAPIView(UpdateAPIView):
     throttle_classes = (ReactionRateThrottle,)
 
     def get_queryset(self):
-        return super().get_queryset().filter(user=self.request.user)
+        return super().get_queryset().filter(user_id=self.request.user.id)
 
 
 @extend_schema(responses={status.HTTP_204_NO_CONTENT: None, status.HTTP_404_NOT_FOUND: "Review reaction not found"})
 @api_view([HTTPMethod.DELETE])
 @permission_classes([IsAuthenticated])
+@throttle_classes([ReactionRateThrottle])
 def review_reaction_cancel_view(request, review_id):
-    react = ReviewReaction.objects.filter(review_id=review_id, user=request.user)
-    if not react.exists():
+    return cancel_review_reaction(review_id, request.user)
+
+
+def cancel_review_reaction(review_id, user):
+    # one DELETE ... RETURNING that moves the counters as well, retries just get a 404
+    result = ReviewReaction.objects.cancel(int(review_id), user.id) if review_id.isdigit() else None
+    if result is None:
         raise Http404("Review reaction not found")
+    bump_versions(reviews_namespace(result["book_id"]))
     return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class BulkIngestAPIView(APIView):
+    """
+    Staff-only import of partner feeds: an NDJSON batch of reviews or reactions
+    is validated as a whole and inserted with `bulk_create` in chunks.
+    """
+    permission_classes = [IsAdminUser]
+    parser_classes = [NDJSONParser]
+    serializer_classes = {
+        "reviews": BulkReviewSerializer,
+        "reactions": BulkReviewReactionSerializer,
+    }
+
+    @extend_schema(
+        request={NDJSONParser.media_type: OpenApiTypes.STR},
+        responses={status.HTTP_201_CREATED: OpenApiTypes.OBJECT, status.HTTP_400_BAD_REQUEST: OpenApiTypes.OBJECT},
+    )
+    def post(self, request, kind):
+        serializer = self.serializer_classes[kind](data=request.data, many=True, context={"request": request})
+        if not serializer.is_valid():
+            errors = serializer.errors
+            if isinstance(errors, list):
+                errors = [{"line": number, "errors": row} for number, row in enumerate(errors, 1) if row]
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            serializer.save()
+        return Response({"received": len(serializer.validated_data), "created": serializer.created_count},
+                        status=status.HTTP_201_CREATED)
@@ -0,0 +1,15 @@
+"""
+The PostgreSQL backend with the queries reported to `MetricsMiddleware`.
+
+The wrapper is installed on every connection, in whichever thread it is
+opened, rather than by the middleware on the connections of its own thread.
+"""
+from django.db.backends.postgresql import base
+
+from book_platform.metrics import record_query
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.execute_wrappers.append(record_query)
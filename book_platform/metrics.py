@@ -0,0 +1,260 @@
+"""
+Per-view request metrics.
+
+`MetricsMiddleware` follows every request and records, under the name of the
+resolved view: the wall time, the number and time of DB queries (through the
+`record_query` execute wrapper of the `book_platform.db` backend), the cache
+hits and misses of each alias of `InstrumentedRedisCache`, the time spent
+serializing the data (`serialize_timer`) and rendering the response. The
+values are aggregated in process into histograms and served in the Prometheus
+text format by `metrics_view`, every worker process has its own.
+
+`QUERY_BUDGETS` caps the queries of a view: a request above the budget is
+logged, or fails with `QueryBudgetExceeded` when `QUERY_BUDGET_STRICT` is set,
+as in the query count tests.
+"""
+import bisect
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.http import HttpResponse
+from django_redis.cache import RedisCache
+
+logger = logging.getLogger(__name__)
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+UNRESOLVED = "<unresolved>"
+
+_current = ContextVar("request_metrics", default=None)
+_MISSING = object()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip((*self.buckets, "+Inf"), self.counts):
+            total += count
+            yield bound, total
+
+
+class Registry:
+    histograms = {
+        "http_request_duration_seconds": ("Wall time of the requests", TIME_BUCKETS),
+        "db_queries": ("DB queries per request", COUNT_BUCKETS),
+        "db_query_duration_seconds": ("Time spent in DB queries per request", TIME_BUCKETS),
+        "serialize_duration_seconds": ("Time spent serializing the data per request", TIME_BUCKETS),
+        "render_duration_seconds": ("Time spent rendering the response per request", TIME_BUCKETS),
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.observed = {name: {} for name in self.histograms}
+        # (view, alias, result) -> count
+        self.cache = defaultdict(int)
+
+    def record(self, metrics):
+        values = {
+            "http_request_duration_seconds": metrics.duration,
+            "db_queries": metrics.queries,
+            "db_query_duration_seconds": metrics.query_time,
+            "serialize_duration_seconds": metrics.serialize_time,
+            "render_duration_seconds": metrics.render_time,
+        }
+        with self.lock:
+            for name, value in values.items():
+                by_view = self.observed[name]
+                if metrics.view not in by_view:
+                    by_view[metrics.view] = Histogram(self.histograms[name][1])
+                by_view[metrics.view].observe(value)
+            for (alias, result), count in metrics.cache.items():
+                self.cache[metrics.view, alias, result] += count
+
+    def exposition(self):
+        lines = []
+        with self.lock:
+            for name, (help_text, _buckets) in self.histograms.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for view, histogram in sorted(self.observed[name].items()):
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {count}')
+                    lines.append(f'{name}_sum{{view="{view}"}} {histogram.sum}')
+                    lines.append(f'{name}_count{{view="{view}"}} {histogram.count}')
+
+            lines += ["# HELP cache_requests_total Cache lookups by alias", "# TYPE cache_requests_total counter"]
+            for (view, alias, result), count in sorted(self.cache.items()):
+                lines.append(f'cache_requests_total{{view="{view}",alias="{alias}",result="{result}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.view = UNRESOLVED
+        self.duration = 0
+        self.queries = 0
+        self.query_time = 0
+        self.serialize_time = 0
+        self.render_time = 0
+        # (alias, "hit" | "miss") -> count
+        self.cache = defaultdict(int)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    The `connection.execute_wrapper` of every connection, see `book_platform.db`.
+
+    Connections are per thread and under ASGI the ORM runs in `sync_to_async`
+    threads, the request is found through the context variable they inherit.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.query_time += time.perf_counter() - started
+
+
+def record_cache(alias, hits, misses):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache[alias, "hit"] += hits
+        metrics.cache[alias, "miss"] += misses
+
+
+@contextmanager
+def serialize_timer():
+    """Times the serializers turning rows or instances into the data of the response."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.serialize_time += time.perf_counter() - started
+
+
+@contextmanager
+def render_timer():
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.render_time += time.perf_counter() - started
+
+
+def check_query_budget(metrics):
+    budget = settings.QUERY_BUDGETS.get(metrics.view)
+    if budget is None or metrics.queries <= budget:
+        return
+    message = f"{metrics.view} ran {metrics.queries} queries, its budget is {budget}"
+    if settings.QUERY_BUDGET_STRICT:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # under ASGI the async views keep running without a thread of their own
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        with self.measure(request):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with self.measure(request):
+            return await self.get_response(request)
+
+    @contextmanager
+    def measure(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            _current.reset(token)
+            metrics.duration = time.perf_counter() - started
+            if request.resolver_match is not None:
+                metrics.view = request.resolver_match.view_name
+            registry.record(metrics)
+        check_query_budget(metrics)
+
+    def process_template_response(self, request, response):
+        # the first middleware is the last one called here, right before `render()`
+        metrics = _current.get()
+        if metrics is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                metrics.render_time += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+
+def metrics_view(request):
+    return HttpResponse(registry.exposition(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+class InstrumentedRedisCache(RedisCache):
+    """`django_redis` cache counting its lookups for `MetricsMiddleware`, `ALIAS` names it in the metrics."""
+
+    def __init__(self, server, params):
+        super().__init__(server, params)
+        self.alias = params.get("ALIAS", server)
+
+    def get(self, key, default=None, version=None, client=None):
+        value = super().get(key, _MISSING, version=version, client=client)
+        hit = value is not _MISSING
+        record_cache(self.alias, int(hit), int(not hit))
+        return value if hit else default
+
+    def get_many(self, keys, version=None, client=None):
+        keys = list(keys)
+        values = super().get_many(keys, version=version, client=client)
+        record_cache(self.alias, len(values), len(keys) - len(values))
+        return values
@@ -0,0 +1,33 @@
+"""
+JSON parsing with orjson, `loads` falls back to the stdlib when orjson is not installed.
+
+orjson only reads UTF-8 and always rejects NaN and Infinity, like DRF's
+`JSONParser` with `STRICT_JSON`; `ORJSONParser` leaves other encodings and
+the non-strict mode to `JSONParser`.
+"""
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+loads = orjson.loads if orjson is not None else json.loads
+
+UTF8 = ("utf-8", "utf8")
+
+
+class ORJSONParser(JSONParser):
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get("encoding", settings.DEFAULT_CHARSET)
+        if orjson is None or not self.strict or encoding.lower() not in UTF8:
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
@@ -0,0 +1,43 @@
+"""
+JSON rendering with orjson.
+
+`ORJSONRenderer` writes the same bytes as DRF's `JSONRenderer` with the
+default compact, unicode and strict settings (floats with an exponent aside,
+`1e-7` instead of `1e-07`), but encodes in C: datetimes,
+dates, UUIDs and the nested dicts and lists of the reaction aggregates are
+serialized natively, anything else (lazy translations, decimals) goes through
+DRF's encoder. Indented output (the browsable API, `; indent=` in Accept), the
+other JSON settings and payloads orjson rejects, such as integers beyond 64
+bits, are rendered by `JSONRenderer` itself, as is everything when orjson is
+not installed.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_encoder = encoders.JSONEncoder()
+
+
+class ORJSONRenderer(JSONRenderer):
+    def use_orjson(self, indent):
+        return orjson is not None and indent is None and self.compact and self.strict and not self.ensure_ascii
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if not self.use_orjson(indent):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            # `JSONEncoder` spells UTC as "Z" as well
+            ret = orjson.dumps(data, default=_encoder.default, option=orjson.OPT_UTC_Z)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # escaped by `JSONRenderer` to keep the output a strict javascript subset
+        return ret.replace("\u2028".encode(), b"\\u2028").replace("\u2029".encode(), b"\\u2029")
@@ -36,6 +36,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',
     'drf_spectacular',
@@ -43,7 +44,14 @@ INSTALLED_APPS = [
     'book',
 ]
 
+# the benchmark commands seed and drop their own databases, they are left out unless asked for
+BENCHMARKS = config("BENCHMARKS", default=False, cast=bool)
+if BENCHMARKS:
+    INSTALLED_APPS.append('benchmarks')
+
 MIDDLEWARE = [
+    # first, to time the whole request and be the last to see the response before it is rendered
+    'book_platform.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -78,7 +86,8 @@ WSGI_APPLICATION = 'book_platform.wsgi.application'
 
 DATABASES = {
     "default": {
-        'ENGINE': 'django.db.backends.postgresql',
+        # django.db.backends.postgresql reporting its queries to the metrics (see book_platform/db/base.py)
+        'ENGINE': 'book_platform.db',
         'NAME': config('POSTGRES_DB'),
         'USER': config('POSTGRES_USER'),
         'PASSWORD': config('POSTGRES_PASSWORD'),
@@ -105,6 +114,17 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+PASSWORD_HASHERS = [
+    "accounts.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
+# PBKDF2 rounds of new password hashes, every login and registration pays them in CPU time
+PASSWORD_HASH_ITERATIONS = config("PASSWORD_HASH_ITERATIONS", default=870_000, cast=int)
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
 
@@ -125,6 +145,15 @@ STATIC_ROOT = BASE_DIR / 'static'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# book cover thumbnails (see book/images.py), sizes are (width, height)
+COVER_THUMBNAIL_SIZES = {
+    "small": (120, 180),
+    "medium": (240, 360),
+    "large": (480, 720),
+}
+COVER_THUMBNAIL_FORMATS = ("webp", "jpeg")
+COVER_THUMBNAIL_WORKERS = config("COVER_THUMBNAIL_WORKERS", default=2, cast=int)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -135,16 +164,31 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
     "ROTATE_REFRESH_TOKENS": False,
     "BLACKLIST_AFTER_ROTATION": True,
-    "UPDATE_LAST_LOGIN": True,
+    "UPDATE_LAST_LOGIN": False,  # buffered by `accounts.last_login`
     "ALGORITHM": "HS256",
     "SIGNING_KEY": SECRET_KEY,
     "VERIFYING_KEY": config('VERIFYING_KEY', default=""),
+    "TOKEN_USER_CLASS": "accounts.authentication.TokenUser",
+    "TOKEN_OBTAIN_SERIALIZER": "accounts.serializers.TokenObtainPairSerializer",
 }
 
+# seconds the flags of a user stay cached for token users, see `accounts.authentication`
+AUTH_USER_CACHE_TIMEOUT = 60
+LAST_LOGIN_ALIAS = "default"
+
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "accounts.authentication.JWTStatelessUserAuthentication",
+    ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "book_platform.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "book_platform.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
     ],
     "COERCE_DECIMAL_TO_STRING": False,
     'TEST_REQUEST_DEFAULT_FORMAT': 'json',
@@ -172,15 +216,52 @@ REDIS_CONNECTION_URL = f"redis://default:{REDIS_PASSWORD}@{REDIS_HOST}:{REDIS_PO
 
 CACHES = {
     "default": {
-        "BACKEND": "django_redis.cache.RedisCache",
-        "LOCATION": REDIS_CONNECTION_URL + '/0'
+        "BACKEND": "book_platform.metrics.InstrumentedRedisCache",
+        "LOCATION": REDIS_CONNECTION_URL + '/0',
+        "ALIAS": "default",
     },
     "pages_cache": {
-        "BACKEND": "django_redis.cache.RedisCache",
-        "LOCATION": REDIS_CONNECTION_URL + '/1'
+        "BACKEND": "book_platform.metrics.InstrumentedRedisCache",
+        "LOCATION": REDIS_CONNECTION_URL + '/1',
+        "ALIAS": "pages_cache",
     },
     "throttle": {
-        "BACKEND": "django_redis.cache.RedisCache",
-        "LOCATION": REDIS_CONNECTION_URL + '/2'
+        "BACKEND": "book_platform.metrics.InstrumentedRedisCache",
+        "LOCATION": REDIS_CONNECTION_URL + '/2',
+        "ALIAS": "throttle",
     }
 }
+
+# Most DB queries a request of a view may run, above that it is logged (see book_platform/metrics.py).
+# The query count tests set QUERY_BUDGET_STRICT to fail instead.
+QUERY_BUDGETS = {
+    "books-list": 3,
+    "books-detail": 2,
+    "book-reviews-list": 2,
+    "book-categories-list": 1,
+    "books-top": 1,
+    "books-trending": 1,
+    "book-review-react-cancel": 1,
+}
+QUERY_BUDGET_STRICT = config("QUERY_BUDGET_STRICT", default=False, cast=bool)
+
+# Book responses are invalidated by versions bumped from model signals (see book/cache.py)
+BOOK_CACHE_ALIAS = "pages_cache"
+BOOK_CACHE_TIMEOUT = config("BOOK_CACHE_TIMEOUT", default=60 * 60 * 24, cast=int)
+
+# async book list, detail and review list views, for the uvicorn workers of web-runner.sh
+ASYNC_READ_VIEWS = config("ASYNC_READ_VIEWS", default=False, cast=bool)
+
+# rows per INSERT of the staff bulk ingestion endpoint
+BULK_INGEST_CHUNK_SIZE = config("BULK_INGEST_CHUNK_SIZE", default=5000, cast=int)
+
+# Redis sorted-set rankings of books (see book/ranking.py)
+BOOK_RANKING_ALIAS = "default"
+# virtual reviews at the prior mean every book starts with
+BOOK_RANKING_PRIOR_WEIGHT = config("BOOK_RANKING_PRIOR_WEIGHT", default=10, cast=int)
+BOOK_RANKING_PRIOR_MEAN = 3.0
+BOOK_TRENDING_HALF_LIFE = config("BOOK_TRENDING_HALF_LIFE", default=60 * 60 * 24 * 3, cast=int)
+# half-lives of activity scored by `rebuild_rankings`
+BOOK_TRENDING_WINDOW = 8
+BOOK_TRENDING_REVIEW_WEIGHT = 1.0
+BOOK_TRENDING_REACTION_WEIGHT = 0.25
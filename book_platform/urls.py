@@ -20,6 +20,8 @@ from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
 
+from book_platform.metrics import metrics_view
+
 
 docs_urlpatterns = [
     path('api/v1/schema/', SpectacularAPIView.as_view(), name='schema'),
@@ -33,6 +35,8 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('auth/', include('accounts.urls')),
     path('api/v1/books/', include('book.urls')),
+    # scraped from inside the network, nginx doesn't proxy it
+    path('metrics', metrics_view, name='metrics'),
 ] + docs_urlpatterns
 
 if settings.DEBUG:
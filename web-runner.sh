@@ -5,16 +5,24 @@ pip install --upgrade pip
 echo 'Collecting static files...'
 python manage.py collectstatic --no-input
 
-echo 'Making migrations...'
-python manage.py makemigrations --no-input
 echo 'Migrate...'
 python manage.py migrate --no-input
 
-echo 'Filling categories...'
-python manage.py loaddata static/fixtures/category_fixtures.json
-echo 'Filling books...'
-python manage.py loaddata static/fixtures/book_fixtures.json
+echo 'Filling categories and books...'
+python manage.py load_fixtures static/fixtures/category_fixtures.json static/fixtures/book_fixtures.json
+echo 'Rendering cover thumbnails...'
+python manage.py generate_cover_thumbnails
+echo 'Warming cache...'
+python manage.py warm_cache
 
 echo 'Running server...'
-gunicorn book_platform.wsgi:application --bind 0.0.0.0:8000
+case "${ASYNC_READ_VIEWS,,}" in
+  1|y|yes|t|true|on)
+    # the async read views only pay off under an event loop
+    gunicorn book_platform.asgi:application --worker-class uvicorn_worker.UvicornWorker --bind 0.0.0.0:8000
+    ;;
+  *)
+    gunicorn book_platform.wsgi:application --bind 0.0.0.0:8000
+    ;;
+esac
 